@@ -0,0 +1,48 @@
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../utils'))
+from ImageDownloader import ImageDownloader, create_session
+from local_image_server import LocalImageServer
+
+# 用法: python bench/bench_connections.py [图集数] [每个图集图片数]
+GALLERIES = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+IMAGES_PER_GALLERY = int(sys.argv[2]) if len(sys.argv) > 2 else 60
+
+
+def download_per_image_session(urls, save_dir):
+    """旧实现：每张图片新建一个 Session"""
+    for url in urls:
+        session = create_session()
+        response = session.get(url, timeout=(30, 60), verify=False)
+        with open(os.path.join(save_dir, os.path.basename(url)), 'wb') as f:
+            f.write(response.content)
+
+
+def download_shared(downloader, urls, save_dir):
+    for url in urls:
+        downloader.download_image(url, save_dir)
+
+
+def run(name, server, download_gallery):
+    server.reset()
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as tmp:
+        for g in range(GALLERIES):
+            save_dir = os.path.join(tmp, str(g))
+            os.makedirs(save_dir)
+            download_gallery(server.gallery_urls(g, IMAGES_PER_GALLERY), save_dir)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<12} 连接数 {server.connections:>4} (每图集 {server.connections / GALLERIES:.1f})  "
+          f"请求数 {server.requests:>4}  耗时 {elapsed:.2f}s")
+
+
+if __name__ == '__main__':
+    print(f"{GALLERIES} 个图集 x {IMAGES_PER_GALLERY} 张图片")
+    with LocalImageServer() as server:
+        run("每图新建会话", server, download_per_image_session)
+        with ImageDownloader() as downloader:
+            run("共享下载器", server, lambda urls, d: download_shared(downloader, urls, d))
+            print(f"下载器新建连接数: {downloader.connection_count()}")
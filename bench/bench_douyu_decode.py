@@ -0,0 +1,65 @@
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../crawler'))
+from douyu_barrage import PacketDecoder
+from douyu_traffic import message_bodies, websocket_messages
+
+# 用法: python bench/bench_douyu_decode.py [包数] [每条消息平均包数]
+PACKETS = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+PER_MESSAGE = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+
+
+def parse_binary_packets_legacy(data):
+    """旧实现：每个字段切片后 struct.unpack，正文先复制再解码，结尾的半包直接丢弃"""
+    import struct
+    offset = 0
+    while offset + 12 <= len(data):
+        pkt_len = struct.unpack('<I', data[offset:offset + 4])[0]
+        total = 4 + pkt_len
+        if offset + total > len(data):
+            break
+        msg_type = struct.unpack('<I', data[offset + 8:offset + 12])[0]
+        body = data[offset + 12:offset + total]
+        if body and body[-1] == 0:
+            body = body[:-1]
+        yield msg_type, body.decode('utf-8', errors='ignore')
+        offset += total
+
+
+def run_legacy(messages):
+    count = 0
+    for data in messages:
+        for _ in parse_binary_packets_legacy(data):
+            count += 1
+    return count
+
+
+def run_decoder(messages):
+    decoder = PacketDecoder()
+    count = 0
+    for data in messages:
+        count += len(decoder.feed(data))
+    return count
+
+
+def report(name, fn, messages):
+    size = sum(len(data) for data in messages)
+    start = time.perf_counter()
+    count = fn(messages)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<24} 解出 {count:>7} 包  {count / elapsed:>10.0f} 包/秒  {size / elapsed / 1024 / 1024:.1f}MB/s")
+    return count
+
+
+if __name__ == '__main__':
+    bodies = message_bodies(PACKETS)
+    aligned = websocket_messages(bodies, PER_MESSAGE)
+    split = websocket_messages(bodies, PER_MESSAGE, split=True)
+    print(f"{PACKETS} 个包，每条消息平均 {PER_MESSAGE} 个包")
+    report("旧实现(按包对齐)", run_legacy, aligned)
+    report("PacketDecoder(按包对齐)", run_decoder, aligned)
+    lost = PACKETS - report("旧实现(随机切分)", run_legacy, split)
+    report("PacketDecoder(随机切分)", run_decoder, split)
+    print(f"随机切分时旧实现丢失 {lost} 个包")
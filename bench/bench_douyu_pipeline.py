@@ -0,0 +1,138 @@
+"""
+弹幕接收全流程的负载测试：子进程运行 douyu_replay_server.py 回放流量，本进程用 connect_and_listen 接收，
+统计持续吞吐（条/秒）、处理延迟（入队到处理完）的 p50/p99 和每千条消息的 CPU 时间
+用法: python bench/bench_douyu_pipeline.py [--capture 录制文件 --room 房间号] [--rates 5000,20000,0] [--output print|sink|none]
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../crawler'))
+import douyu_barrage
+from BarrageSink import BatchWriter, JsonlSink
+from douyu_replay_server import DEFAULT_PORT
+
+SERVER = os.path.join(os.path.dirname(__file__), 'douyu_replay_server.py')
+
+
+class SampledStats(douyu_barrage.RoomStats):
+    """额外保存每条消息的处理延迟，用于计算分位数"""
+
+    def __init__(self, room_id):
+        super().__init__(room_id)
+        self.samples = []
+
+    def record_lag(self, lag):
+        super().record_lag(lag)
+        self.samples.append(lag)
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+@contextlib.contextmanager
+def replay_server(port, rate, capture=None, room=None):
+    command = [sys.executable, SERVER, "--port", str(port), "--rate", str(rate)]
+    if capture:
+        command += ["--capture", capture]
+    if room:
+        command += ["--room", room]
+    proc = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    try:
+        proc.stdout.readline()  # 开始监听后输出一行
+        yield proc
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def make_output(kind, out_dir):
+    """:return: (output, 结束时调用的清理函数)"""
+    if kind == "none":
+        return (lambda msg, room='': None), (lambda: None)
+    if kind == "sink":
+        writer = BatchWriter(JsonlSink(out_dir))
+        return douyu_barrage.MessageOutput(writer, print_sample=0.0), writer.close
+    # 终端输出写到 /dev/null：只计格式化和 print 本身的开销，不受终端速度影响
+    devnull = open(os.devnull, "w", encoding="utf-8")
+    real_stdout = sys.stdout
+    sys.stdout = devnull
+
+    def restore():
+        sys.stdout = real_stdout
+        devnull.close()
+
+    return douyu_barrage.MessageOutput(None, print_sample=1.0), restore
+
+
+async def measure(port, output, duration, warmup):
+    stats = SampledStats("bench")
+    task = asyncio.ensure_future(douyu_barrage.connect_and_listen(
+        "bench", [f"ws://127.0.0.1:{port}/"], stats=stats, room="bench", output=output))
+    try:
+        while not stats.connected:
+            if task.done():
+                task.result()
+            await asyncio.sleep(0.05)
+        await asyncio.sleep(warmup)
+        stats.samples.clear()
+        messages, wall, cpu = stats.messages, time.perf_counter(), time.process_time()
+        await asyncio.sleep(duration)
+        messages = stats.messages - messages
+        wall = time.perf_counter() - wall
+        cpu = time.process_time() - cpu
+        return {
+            "rate": messages / wall,
+            "p50": percentile(stats.samples, 0.5),
+            "p99": percentile(stats.samples, 0.99),
+            "cpu_per_1k": cpu / messages * 1000 if messages else 0.0,
+            "dropped": stats.dropped + stats.overflowed,
+        }
+    finally:
+        task.cancel()
+        with contextlib.suppress(BaseException):
+            await task
+
+
+def main():
+    parser = argparse.ArgumentParser(description="弹幕接收全流程负载测试")
+    parser.add_argument("--capture", help="douyu_barrage.py --record 录制的文件（默认用合成流量）")
+    parser.add_argument("--room", help="只回放录制文件中这个房间的帧")
+    parser.add_argument("--rates", default="5000,20000,0", help="服务器发送速率（包/秒），逗号分隔，0 为不限速")
+    parser.add_argument("--output", choices=("print", "sink", "none"), default="print",
+                        help="消息的去向：终端输出(写到 /dev/null)、jsonl 批量写入、不处理")
+    parser.add_argument("--duration", type=float, default=5, help="每个速率的测量时长（秒）")
+    parser.add_argument("--warmup", type=float, default=1, help="连接后等待多久开始测量（秒）")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as out_dir:
+        for rate in [float(r) for r in args.rates.split(",")]:
+            with replay_server(args.port, rate, args.capture, args.room):
+                output, cleanup = make_output(args.output, out_dir)
+                try:
+                    result = asyncio.run(measure(args.port, output, args.duration, args.warmup))
+                finally:
+                    cleanup()
+            results.append((rate, result))
+
+    print(f"输出: {args.output}  流量: {args.capture or '合成'}")
+    print(f"{'发送速率':>10} {'接收 条/秒':>12} {'p50 延迟':>10} {'p99 延迟':>10} {'CPU/千条':>10} {'丢弃':>8}")
+    for rate, r in results:
+        label = f"{rate:.0f}" if rate else "不限速"
+        print(f"{label:>12} {r['rate']:>14.0f} {r['p50'] * 1000:>10.2f}ms {r['p99'] * 1000:>10.2f}ms "
+              f"{r['cpu_per_1k'] * 1000:>10.1f}ms {r['dropped']:>8}")
+
+
+if __name__ == '__main__':
+    main()
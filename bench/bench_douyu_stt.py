@@ -0,0 +1,72 @@
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../utils'))
+from DouyuSTT import STTMessage, loads
+from douyu_traffic import message_bodies
+
+# 用法: python bench/bench_douyu_stt.py [消息数]
+COUNT = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+SHOWN_TYPES = ('chatmsg', 'dgb', 'spbc', 'ssd', 'onlinegift')  # 终端会显示的消息类型
+
+
+def parse_kv_legacy(data_str):
+    """旧实现：不处理 @S/@A 转义"""
+    result = {}
+    for pair in data_str.split('/'):
+        idx = pair.find('@=')
+        if idx != -1:
+            result[pair[:idx]] = pair[idx + 2:]
+    return result
+
+
+def full_legacy(bodies):
+    for body in bodies:
+        parse_kv_legacy(body)
+
+
+def full_stt(bodies):
+    for body in bodies:
+        loads(body)
+
+
+def filter_legacy(bodies):
+    """接收循环的实际用法：先取 type，只有需要显示的消息才读取其他字段"""
+    shown = 0
+    for body in bodies:
+        msg = parse_kv_legacy(body)
+        if msg.get('type', '') in SHOWN_TYPES:
+            msg.get('nn')
+            shown += 1
+    return shown
+
+
+def filter_lazy(bodies):
+    shown = 0
+    for body in bodies:
+        msg = STTMessage(body)
+        if msg.type in SHOWN_TYPES:
+            msg.get('nn')
+            shown += 1
+    return shown
+
+
+def report(name, fn, bodies):
+    start = time.perf_counter()
+    fn(bodies)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<28} {len(bodies) / elapsed:>10.0f} 条/秒")
+
+
+if __name__ == '__main__':
+    bodies = message_bodies(COUNT)
+    print(f"{COUNT} 条消息（uenter/chatmsg/dgb 混合）")
+    report("完整解析 parse_kv", full_legacy, bodies)
+    report("完整解析 DouyuSTT.loads", full_stt, bodies)
+    report("按 type 过滤 parse_kv", filter_legacy, bodies)
+    report("按 type 过滤 STTMessage", filter_lazy, bodies)
+
+    sample = next(body for body in bodies if body.startswith('type@=chatmsg'))
+    print(f"转义示例 ic 字段: parse_kv={parse_kv_legacy(sample)['ic']!r}  "
+          f"STTMessage={STTMessage(sample).get_list('ic')!r}")
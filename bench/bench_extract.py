@@ -0,0 +1,70 @@
+import os
+import sys
+import time
+from lxml import etree
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../utils'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '../crawler'))
+from eetuku import EetukuExtractor
+from html_fixtures import detail_page, listing_page
+
+# 用法: python bench/bench_extract.py [重复次数] [保存的详情页HTML文件...]
+# 不指定文件时使用 html_fixtures 生成的合成页面
+# 单次计时的波动和各方式之间的差距差不多大，每种方式交替测 REPEATS 轮，取最快的一轮
+ROUNDS = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+FILES = sys.argv[2:]
+REPEATS = 5
+
+
+def extract_detail_legacy(text):
+    """旧做法：每次新建解析器，字符串 XPath 每次重新编译"""
+    tree = etree.HTML(text, parser=etree.HTMLParser(encoding="utf-8"))
+    title = tree.xpath('//div[@class="inside-article"]//h1[@class="entry-title"]/text()')[0]
+    file_date = tree.xpath('//div[@class="entry-meta"]//time[@class="entry-date published"]/text()')[0]
+    pics = [pic for pic in tree.xpath('//div[@class="inside-article"]//img/@data-src') if '260x390' not in pic]
+    return f"{title} ({file_date})", pics, tree.xpath('//div[@class="page-links"]//a/@href')
+
+
+def timeit(fn, pages):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        for text in pages:
+            result = fn(text)
+    return (time.perf_counter() - start) / (ROUNDS * len(pages)) * 1000, result
+
+
+if __name__ == '__main__':
+    if FILES:
+        pages = []
+        for path in FILES:
+            with open(path, encoding="utf-8") as f:
+                pages.append(f.read())
+    else:
+        pages = [detail_page()]
+    size = sum(len(text) for text in pages) / len(pages)
+    print(f"{len(pages)} 个详情页，平均 {size / 1024:.1f}K 字符，每种方式重复 {ROUNDS} 次")
+
+    full = EetukuExtractor()
+    partial = EetukuExtractor(partial=True)
+    methods = [("新建解析器+字符串XPath", extract_detail_legacy), ("复用解析器+预编译XPath", full.detail),
+               ("部分解析(正文结束即停)", partial.detail)]
+    best = {name: float("inf") for name, _ in methods}
+    results = {}
+    for _ in range(REPEATS):
+        for name, fn in methods:
+            ms, results[name] = timeit(fn, pages)
+            best[name] = min(best[name], ms)
+    legacy_name = methods[0][0]
+    expected = results[legacy_name]
+    print(f"{legacy_name}  {best[legacy_name]:.3f}ms/页  (最快的一轮，共{REPEATS}轮)")
+    for name, _ in methods[1:]:
+        status = "一致" if results[name] == expected else "结果不一致"
+        print(f"{name}  {best[name]:.3f}ms/页  加速 {best[legacy_name] / best[name]:.2f}x  {status}")
+
+    if not FILES:
+        text = listing_page()
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            detail_list, titles = full.listing(text)
+        ms = (time.perf_counter() - start) / ROUNDS * 1000
+        print(f"列表页({len(detail_list)}篇)  {ms:.3f}ms/页")
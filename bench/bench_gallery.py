@@ -0,0 +1,50 @@
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../utils'))
+from ImageDownloader import ImageDownloader
+from GalleryDownloader import download_gallery, failed_results
+from AsyncFetcher import AsyncFetcher, httpx
+from local_image_server import LocalImageServer
+
+
+# 用法: python bench/bench_gallery.py [每个图集图片数] [模拟延迟秒数] [并发数]
+IMAGES = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+LATENCY = float(sys.argv[2]) if len(sys.argv) > 2 else 0.2
+WORKERS = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+
+
+async def fetch_async(urls, save_dir):
+    async with AsyncFetcher(per_host_limit=WORKERS) as fetcher:
+        return await fetcher.download_gallery(urls, save_dir)
+
+
+if __name__ == '__main__':
+    print(f"{IMAGES} 张图片，单张延迟 {LATENCY}s，并发 {WORKERS}")
+    with LocalImageServer(latency=LATENCY) as server, ImageDownloader() as downloader:
+        with tempfile.TemporaryDirectory() as tmp:
+            urls = server.gallery_urls("serial", IMAGES)
+            start = time.perf_counter()
+            for url in urls:
+                downloader.fetch(url, os.path.join(tmp, "serial"))
+            serial = time.perf_counter() - start
+            print(f"串行下载   耗时 {serial:.2f}s")
+
+            urls = server.gallery_urls("concurrent", IMAGES)
+            start = time.perf_counter()
+            results = download_gallery(urls, os.path.join(tmp, "concurrent"), downloader=downloader,
+                                       max_workers=WORKERS, per_host_limit=WORKERS)
+            concurrent = time.perf_counter() - start
+            print(f"并发下载   耗时 {concurrent:.2f}s  失败 {len(failed_results(results))}  "
+                  f"加速 {serial / concurrent:.1f}x")
+
+            if httpx is not None:
+                urls = server.gallery_urls("asyncio", IMAGES)
+                start = time.perf_counter()
+                results = asyncio.run(fetch_async(urls, os.path.join(tmp, "asyncio")))
+                elapsed = time.perf_counter() - start
+                print(f"asyncio下载 耗时 {elapsed:.2f}s  失败 {len(failed_results(results))}  "
+                      f"加速 {serial / elapsed:.1f}x")
@@ -0,0 +1,29 @@
+import os
+import sys
+import tempfile
+import tracemalloc
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../utils'))
+from ImageDownloader import ImageDownloader
+from local_image_server import LocalImageServer
+
+# 用法: python bench/bench_memory.py [图片大小MB]
+IMAGE_MB = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+
+def peak_memory(downloader, url, save_dir):
+    tracemalloc.start()
+    result = downloader.fetch(url, save_dir)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, peak
+
+
+if __name__ == '__main__':
+    with LocalImageServer(image_size=IMAGE_MB * 1024 * 1024) as server, tempfile.TemporaryDirectory() as tmp:
+        url = server.gallery_urls("big", 1)[0]
+        for name, stream in (("整体读取", False), ("流式写入", True)):
+            with ImageDownloader(stream=stream, hash_algo="sha256") as downloader:
+                result, peak = peak_memory(downloader, url, os.path.join(tmp, name))
+            print(f"{name}  文件 {result['size'] / 1024 / 1024:.1f}MB  Python 内存峰值 {peak / 1024 / 1024:.2f}MB  "
+                  f"sha256 {result['hash'][:16]}")
@@ -0,0 +1,123 @@
+"""
+本地的斗鱼弹幕服务器替身：客户端发来 loginreq 后，回放录制的原始帧或合成流量
+用法: python bench/douyu_replay_server.py [--capture 录制文件] [--rate 包/秒 | --speed 倍数] [--port 端口]
+客户端: connect_and_listen(房间号, urls=['ws://127.0.0.1:端口/'])
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../crawler'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '../utils'))
+from DouyuCapture import read_frames
+from douyu_barrage import PacketDecoder
+from douyu_traffic import message_bodies, pack_packet, websocket_messages
+
+DEFAULT_PORT = 18800
+
+
+def load_frames(capture=None, room=None, count=50000, packets_per_message=8):
+    """
+    :param room: 只取这个房间的帧；录制文件里有多个房间时应当指定，否则各房间的数据流交错，跨帧的包会拼错
+    :return: [(相对第一帧的时间, 帧, 帧中完整的包数)]；合成流量没有时间（为 0）
+    """
+    if capture:
+        records = [(received, data) for received, _, data in read_frames(capture, room)]
+        if not records:
+            raise ValueError(f"录制文件中没有帧: {capture}")
+        start = records[0][0]
+        records = [(received - start, data) for received, data in records]
+    else:
+        records = [(0.0, data) for data in websocket_messages(message_bodies(count), packets_per_message)]
+    # 按包计速率：一个包可能跨两帧，用解码器数出每帧结束时完整的包数
+    decoder = PacketDecoder()
+    return [(offset, data, len(decoder.feed(data))) for offset, data in records]
+
+
+class ReplayServer:
+    """
+    :param rate: 每秒发送的包数，0 为不限速
+    :param speed: 没有指定 rate 时按录制时的时间间隔乘以 1/speed 回放（合成流量没有时间间隔，等于不限速）
+    :param loop: 回放完后从头继续
+    """
+
+    def __init__(self, frames, rate=None, speed=1.0, loop=True):
+        self.frames = frames
+        self.rate = rate
+        self.speed = speed
+        self.loop = loop
+        self.sent_packets = 0
+        self.sent_frames = 0
+        self.clients = 0
+
+    async def handler(self, ws):
+        await ws.recv()  # loginreq
+        self.clients += 1
+        await ws.send(pack_packet("type@=loginres/"))
+        # 客户端的 joingroup、心跳等只读掉，不处理
+        reader = asyncio.ensure_future(self._drain(ws))
+        try:
+            await self._replay(ws)
+        finally:
+            reader.cancel()
+
+    @staticmethod
+    async def _drain(ws):
+        async for _ in ws:
+            pass
+
+    async def _replay(self, ws):
+        start = time.monotonic()
+        packets = 0
+        while True:
+            pass_start = time.monotonic()
+            for offset, data, count in self.frames:
+                if self.rate:
+                    due = start + packets / self.rate
+                elif self.rate is None and offset:
+                    due = pass_start + offset / self.speed
+                else:
+                    due = 0
+                delay = due - time.monotonic()
+                # 太短的等待合并到后面，避免每帧都 sleep
+                if delay > 0.001:
+                    await asyncio.sleep(delay)
+                await ws.send(data)
+                packets += count
+                self.sent_packets += count
+                self.sent_frames += 1
+            if not self.loop:
+                await ws.close()
+                return
+
+
+async def serve(port, server):
+    import websockets
+    async with websockets.serve(server.handler, '127.0.0.1', port, max_size=2 ** 20):
+        # 开始监听后再输出，启动它的测试脚本读到这一行就可以连接
+        frames = server.frames
+        print(f"{len(frames)} 帧 {sum(count for _, _, count in frames)} 包，监听 ws://127.0.0.1:{port}/", flush=True)
+        await asyncio.Future()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="回放斗鱼弹幕帧的本地 websocket 服务器")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--capture", help="douyu_barrage.py --record 录制的文件（默认用合成流量）")
+    parser.add_argument("--room", help="只回放录制文件中这个房间的帧")
+    parser.add_argument("--count", type=int, default=50000, help="合成流量的包数")
+    parser.add_argument("--rate", type=float, default=None, help="每秒发送的包数，0 为不限速")
+    parser.add_argument("--speed", type=float, default=1.0, help="按录制时间间隔回放的倍速")
+    parser.add_argument("--once", action="store_true", help="回放一遍后断开（默认循环）")
+    return parser
+
+
+if __name__ == '__main__':
+    args = build_parser().parse_args()
+    frames = load_frames(args.capture, args.room, args.count)
+    try:
+        asyncio.run(serve(args.port, ReplayServer(frames, args.rate, args.speed, not args.once)))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,65 @@
+"""按斗鱼热门直播间的消息结构生成的合成流量，供弹幕解析基准测试使用"""
+import random
+import struct
+
+# 热门房间里 uenter（进房提示）最多，其次是弹幕和礼物
+MESSAGE_MIX = (("uenter", 0.5), ("chatmsg", 0.35), ("dgb", 0.15))
+
+
+def pack_packet(body, msg_type=690):
+    data = body.encode("utf-8") + b"\x00"
+    length = 8 + len(data)
+    return struct.pack("<III", length, length, msg_type) + data
+
+
+def chatmsg(rng, i):
+    return (f"type@=chatmsg/rid@=11222/ct@=14/uid@={rng.randint(10 ** 7, 10 ** 9)}/nn@=观众{i}/"
+            f"txt@=弹幕内容{i} 666@S主播加油/cid@={rng.getrandbits(64):x}/"
+            f"ic@=avanew@Sface@S{rng.randint(1, 99)}@S{rng.getrandbits(32):x}/level@={rng.randint(1, 90)}/"
+            f"sahf@=0/nl@={rng.randint(0, 7)}/cst@={1700000000000 + i}/bnn@=粉丝牌/bl@={rng.randint(0, 30)}/"
+            f"brid@=11222/hc@={rng.getrandbits(64):x}/el@=/lk@=/dms@=4/pdg@=66/pdk@=88/ext@=/")
+
+
+def uenter(rng, i):
+    return (f"type@=uenter/rid@=11222/uid@={rng.randint(10 ** 7, 10 ** 9)}/nn@=观众{i}/"
+            f"level@={rng.randint(1, 90)}/ic@=avanew@Sface@S{rng.getrandbits(32):x}/rni@=0/el@=/sahf@=0/"
+            f"wgei@=0/crw@=0/fl@={rng.randint(0, 30)}/")
+
+
+def dgb(rng, i):
+    return (f"type@=dgb/rid@=11222/gfid@={rng.randint(100, 2000)}/gs@=0/uid@={rng.randint(10 ** 7, 10 ** 9)}/"
+            f"nn@=观众{i}/ic@=avanew@Sface@S{rng.getrandbits(32):x}/eid@=0/eic@=0/level@={rng.randint(1, 90)}/"
+            f"dw@=0/gfcnt@=1/hits@={rng.randint(1, 99)}/bcnt@=1/bst@=1/ct@=0/el@=/cm@=0/bnn@=粉丝牌/"
+            f"bl@={rng.randint(0, 30)}/brid@=11222/hc@={rng.getrandbits(64):x}/sahf@=0/fc@=0/giftName@=荧光棒/")
+
+
+BUILDERS = {"chatmsg": chatmsg, "uenter": uenter, "dgb": dgb}
+
+
+def message_bodies(count, seed=0):
+    """生成 count 条 STT 正文"""
+    rng = random.Random(seed)
+    kinds = [kind for kind, _ in MESSAGE_MIX]
+    weights = [weight for _, weight in MESSAGE_MIX]
+    return [BUILDERS[rng.choices(kinds, weights)[0]](rng, i) for i in range(count)]
+
+
+def websocket_messages(bodies, packets_per_message=8, split=False, seed=0):
+    """
+    把正文打包成 websocket 消息
+    :param packets_per_message: 每条消息平均包含的包数
+    :param split: 为 True 时在随机位置切分字节流，包会被拆到相邻两条消息里
+    """
+    rng = random.Random(seed)
+    packets = [pack_packet(body) for body in bodies]
+    if not split:
+        return [b"".join(packets[i:i + packets_per_message]) for i in range(0, len(packets), packets_per_message)]
+    stream = b"".join(packets)
+    average = len(stream) * packets_per_message // len(packets)
+    messages = []
+    offset = 0
+    while offset < len(stream):
+        size = rng.randint(average // 2, average * 3 // 2)
+        messages.append(stream[offset:offset + size])
+        offset += size
+    return messages
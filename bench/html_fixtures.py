@@ -0,0 +1,47 @@
+"""按 eetuku 页面结构生成的合成 HTML，供解析基准测试使用（正文之后带侧边栏和页脚，接近真实页面的体积）"""
+
+SIDEBAR_ITEMS = 300
+FOOTER_SCRIPT = "<script>" + "var x = 1;" * 3000 + "</script>"
+
+
+def _sidebar():
+    items = "".join(f'<li><a href="/tag/{i}">标签{i}</a><span class="count">{i}</span></li>' for i in range(SIDEBAR_ITEMS))
+    return f'<div id="right-sidebar" class="widget-area"><aside class="widget"><ul>{items}</ul></aside></div>'
+
+
+def _footer():
+    return f'<footer class="site-info"><div class="inside-site-info">Copyright</div></footer>{FOOTER_SCRIPT}'
+
+
+def _head():
+    return ('<head><meta charset="utf-8"><title>eetuku</title>'
+            + "".join(f'<link rel="stylesheet" href="/css/{i}.css">' for i in range(20)) + '</head>')
+
+
+def listing_page(page=1, articles=24):
+    """列表页：articles 篇文章，每篇带链接、标题和日期"""
+    body = "".join(
+        f'<article class="post"><div class="inside-article">'
+        f'<div class="post-image"><a href="{page}-{i}.html"><img data-src="/thumb/{page}-{i}-260x390.jpg"></a></div>'
+        f'<header class="entry-header"><h2 class="entry-title"><a href="{page}-{i}.html">图集 {page}-{i}</a></h2>'
+        f'<div class="entry-meta"><time class="entry-date published">2026-01-{i % 28 + 1:02d}</time></div>'
+        f'</header></div></article>'
+        for i in range(articles)
+    )
+    return (f'<!DOCTYPE html><html>{_head()}<body><div id="page"><main class="site-main">{body}</main>'
+            f'{_sidebar()}</div>{_footer()}</body></html>')
+
+
+def detail_page(name="1-0", pics=40, sub_pages=3):
+    """详情页：pics 张图片，sub_pages>0 时带分页链接"""
+    images = "".join(f'<p><img data-src="https://img.example.com/{name}/{j}.jpg" alt=""></p>' for j in range(pics))
+    links = "".join(f'<a href="{name}/{k}">{k}</a>' for k in range(2, sub_pages + 2))
+    page_links = f'<div class="page-links">{links}</div>' if sub_pages else ''
+    article = (
+        f'<div class="inside-article"><header class="entry-header"><h1 class="entry-title">图集 {name}</h1>'
+        f'<div class="entry-meta"><time class="entry-date published">2026-01-01</time></div></header>'
+        f'<div class="entry-content">{images}<img data-src="/thumb/{name}-260x390.jpg">{page_links}</div></div>'
+    )
+    related = listing_page(0, 8).split('<main class="site-main">')[1].split('</main>')[0]
+    return (f'<!DOCTYPE html><html>{_head()}<body><div id="page"><main class="site-main">{article}'
+            f'<div class="related">{related}</div></main>{_sidebar()}</div>{_footer()}</body></html>')
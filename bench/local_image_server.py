@@ -0,0 +1,105 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _ImageHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # 支持 keep-alive
+
+    def setup(self):
+        super().setup()
+        # 每个 handler 实例对应一条 TCP 连接
+        with self.server.stats_lock:
+            self.server.connections += 1
+
+    def do_HEAD(self):
+        self._respond(send_body=False)
+
+    def do_GET(self):
+        self._respond(send_body=True)
+
+    def _respond(self, send_body):
+        with self.server.stats_lock:
+            self.server.requests += 1
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        body = self.server.body
+        etag = '"local-image"'
+        start = 0
+        range_header = self.headers.get('Range')
+        if_range = self.headers.get('If-Range')
+        if range_header and range_header.startswith('bytes=') and if_range in (None, etag):
+            start = int(range_header[len('bytes='):].split('-')[0])
+        if start >= len(body) > 0:
+            self.send_response(416)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(206 if start else 200)
+        self.send_header('Content-Type', 'image/jpeg')
+        self.send_header('ETag', etag)
+        self.send_header('Accept-Ranges', 'bytes')
+        if start:
+            self.send_header('Content-Range', f'bytes {start}-{len(body) - 1}/{len(body)}')
+        self.send_header('Content-Length', str(len(body) - start))
+        self.end_headers()
+        if send_body:
+            with self.server.stats_lock:
+                self.server.bytes_sent += len(body) - start
+            self.wfile.write(body[start:])
+
+    def log_message(self, format, *args):
+        pass
+
+
+class LocalImageServer:
+    """本地图片服务器，统计连接数和请求数，供基准测试使用"""
+
+    def __init__(self, image_size=64 * 1024, latency=0.0):
+        """
+        :param image_size: 每张图片的字节数
+        :param latency: 每个请求的模拟延迟（秒）
+        """
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), _ImageHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.stats_lock = threading.Lock()
+        self.httpd.connections = 0
+        self.httpd.requests = 0
+        self.httpd.bytes_sent = 0
+        self.httpd.latency = latency
+        self.httpd.body = b'\xff' * image_size
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}"
+
+    def gallery_urls(self, gallery, count):
+        return [f"{self.base_url}/{gallery}/{i}.jpg" for i in range(count)]
+
+    def reset(self):
+        with self.httpd.stats_lock:
+            self.httpd.connections = 0
+            self.httpd.requests = 0
+            self.httpd.bytes_sent = 0
+
+    @property
+    def connections(self):
+        return self.httpd.connections
+
+    @property
+    def requests(self):
+        return self.httpd.requests
+
+    @property
+    def bytes_sent(self):
+        return self.httpd.bytes_sent
@@ -0,0 +1,101 @@
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../utils'))
+from DownloadFileDB import create_db
+from SeenCache import SeenCache
+from HttpCache import DEFAULT_CACHE_DIR, DEFAULT_TTL, HttpCache
+from ContentStore import DEFAULT_INDEX_PATH, ContentStore
+
+# 用法示例:
+#   python crawler/crawl.py eetuku --category hanguo --pages 1-5
+#   python crawler/crawl.py eetuku --category hanguo --until-seen
+#   python crawler/crawl.py pornpics --category japanese --pages 0-3 --db sqlite
+SITES = ("eetuku", "pornpics")
+DEFAULT_CATEGORY = {"eetuku": "hanguo", "pornpics": "japanese"}
+FIRST_PAGE = {"eetuku": 1, "pornpics": 0}
+
+
+def parse_page_range(value):
+    """解析 "3" 或 "1-5" 形式的页码范围，返回 (起始页, 结束页)"""
+    try:
+        if '-' in value:
+            start, end = value.split('-', 1)
+            start, end = int(start), int(end)
+        else:
+            start = end = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"页码范围格式错误: {value}（应为 3 或 1-5）")
+    if start > end:
+        raise argparse.ArgumentTypeError(f"起始页不能大于结束页: {value}")
+    return start, end
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="按分类和页码范围爬取图集，已下载过的自动跳过")
+    parser.add_argument("site", choices=SITES, help="网站")
+    parser.add_argument("--category", help="分类（eetuku 默认 hanguo，pornpics 默认 japanese）")
+    parser.add_argument("--pages", type=parse_page_range, help="页码范围，如 3 或 1-5")
+    parser.add_argument("--start", type=int, help="起始页（配合 --until-seen 使用）")
+    parser.add_argument("--until-seen", action="store_true", help="一直翻页，直到某一页全部已下载过为止")
+    parser.add_argument("--db", choices=("mysql", "sqlite"), help="去重数据库后端（默认读取 DOWNLOAD_DB_BACKEND）")
+    parser.add_argument("--detail-workers", type=int, default=2, help="详情页并发数")
+    parser.add_argument("--download-workers", type=int, default=2, help="同时下载的图集数")
+    parser.add_argument("--async-io", action="store_true", help="用 asyncio + httpx 下载图片（需要安装 httpx）")
+    parser.add_argument("--partial-parse", action="store_true",
+                        help="eetuku 详情页只解析到正文结束为止，跳过侧边栏和页脚（pornpics 忽略）")
+    parser.add_argument("--http-cache", nargs="?", const=DEFAULT_CACHE_DIR,
+                        help=f"缓存列表页/详情页，可指定缓存目录（默认 {DEFAULT_CACHE_DIR}）")
+    parser.add_argument("--cache-ttl", type=float, default=DEFAULT_TTL, help="详情页缓存多少秒内不访问网络")
+    parser.add_argument("--dedupe", nargs="?", const=DEFAULT_INDEX_PATH,
+                        help=f"按图片内容去重，重复的改为硬链接，可指定索引文件（默认 {DEFAULT_INDEX_PATH}）")
+    parser.add_argument("--stats-interval", type=float, default=60, help="流水线统计打印间隔（秒）")
+    return parser
+
+
+def create_crawler(args, db, content_store=None):
+    category = args.category or DEFAULT_CATEGORY[args.site]
+    http_cache = HttpCache(args.http_cache, ttl=args.cache_ttl) if args.http_cache else None
+    if args.site == "eetuku":
+        from eetuku import EetukuCrawler
+        return EetukuCrawler(category=category, db=db, detail_workers=args.detail_workers,
+                             download_workers=args.download_workers, stats_interval=args.stats_interval,
+                             async_io=args.async_io, partial_parse=args.partial_parse, http_cache=http_cache,
+                             content_store=content_store)
+    # pornpics 依赖 playwright，只在用到时导入
+    from pronpics import PornpicsCrawler
+    return PornpicsCrawler(url=f'https://www.pornpics.com/zh/{category}/', db=db,
+                           render_workers=args.detail_workers, download_workers=args.download_workers,
+                           stats_interval=args.stats_interval, async_io=args.async_io, http_cache=http_cache,
+                           content_store=content_store)
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.pages is None and not args.until_seen:
+        parser.error("需要指定 --pages 或 --until-seen")
+    if args.pages is not None:
+        start_page, end_page = args.pages
+        if args.start is not None:
+            parser.error("--pages 和 --start 不能同时使用")
+    else:
+        start_page = args.start if args.start is not None else FIRST_PAGE[args.site]
+        end_page = None
+
+    db = SeenCache(create_db(args.db, pool_size=2))
+    content_store = ContentStore(args.dedupe) if args.dedupe else None
+    crawler = create_crawler(args, db, content_store)
+    print(crawler.a_name)
+    try:
+        crawler.crawl_pages(start_page, end_page, until_seen=args.until_seen)
+    finally:
+        crawler.close()
+        if content_store is not None:
+            print(f"内容去重: {content_store.format_stats()}")
+            content_store.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,8 @@
+import argparse
 import asyncio
+import contextlib
+import os
+import random
 import struct
 import time
 import sys
@@ -6,8 +10,16 @@ import ssl
 import re
 from colorama import Fore, Style, init
 
+sys.path.append(os.path.join(os.path.dirname(__file__), '../utils'))
+from BarrageSink import SINK_KINDS, BatchWriter, create_sink, to_record
+from DouyuCapture import FrameRecorder
+from DouyuSTT import STTMessage, dumps as stt_dumps
+
 init(autoreset=True)
 # cmd窗口启用方式 python crawler/douyu_barrage.py 房间号
+# 多个房间: python crawler/douyu_barrage.py 房间号1 房间号2 ... 或 --rooms-file rooms.txt
+# 保存弹幕: python crawler/douyu_barrage.py 房间号 --sink jsonl.gz（终端默认不再逐条显示，--print-sample 0.05 抽样显示）
+# 录制原始帧（供 bench/douyu_replay_server.py 回放）: python crawler/douyu_barrage.py 房间号 --record capture.dycap
 # Fix Windows console encoding and disable buffering
 if sys.platform == 'win32':
     import io
@@ -15,8 +27,27 @@ if sys.platform == 'win32':
 else:
     sys.stdout.reconfigure(line_buffering=True)
 
-RECONNECT_DELAY = 3
+RECONNECT_BASE_DELAY = 0.5  # 重连等待的起始值，连续失败时按指数增加（带随机抖动）
+RECONNECT_MAX_DELAY = 30
+STABLE_SESSION = 60  # 连接保持超过这么多秒后断开，重连等待回到起始值
+OPEN_TIMEOUT = 5  # 单个服务器的握手超时（秒）
+RACE_STAGGER = 0.3  # 上一个服务器这么多秒还没连上就同时尝试下一个
+RACE_WIDTH = 3  # 同时尝试的服务器数上限
+FAILURE_COOLDOWN = 30  # 连接失败的服务器排到最后的时间（连续失败时加倍）
 KEEPALIVE_INTERVAL = 40
+MAX_PACKET_SIZE = 1 << 20  # 单个包的长度上限，超过说明数据流已错位
+MAX_CONCURRENT_CONNECTS = 20  # 多房间启动时同时进行的握手数
+STATS_INTERVAL = 30  # 多房间时打印各房间消息速率的间隔（秒）
+STATS_TOP_ROOMS = 20  # 速率统计只列出最活跃的房间数
+SHOWN_TYPES = ('chatmsg', 'dgb', 'spbc', 'ssd', 'onlinegift')  # 显示和保存的消息类型
+QUEUE_SIZE = 10000  # 每个连接待处理消息队列的长度
+PROCESSORS = 2  # 每个连接处理消息的任务数
+PROCESS_BATCH = 256  # 处理任务每次从队列取出、交给线程池处理的最多消息数
+LAG_THRESHOLD = 1.0  # 收到后超过这么多秒才处理完的消息记为延迟
+ENDPOINTS = (
+    [f'wss://danmuproxy.douyu.com:{p}/' for p in [8506, 8505, 8502, 8504, 8501, 8508]] +
+    [f'wss://wsproxy.douyu.com:{p}/' for p in [6671, 6672, 6673, 6674, 6675]]
+)
 VERBOSE = '-v' in sys.argv or '--verbose' in sys.argv
 
 
@@ -35,36 +66,82 @@ def pack_message(content, msg_type=689):
     return struct.pack('<II', length_field, length_field) + struct.pack('<I', msg_type) + body
 
 
+# 包头: 长度(4) + 长度(4) + 消息类型(4，689 客户端->服务器，690 服务器->客户端)，长度不含第一个字段
+PACKET_HEADER = struct.Struct('<III')
+
+
+class PacketDecoder:
+    """
+    斗鱼二进制帧解码器：一个连接一个实例，跨 websocket 消息保留未收完的包，
+    一个包被拆到两条消息里时等后半部分到达后再输出
+    """
+
+    def __init__(self, max_packet_size=MAX_PACKET_SIZE):
+        self.max_packet_size = max_packet_size
+        self.packets = 0  # 已解出的包数
+        self.errors = 0  # 包头错误（数据流错位）次数
+        self._buffer = bytearray()
+
+    def feed(self, data):
+        """
+        追加一条 websocket 消息，返回其中完整的包
+        :return: [(消息类型, 正文字符串)]，正文去掉结尾的 \\0
+        """
+        buffer = self._buffer
+        buffer += data
+        packets = []
+        offset = 0
+        end = len(buffer)
+        unpack_from = PACKET_HEADER.unpack_from
+        with memoryview(buffer) as view:
+            while offset + 12 <= end:
+                pkt_len, pkt_len2, msg_type = unpack_from(buffer, offset)
+                if pkt_len != pkt_len2 or pkt_len < 8 or pkt_len > self.max_packet_size:
+                    # 包头对不上时无法找回包边界，丢掉缓冲区，等下一条消息从包头重新开始
+                    self.errors += 1
+                    offset = end
+                    break
+                total = 4 + pkt_len
+                if offset + total > end:
+                    break
+                body_end = offset + total
+                if body_end > offset + 12 and buffer[body_end - 1] == 0:
+                    body_end -= 1
+                packets.append((msg_type, str(view[offset + 12:body_end], 'utf-8', 'ignore')))
+                offset += total
+        # 一条消息只压缩一次缓冲区，剩下的不完整包留到下次
+        if offset:
+            del buffer[:offset]
+        self.packets += len(packets)
+        return packets
+
+    def pending(self) -> int:
+        """缓冲区中未组成完整包的字节数"""
+        return len(self._buffer)
+
+    def reset(self) -> None:
+        """重连后清空缓冲区"""
+        self._buffer.clear()
+
+
 def parse_binary_packets(data):
-    offset = 0
-    while offset + 12 <= len(data):
-        pkt_len = struct.unpack('<I', data[offset:offset + 4])[0]
-        total = 4 + pkt_len
-        if offset + total > len(data):
-            break
-        msg_type = struct.unpack('<I', data[offset + 8:offset + 12])[0]
-        body = data[offset + 12:offset + total]
-        if body and body[-1] == 0:
-            body = body[:-1]
-        yield msg_type, body.decode('utf-8', errors='ignore')
-        offset += total
+    """解析一条消息中的完整包（不保留跨消息的半包，需要时用 PacketDecoder）"""
+    yield from PacketDecoder().feed(data)
 
 
 def parse_kv(data_str):
-    result = {}
-    for pair in data_str.split('/'):
-        idx = pair.find('@=')
-        if idx != -1:
-            result[pair[:idx]] = pair[idx + 2:]
-    return result
+    """把一条 STT 消息解析成字典（已处理 @S/@A 转义；只需要 type 时用 STTMessage 更快）"""
+    return STTMessage(data_str).to_dict()
 
 
 def ts():
     return time.strftime('%H:%M:%S')
 
 
-def handle_message(msg):
+def handle_message(msg, room=''):
+    """:param room: 多房间模式下显示在每行前面的房间号"""
     mtype = msg.get('type', '')
+    head = f"[{Fore.BLUE}{ts()}{Style.RESET_ALL}] " + (f"[{room}] " if room else "")
 
     if mtype == 'chatmsg':
         name = msg.get('nn', '未知用户')
@@ -82,13 +159,13 @@ def handle_message(msg):
             color = Fore.WHITE
         if not text:
             return
-        print(f"[{Fore.BLUE}{ts()}{Style.RESET_ALL}] [{color}{name}{Style.RESET_ALL}]: {text}")
+        print(f"{head}[{color}{name}{Style.RESET_ALL}]: {text}")
 
     elif mtype == 'dgb':
         name = msg.get('nn', '未知用户')
         gift = msg.get('giftName', '')
         hits = msg.get('hits', '1')
-        print(f"[{Fore.BLUE}{ts()}{Style.RESET_ALL}] [{Fore.YELLOW}{name}{Style.RESET_ALL}] "
+        print(f"{head}[{Fore.YELLOW}{name}{Style.RESET_ALL}] "
               f"赠送了 {Fore.MAGENTA}{gift}x{hits}{Style.RESET_ALL}")
 
     elif mtype == 'uenter':
@@ -97,109 +174,480 @@ def handle_message(msg):
     elif mtype == 'spbc':
         name = msg.get('nn', '未知用户')
         text = msg.get('txt', '')
-        print(f"[{Fore.BLUE}{ts()}{Style.RESET_ALL}] {Fore.RED}★ {name}{Style.RESET_ALL}: "
+        print(f"{head}{Fore.RED}★ {name}{Style.RESET_ALL}: "
               f"{Fore.YELLOW}{text}{Style.RESET_ALL}")
 
     elif mtype == 'ssd':
         name = msg.get('nn', '未知用户')
-        print(f"[{Fore.BLUE}{ts()}{Style.RESET_ALL}] {Fore.RED}★ {name} 上了套餐{Style.RESET_ALL}")
+        print(f"{head}{Fore.RED}★ {name} 上了套餐{Style.RESET_ALL}")
 
     elif mtype == 'onlinegift':
         name = msg.get('nn', '未知用户')
         gift = msg.get('giftName', '')
-        print(f"[{Fore.BLUE}{ts()}{Style.RESET_ALL}] [{Fore.GREEN}{name}{Style.RESET_ALL}] "
+        print(f"{head}[{Fore.GREEN}{name}{Style.RESET_ALL}] "
               f"拾取了 {Fore.CYAN}{gift}{Style.RESET_ALL}")
 
 
-async def keepalive_task(ws):
+class MessageOutput:
+    """
+    消息的去向：保存时把结构化记录交给后台的 BatchWriter（不等磁盘），
+    终端按 print_sample 的比例抽样显示，接收速度不再受控制台输出限制
+    """
+
+    def __init__(self, writer: BatchWriter = None, print_sample=1.0):
+        self.writer = writer
+        self.print_sample = print_sample
+        self.printed = 0
+
+    def __call__(self, msg, room=''):
+        if self.writer is not None:
+            self.writer.put(to_record(msg, room))
+        sample = self.print_sample
+        if sample >= 1.0 or (sample > 0 and random.random() < sample):
+            handle_message(msg, room)
+            self.printed += 1
+
+
+async def keepalive_task(outbox):
     while True:
         await asyncio.sleep(KEEPALIVE_INTERVAL)
+        tick = int(time.time())
+        outbox.put_nowait(pack_message(stt_dumps({"type": "mrkl", "tick": tick})))
+
+
+async def send_task(ws, outbox):
+    """发送 pongreply、心跳等出站帧：接收循环只放进队列，不等发送完成"""
+    while True:
+        frame = await outbox.get()
         try:
-            tick = int(time.time())
-            await ws.send(pack_message(f"type@=mrkl/tick@={tick}/"))
+            await ws.send(frame)
         except Exception:
             break
 
 
-async def connect_and_listen(room_id):
+class OverflowPolicy:
+    """
+    待处理队列积压时的丢弃策略：占用超过 high_water 后丢弃 drop_types（默认进房提示），
+    sample_types（默认弹幕）只保留 sample_rate 的比例，其他消息（礼物等）在队列满之前都保留
+    """
+
+    def __init__(self, high_water=0.5, drop_types=('uenter',), sample_types=('chatmsg',), sample_rate=0.2):
+        self.high_water = high_water
+        self.drop_types = drop_types
+        self.sample_types = sample_types
+        self.sample_rate = sample_rate
+
+    def admit(self, mtype, fill) -> bool:
+        """:param fill: 队列占用比例 0~1"""
+        if fill < self.high_water:
+            return True
+        if mtype in self.drop_types:
+            return False
+        if mtype in self.sample_types:
+            return random.random() < self.sample_rate
+        return True
+
+
+class RoomStats:
+    """单个房间的连接状态和消息计数，多房间模式下按房间统计消息速率"""
+
+    def __init__(self, room_id):
+        self.room_id = room_id
+        self.connected = False
+        self.endpoint = None
+        self.connects = 0
+        self.messages = 0  # 收到的所有消息
+        self.chat = 0  # 弹幕
+        self.gifts = 0  # 礼物
+        self.dropped = 0  # 队列积压时按策略丢弃的消息
+        self.overflowed = 0  # 队列满被丢弃的消息
+        self.lagged = 0  # 收到后超过 LAG_THRESHOLD 秒才处理完的消息
+        self.max_lag = 0.0
+        self.queued = 0  # 当前待处理的消息数
+        self.connected_at = None
+        self.last_data_at = None  # 最后一次收到数据的时间
+        self.gap_start = None  # 断开前最后收到数据的时间，恢复接收后清空
+        self.gaps = 0  # 断开重连的次数
+        self.gap_total = 0.0  # 断开到恢复接收的累计时长（这段时间的消息丢失）
+        self.max_gap = 0.0
+        self._window_messages = 0
+        self._window_start = time.monotonic()
+
+    def record(self, mtype):
+        self.messages += 1
+        if mtype == 'chatmsg':
+            self.chat += 1
+        elif mtype == 'dgb':
+            self.gifts += 1
+
+    def record_lag(self, lag):
+        if lag > LAG_THRESHOLD:
+            self.lagged += 1
+        if lag > self.max_lag:
+            self.max_lag = lag
+
+    def mark_disconnected(self):
+        if self.gap_start is None:
+            self.gap_start = self.last_data_at or time.monotonic()
+
+    def close_gap(self) -> float:
+        """重连后第一次收到数据时调用，返回中断时长"""
+        gap = time.monotonic() - self.gap_start
+        self.gap_start = None
+        self.gaps += 1
+        self.gap_total += gap
+        if gap > self.max_gap:
+            self.max_gap = gap
+        return gap
+
+    def take_rate(self) -> float:
+        """上次调用以来的消息速率（条/秒），并开始新的统计窗口"""
+        now = time.monotonic()
+        elapsed = now - self._window_start
+        rate = (self.messages - self._window_messages) / elapsed if elapsed > 0 else 0.0
+        self._window_messages = self.messages
+        self._window_start = now
+        return rate
+
+
+def endpoint_order(index):
+    """第 index 个房间的服务器尝试顺序：起点依次错开，房间均匀分布到各个代理端口"""
+    offset = index % len(ENDPOINTS)
+    return ENDPOINTS[offset:] + ENDPOINTS[:offset]
+
+
+def process_batch(batch, output, types, room=''):
+    """
+    在线程池里运行：完整解析消息并交给 output（格式化、打印、转成记录放进写入队列）
+    :return: 每条消息从收到到处理完的延迟
+    """
+    tag = f"[{room}] " if room else ""
+    lags = []
+    for received, mtype, msg in batch:
+        try:
+            if mtype in types:
+                output(msg, room)
+            elif VERBOSE:
+                body_preview = msg.raw[:100].replace('\n', ' ')
+                print(f"[{Fore.BLUE}{ts()}{Style.RESET_ALL}] {tag}{Fore.YELLOW}[{mtype}]{Style.RESET_ALL} {body_preview}")
+        except Exception as e:
+            print(f"{Fore.RED}[{ts()}] {tag}处理消息出错: {str(e)[:80]}{Style.RESET_ALL}")
+        lags.append(time.monotonic() - received)
+    return lags
+
+
+async def process_messages(inbox, output, stats, types, room='', executor=None):
+    """
+    从待处理队列按批取消息，在线程池里交给 output，记录每条消息从收到到处理完的延迟；
+    事件循环线程只负责收发和入队，解析和输出不占用它（线程间仍共用 GIL，但接收循环最多等一个切换间隔）
+    :param executor: 处理消息的线程池，为 None 则用事件循环默认的线程池
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await inbox.get()]
+        while len(batch) < PROCESS_BATCH and not inbox.empty():
+            batch.append(inbox.get_nowait())
+        try:
+            lags = await loop.run_in_executor(executor, process_batch, batch, output, types, room)
+        finally:
+            for _ in batch:
+                inbox.task_done()
+        for lag in lags:
+            stats.record_lag(lag)
+        stats.queued = inbox.qsize()
+
+
+class EndpointHealth:
+    """
+    各服务器的握手耗时（滑动平均）和连续失败次数，所有房间共用；
+    排序时冷却中的失败服务器排到最后，其余耗时不超过最快者两倍的服务器保持原有顺序（房间错开分布）
+    """
+
+    def __init__(self, cooldown=FAILURE_COOLDOWN, alpha=0.3):
+        self.cooldown = cooldown
+        self.alpha = alpha
+        self.latency = {}  # url -> 握手耗时的滑动平均（秒）
+        self.failures = {}  # url -> 连续失败次数
+        self._failed_at = {}
+
+    def record_success(self, url, latency):
+        previous = self.latency.get(url)
+        self.latency[url] = latency if previous is None else previous + self.alpha * (latency - previous)
+        self.failures.pop(url, None)
+        self._failed_at.pop(url, None)
+
+    def record_slow(self, url, elapsed):
+        """比赛中输给其他服务器被取消：握手耗时至少为 elapsed"""
+        if self.latency.get(url, 0.0) < elapsed:
+            self.latency[url] = elapsed
+
+    def record_failure(self, url):
+        self.failures[url] = self.failures.get(url, 0) + 1
+        self._failed_at[url] = time.monotonic()
+
+    def cooling(self, url) -> bool:
+        failures = self.failures.get(url)
+        if not failures:
+            return False
+        cooldown = min(self.cooldown * 2 ** (failures - 1), self.cooldown * 16)
+        return time.monotonic() - self._failed_at[url] < cooldown
+
+    def ranked(self, urls):
+        known = [self.latency[url] for url in urls if url in self.latency and not self.cooling(url)]
+        best = min(known) if known else 0.0
+
+        def key(item):
+            index, url = item
+            latency = self.latency.get(url)
+            slow = latency is not None and latency > best * 2
+            return self.cooling(url), slow, latency if slow else 0.0, index
+
+        return [url for _, url in sorted(enumerate(urls), key=key)]
+
+    def best(self):
+        """当前最快的健康服务器和它的握手耗时"""
+        healthy = [(latency, url) for url, latency in self.latency.items() if not self.cooling(url)]
+        return min(healthy)[::-1] if healthy else (None, None)
+
+
+async def race_connect(urls, ssl_ctx, health=None, connect_limit=None, tag='',
+                       stagger=RACE_STAGGER, width=RACE_WIDTH, open_timeout=OPEN_TIMEOUT):
+    """
+    按顺序错开发起握手（happy eyeballs）：上一个 stagger 秒没连上或已失败就同时尝试下一个，
+    最先连上的胜出，其余取消或关闭；一个服务器挂掉不再需要等满 open_timeout
+    :return: (websocket, url, 握手耗时)，全部失败时抛出 ConnectionError
+    """
     import websockets
+
+    async def attempt(url):
+        async with connect_limit or contextlib.nullcontext():
+            start = time.monotonic()
+            # ws:// 地址（本地测试服务器）不能传 ssl 参数
+            ws = await websockets.connect(url, max_size=2 ** 20, open_timeout=open_timeout,
+                                          ssl=ssl_ctx if url.startswith('wss') else None,
+                                          ping_interval=None, ping_timeout=None)
+            return ws, url, time.monotonic() - start
+
+    candidates = iter(urls)
+    pending = {}  # task -> (url, 开始时间)
+    winner = None
+    last_error = None
+
+    def start_next():
+        url = next(candidates, None)
+        if url is not None:
+            pending[asyncio.ensure_future(attempt(url))] = url, time.monotonic()
+
+    start_next()
+    try:
+        while pending and winner is None:
+            done, _ = await asyncio.wait(pending, timeout=stagger, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                if len(pending) < width:
+                    start_next()
+                continue
+            for task in done:
+                url, _ = pending.pop(task)
+                if task.exception() is not None:
+                    last_error = task.exception()
+                    if health is not None:
+                        health.record_failure(url)
+                    print(f"  {Fore.RED}{tag}{url} 失败: {str(last_error)[:50]}{Style.RESET_ALL}")
+                    start_next()
+                elif winner is None:
+                    winner = task.result()
+                    if health is not None:
+                        health.record_success(url, winner[2])
+                else:
+                    await task.result()[0].close()
+    finally:
+        for task, (url, started) in pending.items():
+            task.cancel()
+            if winner is not None and health is not None:
+                health.record_slow(url, time.monotonic() - started)
+        # 取消时已经握手成功的连接要关闭
+        for task in pending:
+            with contextlib.suppress(BaseException):
+                ws, _, _ = await task
+                await ws.close()
+    if winner is None:
+        raise ConnectionError(f"所有服务器均连接失败: {last_error}")
+    return winner
+
+
+async def connect_and_listen(room_id, urls=None, ssl_ctx=None, stats=None, connect_limit=None, room='',
+                             output=None, types=SHOWN_TYPES, policy=None, processors=PROCESSORS,
+                             queue_size=QUEUE_SIZE, health=None, recorder=None):
+    """
+    连接一个房间并接收消息，连接断开后返回，所有服务器都连不上时抛出 ConnectionError
+    :param urls: 服务器尝试顺序（默认 ENDPOINTS）
+    :param ssl_ctx: 多个房间共用的 SSL 上下文
+    :param stats: RoomStats，记录连接状态和消息数
+    :param connect_limit: asyncio.Semaphore，限制同时进行的握手数（大量房间同时启动时）
+    :param room: 显示在输出前面的房间号（多房间模式）
+    :param output: 处理消息的函数 output(msg, room)，默认 handle_message 直接打印
+    :param types: 交给 output 的消息类型
+    :param policy: OverflowPolicy，待处理队列积压时的丢弃策略
+    :param processors: 处理消息的任务数，接收循环只解包和入队，output 在线程池里执行
+    :param queue_size: 待处理队列长度，队列满时新消息直接丢弃
+    :param health: EndpointHealth，按握手耗时和失败记录调整服务器尝试顺序
+    :param recorder: FrameRecorder，把收到的原始帧写入录制文件
+    """
     from websockets.exceptions import ConnectionClosed
-    ssl_ctx = create_ssl_context()
-    urls = (
-        [f'wss://danmuproxy.douyu.com:{p}/' for p in [8506, 8505, 8502, 8504, 8501, 8508]] +
-        [f'wss://wsproxy.douyu.com:{p}/' for p in [6671, 6672, 6673, 6674, 6675]]
-    )
+    if ssl_ctx is None:
+        ssl_ctx = create_ssl_context()
+    if urls is None:
+        urls = ENDPOINTS
+    if stats is None:
+        stats = RoomStats(room_id)
+    if output is None:
+        output = handle_message
+    if policy is None:
+        policy = OverflowPolicy()
+    tag = f"[{room}] " if room else ""
+
+    ranked = health.ranked(urls) if health is not None else list(urls)
+    print(f"{Fore.CYAN}[{ts()}] {tag}连接 {ranked[0]}...{Style.RESET_ALL}")
+    ws, url, latency = await race_connect(ranked, ssl_ctx, health, connect_limit, tag)
+    async with ws:
+        print(f"{Fore.GREEN}[{ts()}] {tag}连接成功! ({url}，{latency * 1000:.0f}ms){Style.RESET_ALL}")
+        stats.connected = True
+        stats.endpoint = url
+        stats.connects += 1
+        stats.connected_at = time.monotonic()
+
+        await ws.send(pack_message(stt_dumps({"type": "loginreq", "roomid": room_id})))
+        await ws.send(pack_message(stt_dumps({"type": "joingroup", "rid": room_id, "gid": -9999})))
+
+        outbox = asyncio.Queue()
+        inbox = asyncio.Queue(maxsize=queue_size)
+        tasks = [asyncio.ensure_future(send_task(ws, outbox)),
+                 asyncio.ensure_future(keepalive_task(outbox))]
+        tasks += [asyncio.ensure_future(process_messages(inbox, output, stats, types, room))
+                  for _ in range(processors)]
+        decoder = PacketDecoder()
 
-    connected = False
-    for url in urls:
         try:
-            if not connected:
-                print(f"{Fore.CYAN}[{ts()}] 连接 {url}...{Style.RESET_ALL}")
-            async with websockets.connect(url, max_size=2 ** 20, ssl=ssl_ctx, open_timeout=5,
-                                           ping_interval=None, ping_timeout=None) as ws:
-                if not connected:
-                    print(f"{Fore.GREEN}[{ts()}] 连接成功! ({url}){Style.RESET_ALL}")
-                connected = True
-
-                await ws.send(pack_message(f"type@=loginreq/roomid@={room_id}/"))
-                await ws.send(pack_message(f"type@=joingroup/rid@={room_id}/gid@=-9999/"))
-
-                keepalive_fut = asyncio.ensure_future(keepalive_task(ws))
-
-                try:
-                    data = await asyncio.wait_for(ws.recv(), timeout=5)
-                    for mt, body in parse_binary_packets(data):
-                        if VERBOSE:
-                            msg = parse_kv(body)
-                            t = msg.get('type', '?')
-                            print(f"[{ts()}] [{t}] {body[:200]}")
-                except asyncio.TimeoutError:
-                    pass
-                print(f"{Fore.GREEN}[{ts()}] 已连接，开始接收弹幕{Style.RESET_ALL}")
-
-                print("-" * 60)
-
-                msg_count = 0
-                try:
-                    async for data in ws:
-                        if isinstance(data, bytes):
-                            for mt, body in parse_binary_packets(data):
-                                if mt == 690 and body:
-                                    msg = parse_kv(body)
-                                    mtype = msg.get('type', '')
-                                    if mtype == 'pingreq':
-                                        tick = msg.get('tick', str(int(time.time())))
-                                        await ws.send(pack_message(f"type@=pongreply/tick@={tick}/"))
-                                    elif mtype in ('chatmsg', 'dgb', 'uenter', 'spbc', 'ssd', 'onlinegift'):
-                                        handle_message(msg)
-                                        if mtype == 'chatmsg':
-                                            msg_count += 1
-                                    elif VERBOSE:
-                                        body_preview = body[:100].replace('\n', ' ')
-                                        print(f"[{Fore.BLUE}{ts()}{Style.RESET_ALL}] {Fore.YELLOW}[{mtype}]{Style.RESET_ALL} {body_preview}")
-                except ConnectionClosed:
-                    print(f"\n{Fore.RED}[{ts()}] 连接已断开 (共接收 {msg_count} 条弹幕){Style.RESET_ALL}")
-                finally:
-                    keepalive_fut.cancel()
-                break
+            data = await asyncio.wait_for(ws.recv(), timeout=5)
+            if recorder is not None and isinstance(data, bytes):
+                recorder.write(data, room_id)
+            for mt, body in decoder.feed(data):
+                if VERBOSE:
+                    t = STTMessage(body).type or '?'
+                    print(f"[{ts()}] {tag}[{t}] {body[:200]}")
+        except asyncio.TimeoutError:
+            pass
+        print(f"{Fore.GREEN}[{ts()}] {tag}已连接，开始接收弹幕{Style.RESET_ALL}")
+
+        if not room:
+            print("-" * 60)
+
+        chat_count = stats.chat
+        try:
+            try:
+                async for data in ws:
+                    if not isinstance(data, bytes):
+                        continue
+                    if recorder is not None:
+                        recorder.write(data, room_id)
+                    if stats.gap_start is not None:
+                        gap = stats.close_gap()
+                        print(f"{Fore.YELLOW}[{ts()}] {tag}重连后恢复接收，中断 {gap:.1f} 秒{Style.RESET_ALL}")
+                    stats.last_data_at = time.monotonic()
+                    received = time.time()  # 同一帧里的消息共用一个接收时间，保存时用它而不是处理时的时间
+                    for mt, body in decoder.feed(data):
+                        if mt != 690 or not body:
+                            continue
+                        # 只读取 type，进房提示等不处理的消息不做完整解析
+                        msg = STTMessage(body, received)
+                        mtype = msg.type
+                        stats.record(mtype)
+                        if mtype == 'pingreq':
+                            tick = msg.scan('tick') or str(int(time.time()))
+                            outbox.put_nowait(pack_message(stt_dumps({"type": "pongreply", "tick": tick})))
+                            continue
+                        if mtype not in types and not VERBOSE:
+                            continue
+                        if not policy.admit(mtype, inbox.qsize() / queue_size):
+                            stats.dropped += 1
+                            continue
+                        try:
+                            inbox.put_nowait((time.monotonic(), mtype, msg))
+                        except asyncio.QueueFull:
+                            stats.overflowed += 1
+                    stats.queued = inbox.qsize()
+            except ConnectionClosed:
+                print(f"\n{Fore.RED}[{ts()}] {tag}连接已断开 (共接收 {stats.chat - chat_count} 条弹幕){Style.RESET_ALL}")
+            stats.connected = False
+            # 断开后把已收到的消息处理完
+            await inbox.join()
+        finally:
+            for task in tasks:
+                task.cancel()
+            stats.connected = False
+            stats.mark_disconnected()
+
+
+async def listen_room(room_id, urls=None, ssl_ctx=None, stats=None, connect_limit=None, room='', **options):
+    """
+    持续接收一个房间的消息，断开后自动重连，参数同 connect_and_listen；
+    重连等待按指数增加并带随机抖动，连接保持超过 STABLE_SESSION 秒后回到起始值
+    """
+    tag = f"[{room}] " if room else ""
+    if stats is None:
+        stats = RoomStats(room_id)
+    if options.get('health') is None:
+        options['health'] = EndpointHealth()
+    delay = RECONNECT_BASE_DELAY
+    while True:
+        stats.connected_at = None
+        try:
+            await connect_and_listen(room_id, urls, ssl_ctx, stats, connect_limit, room, **options)
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
-            if not connected:
-                err = str(e)[:50]
-                print(f"  {Fore.RED}失败: {err}{Style.RESET_ALL}")
-            continue
-
-    if not connected:
-        raise ConnectionError("所有服务器均连接失败")
-
-
-async def main():
-    if '-h' in sys.argv or '--help' in sys.argv:
-        print("用法: python douyu_barrage.py [room_id] [-v]")
-        print("  room_id  直播间号或URL (默认 11222)")
-        print("  -v       显示所有消息类型")
-        return
-
-    arg = sys.argv[1] if len(sys.argv) > 1 and not sys.argv[1].startswith('-') else "11222"
+            print(f"{Fore.RED}[{ts()}] {tag}错误: {e}{Style.RESET_ALL}")
+        if stats.connected_at is not None and time.monotonic() - stats.connected_at >= STABLE_SESSION:
+            delay = RECONNECT_BASE_DELAY
+        # 一半固定一半随机，大量房间同时断开时错开重连
+        wait = delay / 2 + random.uniform(0, delay / 2)
+        print(f"{Fore.YELLOW}[{ts()}] {tag}{wait:.1f}秒后重连...{Style.RESET_ALL}")
+        await asyncio.sleep(wait)
+        delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+
+def format_room_stats(stats_list, top=STATS_TOP_ROOMS):
+    """各房间消息速率，按速率从高到低只列出前 top 个"""
+    rates = sorted(((stats.take_rate(), stats) for stats in stats_list), key=lambda item: -item[0])
+    online = sum(1 for stats in stats_list if stats.connected)
+    total = sum(rate for rate, _ in rates)
+    lines = [f"{Fore.CYAN}[{ts()}] 在线 {online}/{len(stats_list)} 个房间，共 {total:.1f} 条/秒{Style.RESET_ALL}"]
+    for rate, stats in rates[:top]:
+        state = "" if stats.connected else f" {Fore.RED}未连接{Style.RESET_ALL}"
+        if stats.gaps:
+            state += f" 重连{stats.gaps}次(中断共{stats.gap_total:.1f}秒 最长{stats.max_gap:.1f}秒)"
+        if stats.dropped or stats.overflowed or stats.lagged:
+            state += (f" {Fore.YELLOW}积压{stats.queued} 丢弃{stats.dropped + stats.overflowed} "
+                      f"延迟{stats.lagged}(最长{stats.max_lag:.1f}秒){Style.RESET_ALL}")
+        lines.append(f"  {stats.room_id:>10}  {rate:>7.1f} 条/秒  弹幕{stats.chat:>7}  礼物{stats.gifts:>6}  "
+                     f"连接{stats.connects:>3}次{state}")
+    return "\n".join(lines)
+
+
+async def report_room_stats(stats_list, interval, writer=None, health=None):
+    while True:
+        await asyncio.sleep(interval)
+        print(format_room_stats(stats_list))
+        if health is not None:
+            url, latency = health.best()
+            if url is not None:
+                print(f"  最快服务器: {url} ({latency * 1000:.0f}ms)  失败中: {sum(map(health.cooling, health.failures))}个")
+        if writer is not None:
+            print(f"  保存: {writer.format_stats()}")
+
+
+def resolve_room(arg):
+    """从房间号或直播间地址中取出房间号，装了 dyproto 时解析靓号对应的真实房间号"""
     m = re.search(r'(\d{4,10})', arg)
     room_id = m.group(1) if m else arg
     try:
@@ -210,15 +658,114 @@ async def main():
             room_id = str(resolved)
     except Exception:
         pass
-    while True:
+    return room_id
+
+
+def read_rooms_file(path):
+    """房间列表文件：每行一个房间号或地址，# 开头的行为注释"""
+    with open(path, encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith('#')]
+
+
+async def collect_rooms(room_ids, stats_interval=STATS_INTERVAL, max_concurrent_connects=MAX_CONCURRENT_CONNECTS,
+                        output=None, **options):
+    """
+    在一个事件循环里同时接收多个房间：共用 SSL 上下文，限制同时握手数，
+    房间错开分配到各个代理端口，定时打印各房间消息速率
+    :param output: 所有房间共用的 MessageOutput（默认直接打印）
+    :param options: 传给 connect_and_listen 的 types / policy / processors / queue_size / health
+    """
+    options.setdefault('health', EndpointHealth())
+    writer = getattr(output, 'writer', None)
+    ssl_ctx = create_ssl_context()
+    connect_limit = asyncio.Semaphore(max_concurrent_connects)
+    multi = len(room_ids) > 1
+    stats_list = [RoomStats(room_id) for room_id in room_ids]
+    tasks = [
+        asyncio.ensure_future(listen_room(room_id, endpoint_order(index), ssl_ctx, stats, connect_limit,
+                                          room_id if multi else '', output=output, **options))
+        for index, (room_id, stats) in enumerate(zip(room_ids, stats_list))
+    ]
+    # 保存弹幕时单个房间也定时打印速率和写入情况，终端不再逐条显示
+    if (multi or writer is not None) and stats_interval:
+        tasks.append(asyncio.ensure_future(report_room_stats(stats_list, stats_interval, writer, options['health'])))
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="斗鱼弹幕接收，可以同时接收多个房间")
+    parser.add_argument("rooms", nargs="*", help="直播间号或URL，可以有多个（默认 11222）")
+    parser.add_argument("--rooms-file", help="房间列表文件，每行一个房间号或URL")
+    parser.add_argument("-v", "--verbose", action="store_true", help="显示所有消息类型")
+    parser.add_argument("--stats-interval", type=float, default=STATS_INTERVAL, help="多房间时各房间速率的打印间隔（秒）")
+    parser.add_argument("--max-connects", type=int, default=MAX_CONCURRENT_CONNECTS, help="同时进行的握手数上限")
+    parser.add_argument("--sink", choices=SINK_KINDS, help="把弹幕保存为结构化记录（parquet 需要 pyarrow）")
+    parser.add_argument("--out-dir", default="./downloadFile/barrage", help="保存目录")
+    parser.add_argument("--batch-size", type=int, default=1000, help="攒够多少条写一次")
+    parser.add_argument("--flush-interval", type=float, default=2.0, help="最长多少秒写一次")
+    parser.add_argument("--rotate-mb", type=float, default=128, help="单个文件写到多少MB换新文件（sqlite 不轮转）")
+    parser.add_argument("--rotate-minutes", type=float, default=60, help="单个文件最多写多少分钟")
+    parser.add_argument("--with-uenter", action="store_true", help="同时保存进房提示（uenter）")
+    parser.add_argument("--processors", type=int, default=PROCESSORS, help="每个连接处理消息的任务数（每个任务把一批消息交给线程池处理）")
+    parser.add_argument("--queue-size", type=int, default=QUEUE_SIZE, help="每个连接待处理消息队列的长度")
+    parser.add_argument("--high-water", type=float, default=0.5, help="队列占用超过这个比例时开始丢弃进房提示、抽样弹幕")
+    parser.add_argument("--chat-sample", type=float, default=0.2, help="队列积压时保留的弹幕比例")
+    parser.add_argument("--record", metavar="FILE", help="把收到的原始帧录制到文件（供回放测试）")
+    parser.add_argument("--print-sample", type=float, default=None,
+                        help="终端显示的消息比例 0~1（默认不保存时全部显示，保存时不显示）")
+    return parser
+
+
+async def main(argv=None):
+    args = build_parser().parse_args(argv)
+    rooms = list(args.rooms)
+    if args.rooms_file:
+        rooms += read_rooms_file(args.rooms_file)
+    if not rooms:
+        rooms = ["11222"]
+    # dyproto 的解析是同步请求，放到线程里并发执行
+    room_ids = await asyncio.gather(*(asyncio.to_thread(resolve_room, room) for room in rooms))
+    room_ids = list(dict.fromkeys(room_ids))
+    if len(room_ids) > 1:
+        print(f"{Fore.CYAN}[{ts()}] 同时接收 {len(room_ids)} 个房间{Style.RESET_ALL}")
+    writer = None
+    if args.sink:
+        sink_options = {}
+        if args.sink != "sqlite":
+            sink_options = {"rotate_bytes": int(args.rotate_mb * 1024 * 1024),
+                            "rotate_seconds": args.rotate_minutes * 60}
         try:
-            await connect_and_listen(room_id)
-        except asyncio.CancelledError:
-            break
-        except Exception as e:
-            print(f"{Fore.RED}[{ts()}] 错误: {e}{Style.RESET_ALL}")
-            print(f"{Fore.YELLOW}[{ts()}] {RECONNECT_DELAY}秒后重连...{Style.RESET_ALL}")
-            await asyncio.sleep(RECONNECT_DELAY)
+            sink = create_sink(args.sink, args.out_dir, **sink_options)
+        except ImportError as e:
+            print(f"{Fore.RED}{e}{Style.RESET_ALL}")
+            return
+        writer = BatchWriter(sink, args.batch_size, args.flush_interval)
+        print(f"{Fore.CYAN}[{ts()}] 弹幕保存到 {args.out_dir}（{args.sink}）{Style.RESET_ALL}")
+    print_sample = args.print_sample
+    if print_sample is None:
+        print_sample = 0.0 if writer is not None else 1.0
+    output = MessageOutput(writer, print_sample)
+    recorder = FrameRecorder(args.record) if args.record else None
+    try:
+        policy = OverflowPolicy(args.high_water, sample_rate=args.chat_sample)
+        types = SHOWN_TYPES + ('uenter',) if args.with_uenter else SHOWN_TYPES
+        await collect_rooms(room_ids, args.stats_interval, args.max_connects, output,
+                            types=types, policy=policy, processors=args.processors, queue_size=args.queue_size,
+                            recorder=recorder)
+    except asyncio.CancelledError:
+        pass
+    finally:
+        if writer is not None:
+            # 写完队列中剩余的记录再退出
+            writer.close()
+            print(f"{Fore.CYAN}[{ts()}] 保存: {writer.format_stats()}{Style.RESET_ALL}")
+        if recorder is not None:
+            recorder.close()
+            print(f"{Fore.CYAN}[{ts()}] {recorder.format_stats()}{Style.RESET_ALL}")
 
 
 if __name__ == '__main__':
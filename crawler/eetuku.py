@@ -1,100 +1,264 @@
-import requests
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from colorama import Fore, Style
 from lxml import etree
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '../utils'))
-from DownloadFileDB import DownloadFileDB
-from ImageDownloader import download_image
-import time
-
-def process_detail_page(detail_url, base_url, headers, a_name, pic_start_index, download_fail_list):
-    parser = etree.HTMLParser(encoding="utf-8")
-    detail_url = base_url + detail_url
-    detail_page_text = requests.get(url=detail_url, headers=headers).text
-    detail_tree = etree.HTML(detail_page_text, parser=parser)
-    detail_title = detail_tree.xpath('//div[@class="inside-article"]//h1[@class="entry-title"]/text()')[0]
-    file_date = detail_tree.xpath('//div[@class="entry-meta"]//time[@class="entry-date published"]/text()')[0]
-    detail_title = f"{detail_title} ({file_date})"
-    pic_list = detail_tree.xpath('//div[@class="inside-article"]//img/@data-src')
-    pic_list = [pic for pic in pic_list if '260x390' not in pic]
-    print(f"标题:{detail_title},详情页:{detail_url},共{len(pic_list)}张图片")
-    save_file_path = os.path.join(a_name, detail_title)
-    for pic_index, pic in enumerate(pic_list):
-        if pic_index < pic_start_index:
-            continue
-        fileSize = download_image(pic, save_file_path, headers)
-        if fileSize == "失败":
-            download_fail_list.append({"title": detail_title, "pic": pic})
-            print(f"{Fore.RED}下载失败:{download_fail_list}{Style.RESET_ALL}")
-            continue
-        print(pic, fileSize)
+from DownloadFileDB import create_db
+from SeenCache import SeenCache
+from ImageDownloader import ImageDownloader
+from AsyncFetcher import BlockingFetcher
+from RateLimiter import HostRateLimiter, image_rate_limiter
+from GalleryDownloader import download_gallery, failed_results, print_result
+from CrawlPipeline import CrawlPipeline, InFlight, PageWalker
+from HtmlExtractor import HtmlExtractor
 
+BASE_URL = "https://www.eetuku.com/"
+TABLE_NAME = "eetuku"
+HEADERS = {
+    "Accept": "text/html, application/xhtml+xml, application/xml;q=0.9, image/webp, image/apng, application/json, text/plain; q=0.8",
+    "User-Agent": 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/141.0.0.0 Safari/537.36',
+    "Referer": "https://www.eetuku.com/category/hanguo",
+}
 
-if __name__ == '__main__':
-    page = 4 #初始值1
-    detail_page = 0 #初始值0
-    pic_start_index = 0 #初始值0
-    download_fail_list = []
-    headers = {
-        "Accept": "text/html, application/xhtml+xml, application/xml;q=0.9, image/webp, image/apng, application/json, text/plain; q=0.8",
-        "User-Agent": 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/141.0.0.0 Safari/537.36',
-        "Referer": "https://www.eetuku.com/category/hanguo",
-    }
-    base_url = "https://www.eetuku.com/"
-    url = f'https://www.eetuku.com/category/hanguo/page/{page}'
-    if not os.path.exists("./downloadFile/eetuku"):
-        os.makedirs("./downloadFile/eetuku")
-    a_name = os.path.abspath('./downloadFile/eetuku')
-    print(a_name)
-    db = DownloadFileDB()
-    # pic_list = ['https://i5.ggcos.com/amazonlove/wp-content/uploads/2026/04/04/31505041216331.webp', 'https://i5.ggcos.com/amazonlove/wp-content/uploads/2026/04/04/31505041216332.webp', 'https://i5.ggcos.com/amazonlove/wp-content/uploads/2026/04/04/31505041216333.webp', 'https://i5.ggcos.com/amazonlove/wp-content/uploads/2026/04/04/31505041216334.webp', 'https://i5.ggcos.com/amazonlove/wp-content/uploads/2026/04/04/31505041216335.webp', 'https://i5.ggcos.com/amazonlove/wp-content/uploads/2026/04/04/31505041216336.webp', 'https://i5.ggcos.com/amazonlove/wp-content/uploads/2026/04/04/31505041216337.webp']
-    page_text = requests.get(url=url, headers=headers).text
-    parser = etree.HTMLParser(encoding="utf-8")
-    tree = etree.HTML(page_text, parser=parser)
-    detail_list = tree.xpath('//article//div[@class="post-image"]//a/@href')
-    print(f"第{page}页,共{len(detail_list)}条数据",f"{detail_list}")
-    for detail_index, detail_url in enumerate(detail_list):
-        if detail_index < detail_page:
-            continue
-        detail_url = base_url + detail_url
-        detail_page_text = requests.get(url=detail_url, headers=headers).text
-        detail_tree = etree.HTML(detail_page_text, parser=parser)
-        detail_title = detail_tree.xpath('//div[@class="inside-article"]//h1[@class="entry-title"]/text()')[0]
-        file_date = detail_tree.xpath('//div[@class="entry-meta"]//time[@class="entry-date published"]/text()')[0]
-        detail_title = f"{detail_title} ({file_date})"
-        exact_result = db.get_by_title_custom(title=detail_title, table_name="eetuku")
-        print(f"精确匹配结果：{exact_result}")
-        if exact_result:
-            print(f"{Fore.GREEN}目录{detail_title}已下载过了，跳过下载{Style.RESET_ALL}")
-            continue
-        pic_list = detail_tree.xpath('//div[@class="inside-article"]//img/@data-src')
-        pic_list = [pic for pic in pic_list if '260x390' not in pic]
-        print(f"标题:{detail_title},详情页:{detail_url},共{len(pic_list)}张图片")
-        save_file_path = os.path.join(a_name, detail_title)
-        for pic_index, pic in enumerate(pic_list):
-            if pic_index < pic_start_index:
+
+class EetukuExtractor(HtmlExtractor):
+    """eetuku 页面提取器"""
+
+    LISTING_LINKS = etree.XPath('//article//div[@class="post-image"]//a/@href')
+    ARTICLES = etree.XPath('//article')
+    ARTICLE_LINK = etree.XPath('.//div[@class="post-image"]//a/@href')
+    ARTICLE_TITLE = etree.XPath('.//h2[@class="entry-title"]/a/text()')
+    ARTICLE_DATE = etree.XPath('.//time[@class="entry-date published"]/text()')
+    DETAIL_TITLE = etree.XPath('//div[@class="inside-article"]//h1[@class="entry-title"]/text()')
+    DETAIL_DATE = etree.XPath('//div[@class="entry-meta"]//time[@class="entry-date published"]/text()')
+    DETAIL_PICS = etree.XPath('//div[@class="inside-article"]//img/@data-src')
+    PAGE_LINKS = etree.XPath('//div[@class="page-links"]//a/@href')
+
+    def __init__(self, partial=False):
+        """:param partial: 详情页只解析到正文（div.inside-article）结束为止"""
+        super().__init__()
+        self.partial = partial
+
+    def listing(self, text):
+        """
+        解析列表页
+        :return: (详情页链接列表, {详情页链接: "标题 (日期)"})，缺少标题或日期的文章不在字典中，
+                 标题格式与详情页拼出的一致
+        """
+        tree = self.parse(text)
+        listing_titles = {}
+        for article in self.ARTICLES(tree):
+            link = self.ARTICLE_LINK(article)
+            title = self.ARTICLE_TITLE(article)
+            file_date = self.ARTICLE_DATE(article)
+            if link and title and file_date:
+                listing_titles[link[0]] = f"{title[0]} ({file_date[0]})"
+        return self.LISTING_LINKS(tree), listing_titles
+
+    def detail(self, text):
+        """解析详情页，返回 (标题 (日期), 图片列表, 分页链接列表)"""
+        if self.partial:
+            tree = self.parse_partial(text, "div", "inside-article")
+        else:
+            tree = self.parse(text)
+        detail_title = f"{self.DETAIL_TITLE(tree)[0]} ({self.DETAIL_DATE(tree)[0]})"
+        pic_list = [pic for pic in self.DETAIL_PICS(tree) if '260x390' not in pic]
+        return detail_title, pic_list, self.PAGE_LINKS(tree)
+
+
+class EetukuCrawler:
+    """eetuku 爬虫：列表页 -> 详情页 -> 图片下载 -> 写库，四个阶段通过 CrawlPipeline 重叠执行"""
+
+    def __init__(self, category="hanguo", save_root='./downloadFile/eetuku', db=None, downloader=None,
+                 detail_page=0, pic_start_index=0, detail_workers=2, download_workers=2, stats_interval=60,
+                 async_io=False, partial_parse=False, http_cache=None, subpage_workers=4,
+                 content_store=None):
+        """
+        :param category: 分类名（列表页地址为 category/{category}/page/{page}）
+        :param save_root: 图片保存根目录
+        :param db: 去重数据库（为 None 则新建 SeenCache）
+        :param downloader: ImageDownloader（为 None 则新建，带按主机限速）
+        :param detail_page: 每页从第几条详情开始（手动续传用）
+        :param pic_start_index: 每个图集从第几张图片开始（手动续传用，非0时只处理一个图集）
+        :param detail_workers: 详情页解析线程数
+        :param download_workers: 同时下载的图集数
+        :param stats_interval: 每隔多少秒打印一次流水线统计
+        :param async_io: 下载器改用 asyncio + httpx（BlockingFetcher），一个事件循环并发下载整个图集
+        :param partial_parse: 详情页只解析到正文结束为止
+        :param http_cache: HttpCache 实例（新建下载器时使用），列表页每次发条件请求，详情页在缓存有效期内不访问网络
+        :param subpage_workers: 同时获取的分页数（所有详情页线程共用）
+        :param content_store: ContentStore 实例（新建下载器时使用），重复内容的图片改为硬链接
+        """
+        self.category = category
+        if not os.path.exists(save_root):
+            os.makedirs(save_root)
+        self.a_name = os.path.abspath(save_root)
+        self.headers = dict(HEADERS, Referer=f"{BASE_URL}category/{category}")
+        # 页面用保守的默认限速，图片 CDN 单独用一个宽松的，不拖慢并发下载
+        self.rate_limiter = HostRateLimiter()
+        self.image_rate_limiter = image_rate_limiter()
+        self.http_cache = http_cache
+        self.content_store = content_store
+        self.db = db if db is not None else SeenCache(create_db(pool_size=2))
+        if downloader is None and async_io:
+            downloader = BlockingFetcher(headers=self.headers, rate_limiter=self.image_rate_limiter,
+                                         page_rate_limiter=self.rate_limiter, http_cache=http_cache,
+                                         content_store=content_store)
+        elif downloader is None:
+            downloader = ImageDownloader(headers=self.headers, rate_limiter=self.image_rate_limiter,
+                                         page_rate_limiter=self.rate_limiter, http_cache=http_cache,
+                                         content_store=content_store)
+        self.downloader = downloader
+        self.extractor = EetukuExtractor(partial=partial_parse)
+        self.detail_page = detail_page
+        self.pic_start_index = pic_start_index
+        self.detail_workers = detail_workers
+        self.download_workers = download_workers
+        self.stats_interval = stats_interval
+        self.subpage_executor = ThreadPoolExecutor(max_workers=subpage_workers, thread_name_prefix="subpage")
+        self.download_fail_list = []
+        self.page_walker = None
+        self.in_flight = InFlight()
+
+    def close(self):
+        self.subpage_executor.shutdown()
+        self.downloader.close()
+        self.db.close()
+
+    def listing_url(self, page):
+        return f'{BASE_URL}category/{self.category}/page/{page}'
+
+    def parse_listing(self, page):
+        """列表页阶段：返回本页未下载过的 (页码, 序号, 详情页链接)"""
+        if self.page_walker is not None and self.page_walker.stopped(page):
+            return []
+        # 列表页会更新，不直接用缓存，只用条件请求省掉未变化时的正文
+        page_text = self.downloader.get_text(self.listing_url(page), cache_ttl=0)
+        detail_list, listing_titles = self.extractor.listing(page_text)
+        print(f"第{page}页,共{len(detail_list)}条数据",f"{detail_list}")
+        # 列表页能拿到标题和日期的，先一次查询过滤掉已下载的，省掉这些详情页的请求
+        existing_titles = self.db.get_existing_titles(table_name=TABLE_NAME, titles=list(listing_titles.values()))
+        print(f"{Fore.GREEN}本页已存在{len(existing_titles)}条，跳过{Style.RESET_ALL}")
+        items = []
+        for detail_index, detail_url in enumerate(detail_list):
+            if detail_index < self.detail_page:
                 continue
-            print(f"第{pic_index}张图片:")
-            fileSize = download_image(pic, save_file_path, headers)
-            if fileSize == "失败":
-                download_fail_list.append({"title": detail_title, "pic": pic})
-                print(f"{Fore.RED}下载失败:{download_fail_list}{Style.RESET_ALL}")
+            if listing_titles.get(detail_url) in existing_titles:
                 continue
-            print(pic, fileSize)
-        page_links = detail_tree.xpath('//div[@class="page-links"]')
+            items.append((page, detail_index, detail_url))
+            if self.pic_start_index != 0:
+                break
+        if self.page_walker is not None:
+            self.page_walker.page_done(page, len(detail_list), len(items))
+        return items
+
+    def _fetch_detail(self, detail_url):
+        """获取并解析详情页，返回 (标题 (日期), 图片列表, 分页链接列表)"""
+        return self.extractor.detail(self.downloader.get_text(BASE_URL + detail_url))
+
+    def parse_detail(self, item):
+        """
+        详情页阶段：解析标题和图片，已下载过或正在处理的跳过；
+        有分页时并发获取各分页，所有图片去重后合并成一个下载批次
+        """
+        page, detail_index, detail_url = item
+        detail_title, pic_list, page_links = self._fetch_detail(detail_url)
+        # 先占住标题再查库：写库时先插入再释放，两者之间不会漏掉
+        if not self.in_flight.claim(detail_title):
+            print(f"{Fore.GREEN}目录{detail_title}正在处理中，跳过{Style.RESET_ALL}")
+            return []
+        try:
+            if self.db.has_title(table_name=TABLE_NAME, title=detail_title):
+                print(f"{Fore.GREEN}目录{detail_title}已下载过了，跳过下载{Style.RESET_ALL}")
+                self.in_flight.release(detail_title)
+                return []
+            pic_list = self._merge_sub_pages(detail_title, detail_url, pic_list, page_links)
+        except BaseException:
+            self.in_flight.release(detail_title)
+            raise
+        return [{"page": page, "index": detail_index, "title": detail_title,
+                 "save_dir": os.path.join(self.a_name, detail_title), "pics": pic_list[self.pic_start_index:]}]
+
+    def _merge_sub_pages(self, detail_title, detail_url, pic_list, page_links):
+        """并发获取各分页，返回合并去重后的图片列表"""
+        print(f"标题:{detail_title},详情页:{BASE_URL + detail_url},共{len(pic_list)}张图片")
         if page_links:
-            print(f"发现分页标签，跳过该详情页")
-            page_links = detail_tree.xpath('//div[@class="page-links"]//a/@href')
-            for page_link in page_links:
-                process_detail_page(page_link, base_url, headers, a_name, pic_start_index, download_fail_list)
-        print(f'{Fore.YELLOW}第{page}页的第{detail_index}条{detail_title}下载完毕{Style.RESET_ALL}')
-        new_id = db.insert_custom(title=detail_title, table_name="eetuku")
+            print(f"发现{len(page_links)}个分页，并发解析分页")
+            pic_list = list(pic_list)
+            # map 按分页顺序返回结果，合并后的图片顺序与逐页解析时一致
+            sub_pages = self.subpage_executor.map(self._fetch_detail, page_links)
+            for page_link, (_, sub_pic_list, _) in zip(page_links, sub_pages):
+                print(f"分页:{BASE_URL + page_link},共{len(sub_pic_list)}张图片")
+                pic_list.extend(sub_pic_list)
+            pic_list = list(dict.fromkeys(pic_list))
+            print(f"合并分页后共{len(pic_list)}张图片")
+        return pic_list
+
+    def download(self, gallery):
+        """下载阶段：并发下载图集的所有图片，失败的记入 download_fail_list"""
+        try:
+            results = download_gallery(gallery["pics"], gallery["save_dir"], self.headers, self.downloader,
+                                       on_result=print_result)
+        except BaseException:
+            self.in_flight.release(gallery["title"])
+            raise
+        for result in failed_results(results):
+            self.download_fail_list.append({"title": gallery["title"], "pic": result["url"]})
+        if self.download_fail_list:
+            print(f"{Fore.RED}下载失败:{self.download_fail_list}{Style.RESET_ALL}")
+        print(f'{Fore.YELLOW}第{gallery["page"]}页的第{gallery["index"]}条{gallery["title"]}下载完毕{Style.RESET_ALL}')
+        return [gallery]
+
+    def commit(self, gallery):
+        """写库阶段：记录已下载的标题"""
+        try:
+            new_id = self.db.insert_custom(title=gallery["title"], table_name=TABLE_NAME)
+        finally:
+            self.in_flight.release(gallery["title"])
         print(f"{Fore.GREEN}新增记录成功，id：{new_id}{Style.RESET_ALL}")
-        if pic_start_index != 0:
-            print(f"第{page}页所有数据下载完毕，下载失败{download_fail_list}")
-            exit(0)
-        time.sleep(30)
-    print(f"第{page}页所有数据下载完毕，下载失败{download_fail_list}")
+        print(f"当前速率: 页面 {self.rate_limiter.format_stats()}; 图片 {self.image_rate_limiter.format_stats()}")
+        if self.http_cache is not None:
+            print(f"页面缓存: {self.http_cache.format_stats()}")
+        if self.content_store is not None:
+            print(f"内容去重: {self.content_store.format_stats()}")
+
+    def build_pipeline(self):
+        return (CrawlPipeline(stats_interval=self.stats_interval)
+                .add_stage("列表页", self.parse_listing, workers=1, queue_size=4)
+                .add_stage("详情页", self.parse_detail, workers=self.detail_workers, queue_size=32)
+                .add_stage("下载", self.download, workers=self.download_workers, queue_size=2)
+                .add_stage("写库", self.commit, workers=1, queue_size=16))
+
+    def crawl(self, pages):
+        """爬取 pages 中的各个列表页"""
+        pages = list(pages)
+        self.build_pipeline().run(pages)
+        print(f"第{pages}页所有数据下载完毕，下载失败{self.download_fail_list}")
+
+    def crawl_pages(self, start_page=1, end_page=None, until_seen=False):
+        """
+        从 start_page 开始逐页爬取，到 end_page 为止；until_seen 时遇到整页都已下载过就停止
+        """
+        walker = PageWalker(start_page, end_page, until_seen)
+        self.page_walker = walker
+        try:
+            self.build_pipeline().run(walker)
+        finally:
+            self.page_walker = None
+        last_page = walker.stopped_at if walker.stopped_at is not None else end_page
+        print(f"第{start_page}-{last_page}页所有数据下载完毕，下载失败{self.download_fail_list}")
+
+
+if __name__ == '__main__':
+    page = 4 #初始值1
+    detail_page = 0 #初始值0
+    pic_start_index = 0 #初始值0
+    crawler = EetukuCrawler(category="hanguo", detail_page=detail_page, pic_start_index=pic_start_index)
+    print(crawler.a_name)
+    try:
+        crawler.crawl([page])
+    finally:
+        crawler.close()
     exit(0)
@@ -2,94 +2,347 @@ import os
 import sys
 from colorama import Fore, Style
 from lxml import etree
+from typing import NamedTuple, Optional
 
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '../utils'))
-from DownloadFileDB import DownloadFileDB
-from ImageDownloader import download_image
-import time
-from playwright.sync_api import sync_playwright
+from DownloadFileDB import create_db
+from SeenCache import SeenCache
+from ImageDownloader import ImageDownloader
+from AsyncFetcher import BlockingFetcher
+from RateLimiter import HostRateLimiter, THROTTLE_STATUS, ThrottledError, image_rate_limiter, parse_retry_after
+from GalleryDownloader import download_gallery, failed_results, print_result
+from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
+from BrowserPool import BrowserPool, block_resource_types
+from CrawlPipeline import CrawlPipeline, InFlight, PageWalker
+from HtmlExtractor import HtmlExtractor
 
-def get_page_with_playwright(url, headers, scroll_count=3):
+LISTING_URL = 'https://www.pornpics.com/zh/japanese/'
+TABLE_NAME = "pornpics"
+PAGE_SIZE = 20  # 每滚动一次大约加载的条目数
+HEADERS = {
+    "Accept": "text/html, application/xhtml+xml, application/xml;q=0.9, image/webp, image/apng, application/json, text/plain; q=0.8",
+    "User-Agent": 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/141.0.0.0 Safari/537.36',
+    "Referer": "https://tw.8se.me/",
+}
+ITEM_SELECTOR = 'ul.wookmark-initialised li'
+# 滚动时按这个计数：与 PornpicsExtractor.listing 一样不算 class 含 r2-frame 的广告条目，
+# 否则有广告时按 (page+1)*20 停止滚动，切片会少几条，页与页之间的图集漏爬
+CONTENT_ITEM_SELECTOR = 'ul.wookmark-initialised li:not([class*="r2-frame"])'
+BLOCKED_RESOURCES = ('image', 'font', 'media')  # 只需要 HTML 里的链接，不加载这些资源
+
+
+class PornpicsExtractor(HtmlExtractor):
+    """pornpics 页面提取器"""
+
+    LISTING_ITEMS = etree.XPath('//ul[@class="wookmark-initialised"]//li')
+    ITEM_LINK = etree.XPath('.//a/@href')
+    DETAIL_PICS = etree.XPath('//ul[@class="wookmark-initialised"]//li//a/@href')
+    DETAIL_TITLE = etree.XPath('//div[@class="title-section filters gallery"]/h1/text()')
+
+    def listing(self, text):
+        """解析列表页，返回详情页链接列表（跳过广告条目）"""
+        detail_list = []
+        for item in self.LISTING_ITEMS(self.parse(text)):
+            # 检查li标签class是否包含r2-frame
+            if 'r2-frame' in item.get('class', ''):
+                continue
+            link = self.ITEM_LINK(item)
+            if link:
+                detail_list.append(link[0])
+        return detail_list
+
+    def detail(self, text):
+        """解析详情页，返回 (标题, 图片列表)"""
+        tree = self.parse(text)
+        return self.DETAIL_TITLE(tree)[0], self.DETAIL_PICS(tree)
+
+
+class Rendered(NamedTuple):
+    """render_page 的结果"""
+    content: str
+    ok: bool  # 状态码为 200 且等到了列表才算完整（只有完整的页面可以缓存）
+    status: Optional[int]  # 导航的状态码，没有响应时为 None
+    retry_after: Optional[float] = None  # 响应里的 Retry-After（秒）
+
+
+def count_items(page):
+    """已加载的非广告条目数"""
+    return page.evaluate('s => document.querySelectorAll(s).length', CONTENT_ITEM_SELECTOR)
+
+
+def render_page(page, url, headers, scroll_count=3, target_count=None, stable_timeout=3000):
+    """
+    渲染页面，等待瀑布流列表出现后滚动加载，条目数不再增长或达到 target_count 时提前停止
+    :param scroll_count: 最多滚动次数
+    :param target_count: 目标条目数（不含广告），为 None 则不限
+    :param stable_timeout: 每次滚动后等待新条目出现的最长毫秒数，超时视为已加载完
+    :return: Rendered
+    """
+    page.set_extra_http_headers(headers)
+
+    response = page.goto(url, wait_until='domcontentloaded', timeout=60000)
+    status = response.status if response is not None else None
+    retry_after = parse_retry_after(response.headers.get('retry-after')) if response is not None else None
+    if status in THROTTLE_STATUS:
+        raise ThrottledError(url, status, retry_after)
+    try:
+        page.wait_for_selector(ITEM_SELECTOR, state='attached', timeout=30000)
+    except PlaywrightTimeoutError:
+        print(f"{Fore.YELLOW}等待列表超时: {url}{Style.RESET_ALL}")
+        return Rendered(page.content(), False, status, retry_after)
+
+    count = count_items(page)
+    for i in range(scroll_count):
+        if target_count is not None and count >= target_count:
+            break
+        page.evaluate('window.scrollBy(0, document.body.scrollHeight)')
+        try:
+            page.wait_for_function(
+                '([s, n]) => document.querySelectorAll(s).length > n',
+                arg=[CONTENT_ITEM_SELECTOR, count],
+                timeout=stable_timeout
+            )
+        except PlaywrightTimeoutError:
+            print(f"已滚动第 {i+1} 次，条目数稳定在 {count}")
+            break
+        count = count_items(page)
+        print(f"已滚动第 {i+1} 次，共 {count} 条")
+
+    return Rendered(page.content(), status == 200, status, retry_after)
+
+
+def get_page_with_playwright(url, headers, scroll_count=3, browser_pool=None, target_count=None, rate_limiter=None,
+                             http_cache=None, cache_ttl=None):
+    if http_cache is not None:
+        # 渲染结果没有 ETag 可用，只按 ttl 缓存；滚动次数不同内容也不同，一并作为缓存键
+        key = f"{url}#render-{scroll_count}-{target_count}"
+        content = http_cache.fresh_text(key, cache_ttl)
+        if content is None:
+            rendered = _render_with_limit(url, headers, scroll_count, browser_pool, target_count, rate_limiter)
+            content = rendered.content
+            # 验证页、错误页、等待超时的半成品不缓存，否则整个 ttl 内都会拿到坏页面
+            if rendered.ok:
+                http_cache.store(key, content)
+        return content
+    return _render_with_limit(url, headers, scroll_count, browser_pool, target_count, rate_limiter).content
+
+
+def _render_with_limit(url, headers, scroll_count, browser_pool, target_count, rate_limiter):
+    """:return: render_page 的 Rendered"""
+    if rate_limiter is not None:
+        rate_limiter.acquire(url)
+        try:
+            rendered = _render_once(url, headers, scroll_count, browser_pool, target_count)
+        except ThrottledError as e:
+            rate_limiter.report(url, e.status_code, retry_after=e.retry_after)
+            raise
+        except PlaywrightTimeoutError:
+            rate_limiter.report(url, error=True)
+            raise
+        if rendered.ok:
+            rate_limiter.report(url, rendered.status, retry_after=rendered.retry_after)
+        else:
+            # 403 验证页、错误页、等不到列表都按失败处理，降速而不是加速
+            rate_limiter.report(url, rendered.status, error=True, retry_after=rendered.retry_after)
+        return rendered
+    return _render_once(url, headers, scroll_count, browser_pool, target_count)
+
+
+def _render_once(url, headers, scroll_count, browser_pool, target_count):
+    # 传入浏览器池时复用池里已启动的浏览器，否则临时启动一个
+    if browser_pool is not None:
+        return browser_pool.run(render_page, url, headers, scroll_count, target_count)
     with sync_playwright() as p:
         browser = p.chromium.launch(headless=True)
         page = browser.new_page()
-        
-        page.set_extra_http_headers(headers)
-        
-        page.goto(url, wait_until='networkidle', timeout=60000)
-        
-        page.wait_for_timeout(2000)
-        
-        for i in range(scroll_count):
-            page.evaluate('window.scrollBy(0, document.body.scrollHeight)')
-            page.wait_for_timeout(2000)
-            print(f"已滚动第 {i+1} 次")
-        
-        content = page.content()
+        block_resource_types(page, BLOCKED_RESOURCES)
+        rendered = render_page(page, url, headers, scroll_count, target_count)
         browser.close()
-        return content
+        return rendered
+
+
+class PornpicsCrawler:
+    """pornpics 爬虫：列表页 -> 详情页 -> 图片下载 -> 写库，四个阶段通过 CrawlPipeline 重叠执行"""
+
+    def __init__(self, url=LISTING_URL, save_root='./downloadFile/pornpics', db=None, downloader=None,
+                 browser_pool=None, detail_page=0, pic_start_index=0, render_workers=1, download_workers=2,
+                 stats_interval=60, async_io=False, http_cache=None, content_store=None):
+        """
+        :param url: 列表页地址
+        :param save_root: 图片保存根目录
+        :param db: 去重数据库（为 None 则新建 SeenCache）
+        :param downloader: ImageDownloader（为 None 则新建，带按主机限速）
+        :param browser_pool: BrowserPool（为 None 则新建，槽位数为 render_workers）
+        :param detail_page: 从第几条详情开始（手动续传用）
+        :param pic_start_index: 非0时只处理一个图集（手动续传用）
+        :param render_workers: 同时渲染的详情页数
+        :param download_workers: 同时下载的图集数
+        :param stats_interval: 每隔多少秒打印一次流水线统计
+        :param async_io: 下载器改用 asyncio + httpx（BlockingFetcher），一个事件循环并发下载整个图集
+        :param http_cache: HttpCache 实例，详情页的渲染结果在缓存有效期内不再渲染，为 None 则不缓存
+        :param content_store: ContentStore 实例（新建下载器时使用），重复内容的图片改为硬链接
+        """
+        self.url = url
+        if not os.path.exists(save_root):
+            os.makedirs(save_root)
+        self.a_name = os.path.abspath(save_root)
+        self.headers = dict(HEADERS)
+        # 渲染页面用保守的默认限速，图片 CDN 单独用一个宽松的，不拖慢并发下载
+        self.rate_limiter = HostRateLimiter()
+        self.image_rate_limiter = image_rate_limiter()
+        self.db = db if db is not None else SeenCache(create_db(pool_size=2))
+        if downloader is None and async_io:
+            downloader = BlockingFetcher(headers=self.headers, rate_limiter=self.image_rate_limiter,
+                                         content_store=content_store)
+        elif downloader is None:
+            downloader = ImageDownloader(headers=self.headers, rate_limiter=self.image_rate_limiter,
+                                         content_store=content_store)
+        self.downloader = downloader
+        if browser_pool is None:
+            browser_pool = BrowserPool(size=render_workers, block_resources=BLOCKED_RESOURCES)
+        self.browser_pool = browser_pool
+        self.http_cache = http_cache
+        self.content_store = content_store
+        self.extractor = PornpicsExtractor()
+        self.detail_page = detail_page
+        self.pic_start_index = pic_start_index
+        self.render_workers = render_workers
+        self.download_workers = download_workers
+        self.stats_interval = stats_interval
+        self.download_fail_list = []
+        self.page_walker = None
+        self.in_flight = InFlight()
+
+    def close(self):
+        self.downloader.close()
+        self.browser_pool.close()
+        self.db.close()
+
+    def _render(self, url, scroll_count=0, target_count=None, cache=False):
+        return get_page_with_playwright(url, self.headers, scroll_count, self.browser_pool, target_count,
+                                        rate_limiter=self.rate_limiter, http_cache=self.http_cache if cache else None)
+
+    def parse_listing(self, page):
+        """
+        列表页阶段：滚动 page 次加载列表，返回第 page*20 条之后未下载过的 (页码, 序号, 详情页链接)；
+        逐页爬取时只取第 page 页的 20 条
+        """
+        if self.page_walker is not None and self.page_walker.stopped(page):
+            return []
+        # 每次滚动加载的条目里夹着广告，滚动 page 次不一定够 (page+1)*20 条，多留几次；够数后会提前停止
+        target_count = (page + 1) * PAGE_SIZE
+        page_text = self._render(self.url, page + page // 2 + 1, target_count=target_count)
+        detail_list = self.extractor.listing(page_text)
+        print(f"第{page}页,共{len(detail_list)}条数据")
+        if self.page_walker is not None:
+            if len(detail_list) < target_count:
+                print(f"{Fore.YELLOW}列表只加载到{len(detail_list)}条，第{page}页不足{PAGE_SIZE}条{Style.RESET_ALL}")
+            detail_list = detail_list[page * PAGE_SIZE:target_count]
+        elif page > 0:
+            start_index = page * PAGE_SIZE
+            detail_list = detail_list[start_index:]
+            print(f"从第{start_index}条开始处理，剩余{len(detail_list)}条")
+        # 一次查询过滤掉整页中已下载过的详情页
+        existing_urls = self.db.get_existing_urls(table_name=TABLE_NAME, urls=detail_list)
+        print(f"{Fore.GREEN}本页已存在{len(existing_urls)}条，跳过{Style.RESET_ALL}")
+        new_items = []
+        for detail_index, detail_url in enumerate(detail_list):
+            if detail_url in existing_urls:
+                continue
+            if detail_index < self.detail_page:
+                continue
+            new_items.append((page, detail_index, detail_url))
+            if self.pic_start_index != 0:
+                break
+        if self.page_walker is not None:
+            self.page_walker.page_done(page, len(detail_list), len(new_items))
+        return new_items
+
+    def parse_detail(self, item):
+        """详情页阶段：渲染详情页，解析标题和图片；已下载过或正在处理的跳过"""
+        page, detail_index, detail_url = item
+        # 列表页变动时同一链接可能出现在两页：先占住链接再查库，写库时先插入再释放
+        if not self.in_flight.claim(detail_url):
+            print(f"{Fore.GREEN}{detail_url}正在处理中，跳过{Style.RESET_ALL}")
+            return []
+        try:
+            if self.db.has_url(table_name=TABLE_NAME, url=detail_url):
+                print(f"{Fore.GREEN}{detail_url}已下载过了，跳过{Style.RESET_ALL}")
+                self.in_flight.release(detail_url)
+                return []
+            detail_title, detail_pic_list = self.extractor.detail(self._render(detail_url, cache=True))
+        except BaseException:
+            self.in_flight.release(detail_url)
+            raise
+        print(f'第{page}滚动的{detail_index}条数据{detail_title}共{len(detail_pic_list)}张图片')
+        return [{"page": page, "index": detail_index, "title": detail_title, "url": detail_url,
+                 "pics": detail_pic_list}]
+
+    def download(self, gallery):
+        """下载阶段：并发下载图集的所有图片，失败的记入 download_fail_list"""
+        save_file_path = os.path.join(self.a_name, gallery["title"])
+        try:
+            results = download_gallery(gallery["pics"], save_file_path, self.headers, self.downloader,
+                                       on_result=print_result)
+        except BaseException:
+            self.in_flight.release(gallery["url"])
+            raise
+        for result in failed_results(results):
+            self.download_fail_list.append({"title": gallery["title"], "pic": result["url"]})
+        if self.download_fail_list:
+            print(f"{Fore.RED}下载失败:{self.download_fail_list}{Style.RESET_ALL}")
+        print(f'{Fore.YELLOW}第{gallery["page"]}页的第{gallery["index"]}条{gallery["title"]}下载完毕{Style.RESET_ALL}')
+        return [gallery]
+
+    def commit(self, gallery):
+        """写库阶段：记录已下载的详情页"""
+        try:
+            new_id = self.db.insert_url_custom(title=gallery["title"], url=gallery["url"], table_name=TABLE_NAME)
+        finally:
+            self.in_flight.release(gallery["url"])
+        print(f"{Fore.GREEN}新增记录成功，id：{new_id}{Style.RESET_ALL}")
+        print(f"当前速率: 页面 {self.rate_limiter.format_stats()}; 图片 {self.image_rate_limiter.format_stats()}")
+        if self.http_cache is not None:
+            print(f"页面缓存: {self.http_cache.format_stats()}")
+        if self.content_store is not None:
+            print(f"内容去重: {self.content_store.format_stats()}")
+
+    def build_pipeline(self):
+        return (CrawlPipeline(stats_interval=self.stats_interval)
+                .add_stage("列表页", self.parse_listing, workers=1, queue_size=4)
+                .add_stage("详情页", self.parse_detail, workers=self.render_workers, queue_size=64)
+                .add_stage("下载", self.download, workers=self.download_workers, queue_size=2)
+                .add_stage("写库", self.commit, workers=1, queue_size=16))
+
+    def crawl(self, pages):
+        """爬取 pages 中的各个列表页（页码即滚动次数）"""
+        pages = list(pages)
+        self.build_pipeline().run(pages)
+        print(f"第{pages}页所有数据下载完毕，下载失败{self.download_fail_list}")
+
+    def crawl_pages(self, start_page=0, end_page=None, until_seen=False):
+        """
+        从 start_page 开始逐页（每页 20 条）爬取，到 end_page 为止；until_seen 时遇到整页都已下载过就停止
+        """
+        walker = PageWalker(start_page, end_page, until_seen)
+        self.page_walker = walker
+        try:
+            self.build_pipeline().run(walker)
+        finally:
+            self.page_walker = None
+        last_page = walker.stopped_at if walker.stopped_at is not None else end_page
+        print(f"第{start_page}-{last_page}页所有数据下载完毕，下载失败{self.download_fail_list}")
+
 
 if __name__ == '__main__':
     page = 0 #初始值0
     detail_page = 0 #初始值0
     pic_start_index = 0 #初始值0
-    download_fail_list = []
-    headers = {
-        "Accept": "text/html, application/xhtml+xml, application/xml;q=0.9, image/webp, image/apng, application/json, text/plain; q=0.8",
-        "User-Agent": 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/141.0.0.0 Safari/537.36',
-        "Referer": "https://tw.8se.me/",
-    }
-    url = f'https://www.pornpics.com/zh/japanese/'
-    if not os.path.exists("./downloadFile/pornpics"):
-        os.makedirs("./downloadFile/pornpics")
-    a_name = os.path.abspath('./downloadFile/pornpics')
-    print(a_name)
-    db = DownloadFileDB()
-    parser = etree.HTMLParser(encoding="utf-8")
-    page_text = get_page_with_playwright(url, headers,page)
-    tree = etree.HTML(page_text, parser=parser)
-    detail_list = []
-    items = tree.xpath('//ul[@class="wookmark-initialised"]//li')
-    for item in items:
-        # 检查li标签class是否包含r2-frame
-        li_class = item.get('class', '')
-        if 'r2-frame' in li_class:
-            continue
-        # 获取链接
-        link = item.xpath('.//a/@href')
-        if link:
-            detail_list.append(link[0])
-    print(f"第{page}页,共{len(detail_list)}条数据")
-    if page > 0:
-        start_index = page * 20
-        detail_list = detail_list[start_index:]
-        print(f"从第{start_index}条开始处理，剩余{len(detail_list)}条")
-    for detail_index, detail_url in enumerate(detail_list):
-        exact_result = db.get_by_url_custom(url=detail_url, table_name="pornpics")
-        if exact_result:
-            print(f"{Fore.GREEN}已存在:{detail_url}{Style.RESET_ALL}")
-            continue
-        if detail_index < detail_page:
-            continue
-        detail_page_text = get_page_with_playwright(detail_url, headers, scroll_count=0)
-        detail_tree = etree.HTML(detail_page_text, parser=parser)
-        detail_pic_list = detail_tree.xpath('//ul[@class="wookmark-initialised"]//li//a/@href')
-        detail_title = detail_tree.xpath('//div[@class="title-section filters gallery"]/h1/text()')[0]
-        save_file_path = os.path.join(a_name, detail_title)
-        print(f'第{page}滚动的{detail_index}条数据{detail_title}共{len(detail_pic_list)}张图片')
-        for pic_index, pic_url in enumerate(detail_pic_list):
-            fileSize = download_image(pic_url, save_file_path, headers)
-            if fileSize == "失败":
-                download_fail_list.append({"title": detail_title, "pic": pic_url})
-                print(f"{Fore.RED}下载失败:{download_fail_list}{Style.RESET_ALL}")
-                continue
-            print(pic_url, fileSize)
-        print(f'{Fore.YELLOW}第{page}页的第{detail_index}条{detail_title}下载完毕{Style.RESET_ALL}')
-        new_id = db.insert_url_custom(title=detail_title, url=detail_url, table_name="pornpics")
-        print(f"{Fore.GREEN}新增记录成功，id：{new_id}{Style.RESET_ALL}")
-        if pic_start_index != 0:
-            print(f"第{page}页所有数据下载完毕，下载失败{download_fail_list}")
-            exit(0)
-        time.sleep(30)
+    crawler = PornpicsCrawler(detail_page=detail_page, pic_start_index=pic_start_index)
+    print(crawler.a_name)
+    try:
+        crawler.crawl([page])
+    finally:
+        crawler.close()
     exit(0)
@@ -0,0 +1,303 @@
+import asyncio
+import os
+import threading
+import time
+from colorama import Fore, Style
+from typing import Dict, List
+from urllib.parse import urlsplit
+
+from GalleryDownloader import save_path_groups
+from ImageDownloader import (DEFAULT_CHUNK_SIZE, PART_SUFFIX, _check_response, _commit_part, _discard_part,
+                             _existing_path, _mark_skipped, _resume_headers, _size_matches, _start_hasher,
+                             _write_part_meta, format_size, save_path_for)
+
+try:
+    import httpx
+except ImportError:  # 只有用到异步下载时才需要 httpx
+    httpx = None
+
+DEFAULT_PER_HOST_LIMIT = 16  # 同一主机同时进行的请求数
+DEFAULT_MAX_CONNECTIONS = 256  # 整个客户端的最大连接数
+
+
+class AsyncFetcher:
+    """
+    基于 asyncio + httpx 的抓取客户端：HTTP/1.1 长连接（可选 HTTP/2），按主机用信号量限制并发，
+    一个进程可以同时进行上百个图片下载而不需要每个请求一个线程。
+    fetch 的结果字典、.part 续传和跳过已存在文件的行为与 ImageDownloader 一致。
+    """
+
+    def __init__(self, headers=None, per_host_limit=DEFAULT_PER_HOST_LIMIT, max_connections=DEFAULT_MAX_CONNECTIONS,
+                 http2=False, timeout=(30, 60), chunk_size=DEFAULT_CHUNK_SIZE, hash_algo=None,
+                 skip_existing=True, verify_existing_size=True, resume=True, rate_limiter=None, http_cache=None,
+                 content_store=None, page_rate_limiter=None):
+        """
+        :param headers: 默认请求头
+        :param per_host_limit: 同一主机的最大并发请求数
+        :param max_connections: 连接池最大连接数
+        :param http2: 是否启用 HTTP/2（需要安装 h2，未安装时退回 HTTP/1.1）
+        :param timeout: (连接超时, 读取超时)
+        :param chunk_size: 流式写入的块大小
+        :param hash_algo: 边下载边计算的哈希算法名，为 None 则不计算
+        :param skip_existing: 本地已有同名文件时跳过
+        :param verify_existing_size: 跳过前先用 HEAD 校验本地文件大小与远端一致，不一致则重新下载
+        :param resume: 失败时保留 .part 文件，下次用 Range 续传
+        :param rate_limiter: HostRateLimiter 实例，为 None 则不限速
+        :param http_cache: HttpCache 实例，get_text 的页面经过磁盘缓存和条件请求，为 None 则不缓存
+        :param content_store: ContentStore 实例，按内容哈希去重，为 None 则直接按文件名保存
+        :param page_rate_limiter: get_text 使用的限速器（页面和图片分开限速），为 None 则与图片共用 rate_limiter
+        """
+        if httpx is None:
+            raise ImportError("异步下载需要安装 httpx：pip install httpx")
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                print(f"{Fore.YELLOW}未安装 h2，HTTP/2 不可用，使用 HTTP/1.1{Style.RESET_ALL}")
+                http2 = False
+        self.headers = dict(headers or {})
+        self.per_host_limit = per_host_limit
+        self.chunk_size = chunk_size
+        self.hash_algo = hash_algo
+        self.skip_existing = skip_existing
+        self.verify_existing_size = verify_existing_size
+        self.resume = resume
+        self.rate_limiter = rate_limiter
+        self.page_rate_limiter = page_rate_limiter if page_rate_limiter is not None else rate_limiter
+        self.http_cache = http_cache
+        self.content_store = content_store
+        self._client = httpx.AsyncClient(
+            http2=http2,
+            verify=False,
+            follow_redirects=True,
+            headers=self.headers,
+            timeout=httpx.Timeout(timeout[1], connect=timeout[0]),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    def _semaphore(self, url) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        sem = self._semaphores.get(host)
+        if sem is None:
+            sem = asyncio.Semaphore(self.per_host_limit)
+            self._semaphores[host] = sem
+        return sem
+
+    async def _send(self, method, url, headers=None, stream=False, rate_limiter=None):
+        """
+        发送请求（经过按主机信号量和限速器），stream=True 时调用方负责 aclose 响应
+        :param rate_limiter: 使用的限速器，为 None 则用图片的 rate_limiter
+        """
+        rate_limiter = rate_limiter or self.rate_limiter
+        if rate_limiter is not None:
+            await rate_limiter.acquire_async(url)
+        request = self._client.build_request(method, url, headers=headers)
+        try:
+            response = await self._client.send(request, stream=stream)
+        except (httpx.TimeoutException, httpx.NetworkError):
+            if rate_limiter is not None:
+                rate_limiter.report(url, error=True)
+            raise
+        if rate_limiter is not None:
+            rate_limiter.report_response(url, response)
+        return response
+
+    async def get_text(self, url, headers=None, cache_ttl=None) -> str:
+        """获取页面文本，cache_ttl 同 ImageDownloader.get_text"""
+        entry = None
+        if self.http_cache is not None:
+            text = self.http_cache.fresh_text(url, cache_ttl)
+            if text is not None:
+                return text
+            entry = self.http_cache.lookup(url)
+            if entry is not None:
+                headers = dict(headers or {}, **self.http_cache.validators(entry))
+        async with self._semaphore(url):
+            response = await self._send('GET', url, headers, rate_limiter=self.page_rate_limiter)
+        if response.status_code == 304 and entry is not None:
+            self.http_cache.refresh(url)
+            return entry["text"]
+        if self.http_cache is not None and response.status_code == 200:
+            self.http_cache.store(url, response.text, response.headers)
+        return response.text
+
+    async def _existing_is_complete(self, img_url, save_path, headers) -> bool:
+        if not self.verify_existing_size:
+            return True
+        try:
+            response = await self._send('HEAD', img_url, headers)
+        except httpx.HTTPError:
+            return True
+        return _size_matches(response.status_code, response.headers, save_path)
+
+    async def fetch(self, img_url, save_dir, headers=None):
+        """
+        下载单张图片，返回与 ImageDownloader.fetch 相同格式的结果字典
+        """
+        if not os.path.exists(save_dir):
+            os.makedirs(save_dir, exist_ok=True)
+        save_path = save_path_for(img_url, save_dir)
+        part_path = save_path + PART_SUFFIX
+        result = {"url": img_url, "path": save_path, "status": None, "size": None, "elapsed": 0.0, "error": None}
+        start = time.perf_counter()
+        try:
+            async with self._semaphore(img_url):
+                existing_path = _existing_path(self.content_store, img_url, save_path)
+                if self.skip_existing and os.path.exists(existing_path) \
+                        and await self._existing_is_complete(img_url, existing_path, headers):
+                    _mark_skipped(result, existing_path)
+                    return result
+
+                request_headers, offset = _resume_headers(part_path, headers, self.resume)
+                response = await self._send('GET', img_url, request_headers, stream=True)
+                if response.status_code == 416 and offset:
+                    # 断点已超出远端文件范围，丢弃 .part 重新下载
+                    await response.aclose()
+                    _discard_part(part_path)
+                    offset = 0
+                    response = await self._send('GET', img_url, headers, stream=True)
+                try:
+                    result["status"] = response.status_code
+                    offset, result["error"] = _check_response(response.status_code,
+                                                              response.headers.get('Content-Range'), offset)
+                    if result["error"]:
+                        return result
+                    await self._write_stream(response, save_path, result, offset)
+                    return result
+                finally:
+                    await response.aclose()
+        except Exception as e:
+            result["error"] = str(e)[:80] or type(e).__name__
+            return result
+        finally:
+            result["elapsed"] = time.perf_counter() - start
+
+    async def _write_stream(self, response, save_path, result, offset=0) -> None:
+        part_path = save_path + PART_SUFFIX
+        hasher = _start_hasher(self.content_store, self.hash_algo, part_path, offset, self.chunk_size)
+        if self.resume:
+            _write_part_meta(part_path, response.headers)
+        size = offset
+        f = open(part_path, 'ab' if offset else 'wb')
+        try:
+            async for chunk in response.aiter_bytes(self.chunk_size):
+                f.write(chunk)
+                size += len(chunk)
+                if hasher is not None:
+                    hasher.update(chunk)
+            # fsync 和内容去重的提交可能很慢，放到线程里执行，不阻塞事件循环
+            await asyncio.to_thread(_sync_and_close, f)
+            await asyncio.to_thread(_commit_part, self.content_store, part_path, save_path, result, hasher, size,
+                                    offset)
+        except BaseException:
+            f.close()
+            if not self.resume and os.path.exists(part_path):
+                os.remove(part_path)
+            raise
+
+    async def download_image(self, img_url, save_dir, headers=None):
+        """下载单张图片，返回 "xx.xxKB" 或 "失败"（与 ImageDownloader.download_image 一致）"""
+        result = await self.fetch(img_url, save_dir, headers)
+        if result["size"] is None:
+            print(f"{Fore.RED}下载失败: {result['error']}{Style.RESET_ALL}")
+            return "失败"
+        return format_size(result["size"])
+
+    async def download_gallery(self, url_list, save_dir, headers=None, on_result=None) -> List[Dict]:
+        """
+        并发下载一个图集，并发数由按主机的信号量控制；保存路径相同的图片在同一个任务里依次处理
+        :return: 与 url_list 顺序一致的结果列表（附加 index）
+        """
+        async def task(group):
+            results = []
+            fetched = {}
+            for index, url in group:
+                if url not in fetched:
+                    fetched[url] = await self.fetch(url, save_dir, headers)
+                result = dict(fetched[url], index=index)
+                if on_result is not None:
+                    on_result(result)
+                results.append(result)
+            return results
+
+        groups = await asyncio.gather(*(task(group) for group in save_path_groups(url_list, save_dir)))
+        return sorted((result for results in groups for result in results), key=lambda result: result["index"])
+
+
+def _sync_and_close(f) -> None:
+    try:
+        f.flush()
+        os.fsync(f.fileno())
+    finally:
+        f.close()
+
+
+class BlockingFetcher:
+    """
+    AsyncFetcher 的同步包装：在后台线程里跑一个事件循环，提供与 ImageDownloader 相同的
+    get_text/fetch/download_image/close 方法，可以直接替换现有脚本里的下载器；
+    GalleryDownloader.download_gallery 遇到它时整个图集交给事件循环并发下载
+    """
+
+    def __init__(self, **kwargs):
+        """:param kwargs: 传给 AsyncFetcher 的参数"""
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="async-fetcher", daemon=True)
+        self._thread.start()
+        self._closed = False
+        try:
+            self.fetcher = self._run(self._create(kwargs))
+        except BaseException:
+            self._stop_loop()
+            raise
+        self.headers = self.fetcher.headers
+
+    @staticmethod
+    async def _create(kwargs):
+        # httpx.AsyncClient 和信号量需要在事件循环线程里创建
+        return AsyncFetcher(**kwargs)
+
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def get_text(self, url, headers=None, cache_ttl=None) -> str:
+        return self._run(self.fetcher.get_text(url, headers, cache_ttl))
+
+    def fetch(self, img_url, save_dir, headers=None):
+        return self._run(self.fetcher.fetch(img_url, save_dir, headers))
+
+    def download_image(self, img_url, save_dir, headers=None):
+        return self._run(self.fetcher.download_image(img_url, save_dir, headers))
+
+    def fetch_gallery(self, url_list, save_dir, headers=None, on_result=None) -> List[Dict]:
+        return self._run(self.fetcher.download_gallery(url_list, save_dir, headers, on_result))
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._run(self.fetcher.aclose())
+        finally:
+            self._stop_loop()
+
+    def _stop_loop(self) -> None:
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
@@ -0,0 +1,276 @@
+import gzip
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from colorama import Fore, Style
+from typing import Dict, List
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # 只有写 Parquet 时才需要 pyarrow
+    pyarrow = None
+
+# 结构化记录的字段（列式存储按这个顺序建表），raw 为原始 STT 正文
+RECORD_FIELDS = ("time", "room", "type", "uid", "nn", "txt", "level", "gift", "hits", "raw")
+DEFAULT_ROTATE_BYTES = 128 * 1024 * 1024  # 单个文件写到多大时换新文件
+DEFAULT_ROTATE_SECONDS = 3600  # 单个文件最多写多久
+SINK_KINDS = ("jsonl", "jsonl.gz", "parquet", "sqlite")
+
+
+def to_record(msg, room, received=None) -> Dict:
+    """
+    把 STTMessage 转成结构化记录
+    :param received: 收到的时间，默认用接收循环记在消息上的 msg.received（积压时处理得晚，不能用处理时的时间）
+    """
+    fields = msg.to_dict()
+    if received is None:
+        received = msg.received
+    return {
+        "time": received if received is not None else time.time(),
+        "room": room,
+        "type": fields.get("type", ""),
+        "uid": fields.get("uid"),
+        "nn": fields.get("nn"),
+        "txt": fields.get("txt"),
+        "level": fields.get("level"),
+        "gift": fields.get("giftName") or fields.get("gfid"),
+        "hits": fields.get("hits"),
+        "raw": msg.raw,
+    }
+
+
+class BarrageSink:
+    """输出目标的基类：write_batch 在 BatchWriter 的后台线程里调用"""
+
+    def write_batch(self, records: List[Dict]) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class RotatingFileSink(BarrageSink):
+    """按大小和时间轮转的文件输出，文件名为 {prefix}-{开始时间}{suffix}"""
+
+    suffix = ""
+
+    def __init__(self, out_dir, prefix="barrage", rotate_bytes=DEFAULT_ROTATE_BYTES,
+                 rotate_seconds=DEFAULT_ROTATE_SECONDS):
+        if not os.path.exists(out_dir):
+            os.makedirs(out_dir, exist_ok=True)
+        self.out_dir = out_dir
+        self.prefix = prefix
+        self.rotate_bytes = rotate_bytes
+        self.rotate_seconds = rotate_seconds
+        self.path = None
+        self._opened_at = 0.0
+        self._written = 0
+
+    def _next_path(self) -> str:
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        path = os.path.join(self.out_dir, f"{self.prefix}-{stamp}{self.suffix}")
+        index = 1
+        while os.path.exists(path):
+            path = os.path.join(self.out_dir, f"{self.prefix}-{stamp}-{index}{self.suffix}")
+            index += 1
+        return path
+
+    def _should_rotate(self) -> bool:
+        return (self.path is None or self._written >= self.rotate_bytes
+                or time.monotonic() - self._opened_at >= self.rotate_seconds)
+
+    def write_batch(self, records):
+        if self._should_rotate():
+            self._close_file()
+            self.path = self._next_path()
+            self._open_file(self.path)
+            self._opened_at = time.monotonic()
+            self._written = 0
+        self._written += self._write(records)
+
+    def close(self):
+        self._close_file()
+
+    def _open_file(self, path) -> None:
+        raise NotImplementedError
+
+    def _write(self, records) -> int:
+        """写入一批记录，返回写入的字节数（用于按大小轮转）"""
+        raise NotImplementedError
+
+    def _close_file(self) -> None:
+        raise NotImplementedError
+
+
+class JsonlSink(RotatingFileSink):
+    """每行一条 JSON 记录，compress=True 时写 gzip"""
+
+    def __init__(self, out_dir, prefix="barrage", compress=False, **kwargs):
+        self.compress = compress
+        self.suffix = ".jsonl.gz" if compress else ".jsonl"
+        super().__init__(out_dir, prefix, **kwargs)
+        self._file = None
+
+    def _open_file(self, path):
+        self._file = gzip.open(path, "wb") if self.compress else open(path, "wb")
+
+    def _write(self, records):
+        data = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records).encode("utf-8")
+        self._file.write(data)
+        self._file.flush()
+        return len(data)
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class ParquetSink(RotatingFileSink):
+    """Parquet 列式文件，每批记录写成一个 row group（需要安装 pyarrow）"""
+
+    suffix = ".parquet"
+
+    def __init__(self, out_dir, prefix="barrage", **kwargs):
+        if pyarrow is None:
+            raise ImportError("写 Parquet 需要安装 pyarrow：pip install pyarrow")
+        super().__init__(out_dir, prefix, **kwargs)
+        self.schema = pyarrow.schema(
+            [("time", pyarrow.float64())] + [(name, pyarrow.string()) for name in RECORD_FIELDS[1:]]
+        )
+        self._writer = None
+
+    def _open_file(self, path):
+        self._writer = pyarrow.parquet.ParquetWriter(path, self.schema, compression="zstd")
+
+    def _write(self, records):
+        table = pyarrow.Table.from_pylist(records, schema=self.schema)
+        self._writer.write_table(table)
+        return table.nbytes
+
+    def _close_file(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+class SQLiteSink(BarrageSink):
+    """写入 SQLite 的 barrage 表，每批一个事务"""
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        # 连接在 BatchWriter 的后台线程里使用
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        columns = ", ".join(f"{name} REAL" if name == "time" else f"{name} TEXT" for name in RECORD_FIELDS)
+        self.conn.execute(f"CREATE TABLE IF NOT EXISTS barrage ({columns})")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_barrage_room_time ON barrage (room, time)")
+        self.conn.commit()
+        self._sql = (f"INSERT INTO barrage ({', '.join(RECORD_FIELDS)}) "
+                     f"VALUES ({', '.join('?' for _ in RECORD_FIELDS)})")
+
+    def write_batch(self, records):
+        with self.conn:
+            self.conn.executemany(self._sql, [tuple(record.get(name) for name in RECORD_FIELDS)
+                                              for record in records])
+
+    def close(self):
+        self.conn.close()
+
+
+def create_sink(kind, out_dir="./downloadFile/barrage", prefix="barrage", **kwargs) -> BarrageSink:
+    """
+    :param kind: jsonl / jsonl.gz / parquet / sqlite
+    :param out_dir: 输出目录（sqlite 为目录下的 {prefix}.sqlite3）
+    :param kwargs: 文件类输出的 rotate_bytes / rotate_seconds
+    """
+    if kind == "jsonl":
+        return JsonlSink(out_dir, prefix, **kwargs)
+    if kind == "jsonl.gz":
+        return JsonlSink(out_dir, prefix, compress=True, **kwargs)
+    if kind == "parquet":
+        return ParquetSink(out_dir, prefix, **kwargs)
+    if kind == "sqlite":
+        return SQLiteSink(os.path.join(out_dir, f"{prefix}.sqlite3"))
+    raise ValueError(f"不支持的输出类型: {kind}（可选 {', '.join(SINK_KINDS)}）")
+
+
+_STOP = object()
+
+
+class BatchWriter:
+    """
+    后台批量写入：接收循环只把记录放进队列（不等磁盘），后台线程攒够 batch_size 条
+    或距上次写入超过 flush_interval 秒时写一批；队列满时丢弃新记录并计数
+    """
+
+    def __init__(self, sink: BarrageSink, batch_size=1000, flush_interval=2.0, queue_size=100000):
+        self.sink = sink
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.dropped = 0  # 队列满被丢弃的记录数
+        self.batches = 0
+        self.errors = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, name="barrage-writer", daemon=True)
+        self._thread.start()
+
+    def put(self, record) -> bool:
+        try:
+            self._queue.put_nowait(record)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _run(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                break
+            if item is not None:
+                batch.append(item)
+            if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                self._flush(batch)
+                batch = []
+                deadline = time.monotonic() + self.flush_interval
+        self._flush(batch)
+
+    def _flush(self, batch):
+        if not batch:
+            return
+        try:
+            self.sink.write_batch(batch)
+            self.written += len(batch)
+            self.batches += 1
+        except Exception as e:
+            self.errors += 1
+            print(f"{Fore.RED}写入失败({len(batch)}条): {str(e)[:120]}{Style.RESET_ALL}")
+
+    def close(self):
+        """写完队列中剩余的记录后关闭输出"""
+        self._queue.put(_STOP)
+        self._thread.join()
+        self.sink.close()
+
+    def stats(self) -> Dict:
+        return {"written": self.written, "dropped": self.dropped, "batches": self.batches, "errors": self.errors,
+                "queued": self._queue.qsize()}
+
+    def format_stats(self) -> str:
+        s = self.stats()
+        return f"已写入{s['written']} 批次{s['batches']} 排队{s['queued']} 丢弃{s['dropped']} 失败{s['errors']}"
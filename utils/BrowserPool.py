@@ -0,0 +1,156 @@
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, Iterable, Optional
+
+
+class BrowserPool:
+    """
+    Playwright 浏览器池：每个槽位是一个独立线程，线程内只启动一次 Chromium，
+    渲染任务通过队列交给空闲的槽位执行（sync API 的对象只能在创建它的线程里使用）。
+    每个浏览器上下文使用 max_uses 次后重建，close() 时关闭所有浏览器。
+    """
+
+    def __init__(
+            self,
+            size: int = 1,
+            max_uses: int = 50,
+            headless: bool = True,
+            launch_options: Optional[Dict] = None,
+            context_options: Optional[Dict] = None,
+            block_resources: Iterable[str] = ()
+    ):
+        """
+        :param size: 槽位数（同时渲染的页面数，每个槽位一个 Chromium 进程）
+        :param max_uses: 每个浏览器上下文渲染多少个页面后重建（释放缓存和内存）
+        :param headless: 是否无头模式
+        :param launch_options: 传给 chromium.launch 的其它参数
+        :param context_options: 传给 browser.new_context 的参数
+        :param block_resources: 渲染时直接拦截的资源类型（如 "image"、"font"、"media"）
+        """
+        if size < 1:
+            raise ValueError("浏览器池大小至少为1")
+        self.max_uses = max_uses
+        self.headless = headless
+        self.launch_options = dict(launch_options or {})
+        self.context_options = dict(context_options or {})
+        self.block_resources = tuple(block_resources)
+        self._jobs = queue.Queue()
+        self._closed = False
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"browser-pool-{i}", daemon=True)
+            for i in range(size)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """
+        提交一个渲染任务，fn(page, *args, **kwargs) 在槽位线程里用一个新页面执行，页面用完自动关闭
+        :return: Future，result() 为 fn 的返回值
+        """
+        if self._closed:
+            raise RuntimeError("浏览器池已关闭")
+        future = Future()
+        self._jobs.put((future, fn, args, kwargs))
+        return future
+
+    def run(self, fn: Callable, *args, **kwargs):
+        """同 submit，阻塞等待结果"""
+        return self.submit(fn, *args, **kwargs).result()
+
+    def close(self) -> None:
+        """等正在执行的任务结束后关闭所有浏览器"""
+        if self._closed:
+            return
+        self._closed = True
+        for _ in self._threads:
+            self._jobs.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    def _worker(self) -> None:
+        try:
+            from playwright.sync_api import sync_playwright
+            playwright = sync_playwright().start()
+        except Exception as e:
+            self._fail_jobs(e)
+            return
+        browser = None
+        context = None
+        uses = 0
+        try:
+            while True:
+                job = self._jobs.get()
+                if job is None:
+                    break
+                future, fn, args, kwargs = job
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    if browser is None or not browser.is_connected():
+                        # 首次使用或浏览器崩溃后重新启动
+                        browser = playwright.chromium.launch(headless=self.headless, **self.launch_options)
+                        context = None
+                    if context is None:
+                        context = browser.new_context(**self.context_options)
+                        block_resource_types(context, self.block_resources)
+                        uses = 0
+                    page = context.new_page()
+                except Exception as e:
+                    future.set_exception(e)
+                    continue
+                try:
+                    future.set_result(fn(page, *args, **kwargs))
+                except BaseException as e:
+                    future.set_exception(e)
+                finally:
+                    _close_quietly(page)
+                uses += 1
+                if uses >= self.max_uses:
+                    _close_quietly(context)
+                    context = None
+        finally:
+            if context is not None:
+                _close_quietly(context)
+            if browser is not None:
+                _close_quietly(browser)
+            playwright.stop()
+
+    def _fail_jobs(self, error: Exception) -> None:
+        """Playwright 无法启动时，让这个槽位领到的任务全部以该异常结束"""
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            future = job[0]
+            if future.set_running_or_notify_cancel():
+                future.set_exception(error)
+
+
+def block_resource_types(target, resource_types: Iterable[str]) -> None:
+    """在 page 或 context 上拦截指定类型的资源请求"""
+    blocked = frozenset(resource_types)
+    if not blocked:
+        return
+
+    def handle(route):
+        if route.request.resource_type in blocked:
+            route.abort()
+        else:
+            route.continue_()
+
+    target.route("**/*", handle)
+
+
+def _close_quietly(obj) -> None:
+    try:
+        obj.close()
+    except Exception:
+        pass
@@ -0,0 +1,181 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+from ImageDownloader import DEFAULT_CHUNK_SIZE, _hash_file
+
+DEFAULT_INDEX_PATH = "./downloadFile/content_index.sqlite3"
+DEFAULT_ALGO = "sha256"
+
+
+class ContentStore:
+    """
+    按内容去重的图片存储：下载时边写边算哈希，索引记录 哈希 -> 第一次保存的路径。
+    内容已存在时用硬链接代替写入（同一张图转载到不同图集只占一份磁盘）；
+    同名但来自不同 url、内容不同的文件不再覆盖，改存为 "原名-哈希前8位.扩展名"；
+    同一 url 的旧文件（不完整或已过期）直接覆盖
+    """
+
+    def __init__(self, index_path=DEFAULT_INDEX_PATH, algo=DEFAULT_ALGO, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        :param index_path: 索引数据库（SQLite）路径
+        :param algo: 哈希算法名
+        :param chunk_size: 计算已有文件哈希时的读取块大小
+        """
+        index_dir = os.path.dirname(index_path)
+        if index_dir and not os.path.exists(index_dir):
+            os.makedirs(index_dir, exist_ok=True)
+        self.algo = algo
+        self.chunk_size = chunk_size
+        self.conn = sqlite3.connect(index_path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS content ("
+            "hash TEXT PRIMARY KEY, path TEXT NOT NULL, size INTEGER NOT NULL, created_at REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_content_path ON content (path)")
+        # 每个保存路径来自哪个 url，用来区分"替换自己的旧文件"和"别的图片恰好同名"
+        self.conn.execute("CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, url TEXT NOT NULL, hash TEXT NOT NULL)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_files_url ON files (url)")
+        self.conn.commit()
+        self.stored = 0  # 新写入的文件数
+        self.linked = 0  # 内容重复、改为硬链接的文件数
+        self.renamed = 0  # 同名不同内容、改名保存的文件数
+        self.bytes_saved = 0  # 硬链接省下的字节数
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self) -> None:
+        with self._lock:
+            self.conn.close()
+
+    def new_hasher(self):
+        return hashlib.new(self.algo)
+
+    def _lookup(self, digest) -> Optional[str]:
+        """哈希对应的已有文件路径，文件已被删除时清掉这条索引"""
+        row = self.conn.execute("SELECT path FROM content WHERE hash = ?", (digest,)).fetchone()
+        if row is None:
+            return None
+        if os.path.exists(row[0]):
+            return row[0]
+        self.conn.execute("DELETE FROM content WHERE hash = ?", (digest,))
+        self.conn.commit()
+        return None
+
+    def _hash_of(self, path) -> str:
+        """已有文件的哈希：优先查索引，索引里没有时读文件计算"""
+        row = self.conn.execute("SELECT hash FROM content WHERE path = ?", (path,)).fetchone()
+        if row is not None:
+            return row[0]
+        hasher = self.new_hasher()
+        _hash_file(hasher, path, self.chunk_size)
+        return hasher.hexdigest()
+
+    def _url_of(self, path) -> Optional[str]:
+        row = self.conn.execute("SELECT url FROM files WHERE path = ?", (path,)).fetchone()
+        return row[0] if row is not None else None
+
+    def _forget_path(self, path) -> None:
+        """要被覆盖的文件不再作为任何内容的已有副本"""
+        self.conn.execute("DELETE FROM content WHERE path = ?", (path,))
+        self.conn.commit()
+
+    def _record_file(self, path, url, digest) -> None:
+        if url is None:
+            return
+        self.conn.execute("INSERT OR REPLACE INTO files (path, url, hash) VALUES (?, ?, ?)", (path, url, digest))
+        self.conn.commit()
+
+    def path_for(self, url, directory=None) -> Optional[str]:
+        """
+        这个 url 上次保存到的路径（可能因同名冲突改过名），文件不存在时返回 None
+        :param directory: 只找这个目录下的（同一张图出现在别的图集时，那里的文件不算本图集已下载）
+        """
+        with self._lock:
+            rows = self.conn.execute("SELECT path FROM files WHERE url = ?", (url,)).fetchall()
+        if directory is not None:
+            directory = os.path.abspath(directory)
+        for (path,) in rows:
+            if directory is not None and os.path.dirname(path) != directory:
+                continue
+            if os.path.exists(path):
+                return path
+        return None
+
+    @staticmethod
+    def _alt_path(save_path, digest) -> str:
+        stem, ext = os.path.splitext(save_path)
+        return f"{stem}-{digest[:8]}{ext}"
+
+    def commit(self, part_path, save_path, digest, size, url=None) -> Dict:
+        """
+        把下载完成的临时文件放到最终位置
+        :param part_path: 已 fsync 的临时文件
+        :param save_path: 按 url 文件名拼出的保存路径
+        :param digest: 临时文件内容的哈希（十六进制）
+        :param size: 临时文件字节数
+        :param url: 图片地址；save_path 已有的文件记录为别的 url 时才算同名冲突，
+                    同一 url 或来源未知（下载器判定为不完整、要重新下载）的旧文件直接覆盖
+        :return: {"path": 最终路径, "linked": 是否硬链接到已有文件, "renamed": 是否因同名冲突改名}
+        """
+        save_path = os.path.abspath(save_path)
+        with self._lock:
+            target = save_path
+            renamed = False
+            if os.path.exists(save_path) and self._hash_of(save_path) != digest:
+                owner = self._url_of(save_path)
+                if url is not None and owner is not None and owner != url:
+                    target = self._alt_path(save_path, digest)
+                    renamed = True
+                else:
+                    self._forget_path(save_path)
+            existing = self._lookup(digest)
+            if existing is not None and os.path.exists(target) and os.path.samefile(existing, target):
+                # 同一个文件已经在这里了
+                os.remove(part_path)
+                self._record_file(target, url, digest)
+                return {"path": target, "linked": False, "renamed": renamed}
+            if existing is not None:
+                link_path = target + ".link"
+                try:
+                    if os.path.exists(link_path):
+                        os.remove(link_path)
+                    os.link(existing, link_path)
+                    os.replace(link_path, target)
+                except OSError:
+                    pass  # 不支持硬链接（跨磁盘、文件系统限制），退回正常写入
+                else:
+                    os.remove(part_path)
+                    self.linked += 1
+                    self.bytes_saved += size
+                    self.renamed += renamed
+                    self._record_file(target, url, digest)
+                    return {"path": target, "linked": True, "renamed": renamed}
+            os.replace(part_path, target)
+            if existing is None:
+                self.conn.execute("INSERT OR REPLACE INTO content (hash, path, size, created_at) VALUES (?, ?, ?, ?)",
+                                  (digest, target, size, time.time()))
+                self.conn.commit()
+            self._record_file(target, url, digest)
+            self.stored += 1
+            self.renamed += renamed
+            return {"path": target, "linked": False, "renamed": renamed}
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"stored": self.stored, "linked": self.linked, "renamed": self.renamed,
+                    "bytes_saved": self.bytes_saved}
+
+    def format_stats(self) -> str:
+        s = self.stats()
+        return (f"新写入{s['stored']} 重复链接{s['linked']} 同名改名{s['renamed']} "
+                f"节省{s['bytes_saved'] / 1024 / 1024:.2f}MB")
@@ -0,0 +1,234 @@
+import queue
+import threading
+import time
+from colorama import Fore, Style
+from typing import Callable, Dict, Iterable, List, Optional
+
+_STOP = object()  # 阶段结束标记
+
+
+class Stage:
+    """流水线中的一个阶段：一个有界输入队列 + 若干工作线程"""
+
+    def __init__(self, name: str, handler: Callable, workers: int = 1, queue_size: int = 16):
+        """
+        :param name: 阶段名称（用于统计输出）
+        :param handler: 处理函数 handler(item)，返回下游条目的可迭代对象（列表或生成器），返回 None 表示没有输出
+        :param workers: 工作线程数
+        :param queue_size: 输入队列容量，满了之后上游会阻塞（背压）
+        """
+        if workers < 1:
+            raise ValueError("每个阶段至少需要1个工作线程")
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.processed = 0  # 处理完成的条目数
+        self.emitted = 0  # 向下游输出的条目数
+        self.errors = 0
+        self.busy_time = 0.0  # 所有工作线程花在 handler 上的总时间
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+        self._running = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            end = self.finished_at or time.monotonic()
+            elapsed = end - self.started_at if self.started_at else 0.0
+            return {
+                "name": self.name,
+                "workers": self.workers,
+                "processed": self.processed,
+                "emitted": self.emitted,
+                "errors": self.errors,
+                "queue_depth": self.queue.qsize(),
+                "throughput": self.processed / elapsed if elapsed else 0.0,  # 条目/秒
+                "utilization": self.busy_time / (elapsed * self.workers) if elapsed else 0.0,
+            }
+
+
+class CrawlPipeline:
+    """
+    生产者/消费者流水线：各阶段之间用有界队列连接，每个阶段的线程数独立配置，
+    上游在下游队列满时阻塞。例如 列表页 -> 详情页 -> 图片下载 -> 写库，
+    一个图集在下载时，后面的详情页已经在解析了。
+    """
+
+    def __init__(self, stats_interval: Optional[float] = None):
+        """
+        :param stats_interval: 运行中每隔多少秒打印一次各阶段统计，为 None 则只在结束时打印
+        """
+        self.stages: List[Stage] = []
+        self.stats_interval = stats_interval
+
+    def add_stage(self, name: str, handler: Callable, workers: int = 1, queue_size: int = 16) -> "CrawlPipeline":
+        """追加一个阶段，参数同 Stage"""
+        self.stages.append(Stage(name, handler, workers, queue_size))
+        return self
+
+    def run(self, source: Iterable) -> List[Dict]:
+        """
+        把 source 中的条目送入第一个阶段，阻塞直到所有阶段处理完毕
+        :return: 各阶段的统计
+        """
+        if not self.stages:
+            raise ValueError("流水线至少需要一个阶段")
+        threads = []
+        for index, stage in enumerate(self.stages):
+            downstream = self.stages[index + 1] if index + 1 < len(self.stages) else None
+            stage.started_at = time.monotonic()
+            stage._running = stage.workers
+            for i in range(stage.workers):
+                thread = threading.Thread(target=self._work, args=(stage, downstream),
+                                          name=f"{stage.name}-{i}", daemon=True)
+                thread.start()
+                threads.append(thread)
+
+        reporter_stop = threading.Event()
+        reporter = None
+        if self.stats_interval:
+            reporter = threading.Thread(target=self._report_loop, args=(reporter_stop,), daemon=True)
+            reporter.start()
+
+        first = self.stages[0]
+        try:
+            for item in source:
+                first.queue.put(item)
+        finally:
+            for _ in range(first.workers):
+                first.queue.put(_STOP)
+            for thread in threads:
+                thread.join()
+            reporter_stop.set()
+            if reporter is not None:
+                reporter.join()
+        print(self.format_stats())
+        return self.stats()
+
+    def _work(self, stage: Stage, downstream: Optional[Stage]) -> None:
+        # handler 抛出 Exception 以外的异常（如 SystemExit）时线程会退出，仍要计数并通知下游，否则 run() 一直等待
+        try:
+            while True:
+                item = stage.queue.get()
+                if item is _STOP:
+                    break
+                start = time.monotonic()
+                emitted = 0
+                try:
+                    outputs = stage.handler(item)
+                    if outputs is not None:
+                        for output in outputs:
+                            if downstream is not None:
+                                downstream.queue.put(output)  # 下游队列满时在这里阻塞
+                            emitted += 1
+                except Exception as e:
+                    with stage._lock:
+                        stage.errors += 1
+                    print(f"{Fore.RED}[{stage.name}] 处理失败: {str(e)[:120]}{Style.RESET_ALL}")
+                with stage._lock:
+                    stage.processed += 1
+                    stage.emitted += emitted
+                    stage.busy_time += time.monotonic() - start
+        finally:
+            with stage._lock:
+                stage._running -= 1
+                last = stage._running == 0
+                if last:
+                    stage.finished_at = time.monotonic()
+            # 本阶段最后一个线程退出时通知下游结束
+            if last and downstream is not None:
+                for _ in range(downstream.workers):
+                    downstream.queue.put(_STOP)
+
+    def _report_loop(self, stop: threading.Event) -> None:
+        while not stop.wait(self.stats_interval):
+            print(self.format_stats())
+
+    def stats(self) -> List[Dict]:
+        return [stage.stats() for stage in self.stages]
+
+    def format_stats(self) -> str:
+        lines = [f"{Fore.CYAN}流水线统计:{Style.RESET_ALL}"]
+        for s in self.stats():
+            lines.append(
+                f"  {s['name']:<10} 线程{s['workers']:>2}  处理{s['processed']:>5}  输出{s['emitted']:>5}  "
+                f"失败{s['errors']:>3}  队列{s['queue_depth']:>3}  {s['throughput']:.2f}/s  "
+                f"繁忙{s['utilization']:.0%}"
+            )
+        return "\n".join(lines)
+
+
+class InFlight:
+    """
+    已进入流水线、还没写库的键（标题或详情页链接）。写库是最后一个阶段，列表页变动时同一篇文章
+    可能出现在两页，两次都能通过数据库去重并同时下载到同一目录；详情页阶段先 claim 再查库，写库后 release
+    """
+
+    def __init__(self):
+        self._keys = set()
+        self._lock = threading.Lock()
+
+    def claim(self, key: str) -> bool:
+        """:return: False 表示已有同一个键在处理中"""
+        with self._lock:
+            if key in self._keys:
+                return False
+            self._keys.add(key)
+            return True
+
+    def release(self, key: str) -> None:
+        with self._lock:
+            self._keys.discard(key)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._keys)
+
+
+class PageWalker:
+    """
+    按顺序产生列表页页码，作为流水线的数据源；
+    列表页阶段发现整页都已下载过（或者已经没有内容）时调用 stop()，后续页码不再产生
+    """
+
+    def __init__(self, start: int, end: Optional[int] = None, until_seen: bool = False):
+        """
+        :param start: 起始页码
+        :param end: 结束页码（包含），为 None 时一直翻页直到 stop()
+        :param until_seen: 遇到整页都已下载过时是否停止
+        """
+        if end is None and not until_seen:
+            raise ValueError("未指定结束页时必须开启 until_seen")
+        self.start = start
+        self.end = end
+        self.until_seen = until_seen
+        self.stopped_at = None
+        self.stop_reason = None
+
+    def __iter__(self):
+        page = self.start
+        while (self.end is None or page <= self.end) and self.stopped_at is None:
+            yield page
+            page += 1
+
+    def stopped(self, page: int) -> bool:
+        """该页是否在停止点之后（已入队但不需要再处理）"""
+        return self.stopped_at is not None and page > self.stopped_at
+
+    def stop(self, page: int, reason: str) -> None:
+        if self.stopped_at is None or page < self.stopped_at:
+            self.stopped_at = page
+            self.stop_reason = reason
+            print(f"{Fore.GREEN}第{page}页{reason}，停止翻页{Style.RESET_ALL}")
+
+    def page_done(self, page: int, total: int, new: int) -> None:
+        """
+        列表页阶段处理完一页后调用
+        :param total: 本页条目数
+        :param new: 去重后需要处理的条目数
+        """
+        if total == 0:
+            self.stop(page, "没有内容")
+        elif new == 0 and self.until_seen:
+            self.stop(page, "全部已下载过")
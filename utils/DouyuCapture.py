@@ -0,0 +1,63 @@
+import os
+import struct
+import time
+from typing import Iterator, Optional, Tuple
+
+# 斗鱼弹幕原始帧的录制文件：文件头 MAGIC 之后是连续的记录，
+# 每条记录为 接收时间(float64，epoch 秒) + 房间号长度(uint16) + 帧长度(uint32) + 房间号 + 帧的原始字节
+MAGIC = b"DYCAP1\n"
+RECORD = struct.Struct('<dHI')
+
+
+class FrameRecorder:
+    """把收到的 websocket 二进制帧原样追加到录制文件，多个房间可以共用一个文件"""
+
+    def __init__(self, path, buffer_size=1 << 20):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, 'ab', buffering=buffer_size)
+        if new_file:
+            self._file.write(MAGIC)
+        self.frames = 0
+        self.bytes = 0
+
+    def write(self, data, room='') -> None:
+        room_bytes = str(room).encode('utf-8')
+        self._file.write(RECORD.pack(time.time(), len(room_bytes), len(data)) + room_bytes)
+        self._file.write(data)
+        self.frames += 1
+        self.bytes += len(data)
+
+    def flush(self) -> None:
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+    def format_stats(self) -> str:
+        return f"录制 {self.frames} 帧 {self.bytes / 1024 / 1024:.1f}MB -> {self.path}"
+
+
+def read_frames(path, room: Optional[str] = None) -> Iterator[Tuple[float, str, bytes]]:
+    """
+    按顺序读出录制的帧
+    :param room: 只读这个房间的帧（默认全部）
+    :return: (接收时间, 房间号, 帧) 的迭代器；文件结尾不完整的记录（录制时被中断）直接忽略
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"不是弹幕录制文件: {path}")
+        while True:
+            header = f.read(RECORD.size)
+            if len(header) < RECORD.size:
+                return
+            received, room_len, data_len = RECORD.unpack(header)
+            frame_room = f.read(room_len).decode('utf-8', 'replace')
+            data = f.read(data_len)
+            if len(data) < data_len:
+                return
+            if room is None or frame_room == room:
+                yield received, frame_room, data
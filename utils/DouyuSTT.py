@@ -0,0 +1,122 @@
+from typing import Dict, List, Optional, Union
+
+# 斗鱼 STT 序列化格式：
+#   对象  key1@=value1/key2@=value2/
+#   列表  item1/item2/
+#   键和值中的 "@" 写作 "@A"，"/" 写作 "@S"；嵌套的对象/列表先序列化再整体转义一次作为值
+
+
+def escape(text: str) -> str:
+    if '@' in text:
+        text = text.replace('@', '@A')
+    if '/' in text:
+        text = text.replace('/', '@S')
+    return text
+
+
+def unescape(text: str) -> str:
+    if '@' not in text:
+        return text
+    # 转义后的文本里 "@" 只会出现在转义序列开头，先还原 @S 再还原 @A 不会误伤
+    return text.replace('@S', '/').replace('@A', '@')
+
+
+def dumps(value) -> str:
+    """序列化为 STT 字符串：dict 为对象，list/tuple 为列表，其他值转为字符串"""
+    if isinstance(value, dict):
+        return ''.join(f"{escape(str(key))}@={_dump_value(item)}/" for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return ''.join(f"{_dump_value(item)}/" for item in value)
+    return escape(str(value))
+
+
+def _dump_value(value) -> str:
+    if isinstance(value, (dict, list, tuple)):
+        return escape(dumps(value))
+    return escape(str(value))
+
+
+def loads(text: str) -> Union[Dict[str, str], List[str], str]:
+    """
+    反序列化一层：含 "@=" 的为对象，含 "/" 的为列表，否则为字符串；
+    嵌套的值保持为（已去掉一层转义的）STT 字符串，需要时再对它调用 loads
+    """
+    if '@=' in text:
+        return _load_object(text)
+    if '/' in text:
+        return [unescape(item) for item in text.split('/') if item]
+    return unescape(text)
+
+
+def _load_object(text: str) -> Dict[str, str]:
+    result = {}
+    for pair in text.split('/'):
+        key, sep, value = pair.partition('@=')
+        if sep:
+            result[unescape(key)] = unescape(value)
+    return result
+
+
+class STTMessage:
+    """
+    延迟解析的 STT 消息：读取 type 等单个字段时只在原始字符串里查找，不解析整条消息；
+    第一次按键访问其他字段时才完整解析一层并缓存
+    """
+
+    __slots__ = ('raw', '_fields', 'received')
+
+    def __init__(self, raw: str, received: Optional[float] = None):
+        """:param received: 收到这条消息的时间（epoch 秒），由接收循环记录"""
+        self.raw = raw
+        self._fields = None
+        self.received = received
+
+    def __repr__(self):
+        return f"STTMessage({self.raw[:80]!r})"
+
+    def scan(self, key: str) -> Optional[str]:
+        """不解析整条消息，直接查找顶层字段的值"""
+        if self._fields is not None:
+            return self._fields.get(key)
+        raw = self.raw
+        prefix = key + '@='
+        if raw.startswith(prefix):
+            start = len(prefix)
+        else:
+            # 嵌套内容里的 "/" 都已转义，"/key@=" 只会匹配到顶层字段
+            index = raw.find('/' + prefix)
+            if index < 0:
+                return None
+            start = index + 1 + len(prefix)
+        end = raw.find('/', start)
+        return unescape(raw[start:] if end < 0 else raw[start:end])
+
+    @property
+    def type(self) -> str:
+        return self.scan('type') or ''
+
+    def to_dict(self) -> Dict[str, str]:
+        if self._fields is None:
+            self._fields = _load_object(self.raw)
+        return self._fields
+
+    def __getitem__(self, key):
+        return self.to_dict()[key]
+
+    def __contains__(self, key):
+        return key in self.to_dict()
+
+    def get(self, key, default=None):
+        return self.to_dict().get(key, default)
+
+    def get_list(self, key) -> List[str]:
+        """把嵌套的列表字段解析出来（字段不存在时为空列表）"""
+        value = self.get(key)
+        if not value:
+            return []
+        return [unescape(item) for item in value.split('/') if item]
+
+    def get_object(self, key) -> Dict[str, str]:
+        """把嵌套的对象字段解析出来（字段不存在时为空字典）"""
+        value = self.get(key)
+        return _load_object(value) if value else {}
@@ -1,43 +1,239 @@
-import pymysql
-from pymysql.cursors import DictCursor
-from typing import List, Dict, Optional
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, List, Dict, Optional
+
+try:
+    import pymysql
+    from pymysql.cursors import DictCursor
+except ImportError:  # 只使用 SQLite 后端时可以不安装 pymysql
+    pymysql = None
+
+
+class ConnectionPool:
+    """线程安全的数据库连接池：空闲连接复用，超过检查间隔的空闲连接取出前先做健康检查"""
+
+    def __init__(
+            self,
+            factory: Callable[[], Any],
+            size: int = 4,
+            ping: Optional[Callable[[Any], None]] = None,
+            health_check_interval: float = 30
+    ):
+        """
+        :param factory: 新建连接的函数
+        :param size: 最大连接数（同时借出的连接不超过该值，多余的调用方阻塞等待）
+        :param ping: 健康检查函数，连接不可用时抛出异常
+        :param health_check_interval: 空闲超过该秒数的连接在取出时做一次健康检查（0 表示每次都检查）
+        """
+        if size < 1:
+            raise ValueError("连接池大小至少为1")
+        self._factory = factory
+        self._ping = ping
+        self.health_check_interval = health_check_interval
+        self._idle = queue.LifoQueue()  # 元素为 (连接, 归还时间)
+        self._slots = threading.BoundedSemaphore(size)
+        self._closed = False
+
+    def acquire(self, timeout: Optional[float] = None):
+        """借出一个连接，必须配对调用 release"""
+        if self._closed:
+            raise ConnectionError("连接池已关闭")
+        if not self._slots.acquire(timeout=timeout):
+            raise ConnectionError("等待数据库连接超时")
+        try:
+            while True:
+                try:
+                    conn, released_at = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._factory()
+                if self._ping is None or time.monotonic() - released_at < self.health_check_interval:
+                    return conn
+                try:
+                    self._ping(conn)
+                    return conn
+                except Exception:
+                    _close_quietly(conn)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, conn, broken: bool = False) -> None:
+        """归还连接，broken=True 表示连接已损坏，直接关闭不再复用"""
+        try:
+            if broken or self._closed:
+                _close_quietly(conn)
+            else:
+                self._idle.put((conn, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    def close(self) -> None:
+        """关闭所有空闲连接，之后归还的连接也会被直接关闭"""
+        self._closed = True
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            _close_quietly(conn)
+
+
+def _close_quietly(conn) -> None:
+    try:
+        conn.close()
+    except Exception:
+        pass
 
 
 class DownloadFileDB:
-    def __init__(self):
-        """初始化数据库连接参数"""
-        self.host = "localhost"
-        self.port = 3306
-        self.user = "root"
-        self.password = "1m_0833n"
-        self.db_name = "python_data"
-        self.conn = None  # 数据库连接对象
-        self.cursor = None  # 游标对象
-
-    def _connect(self) -> None:
+    # 这些异常说明连接本身已不可用，丢弃连接后重试一次
+    _connection_errors = (pymysql.err.OperationalError, pymysql.err.InterfaceError) if pymysql else ()
+    # 连接为自动提交：单条读写各一次往返，不需要 COMMIT，读操作也不会停在旧的事务快照上
+    _autocommit = True
+
+    def __init__(
+            self,
+            pool_size: int = 0,
+            health_check_interval: float = 30,
+            bulk_batch_size: int = 500,
+            host: str = "localhost",
+            port: int = 3306,
+            user: str = "root",
+            password: str = "1m_0833n",
+            db_name: str = "python_data"
+    ):
+        """
+        初始化数据库连接参数（MySQL 后端）
+        :param pool_size: 连接池大小，为0时每次操作单独建立并关闭连接（旧行为）；
+                          大于0时复用池中的连接，可在多个下载线程间共享同一个实例
+        :param health_check_interval: 池中连接空闲超过该秒数后，取出时先 ping 一次
+        :param bulk_batch_size: 批量查询时每条 IN (...) 语句最多包含的值个数
+        :param host/port/user/password/db_name: MySQL 连接参数
+        """
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.db_name = db_name
+        self.bulk_batch_size = bulk_batch_size
+        self.pool = None
+        if pool_size > 0:
+            self.pool = ConnectionPool(self._connect, pool_size, self._ping, health_check_interval)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self) -> None:
+        """关闭连接池中的所有连接"""
+        if self.pool is not None:
+            self.pool.close()
+
+    @staticmethod
+    def match_key(value: str) -> str:
+        """
+        与数据库比较规则一致的比较键：utf8mb4 的 *_ci 排序规则不区分大小写，并忽略末尾空格（PAD SPACE），
+        本地去重缓存用它判断两个值在数据库里是否相等
+        """
+        return value.rstrip(' ').lower()
+
+    def _connect(self):
         """建立数据库连接（私有方法，内部调用）"""
+        if pymysql is None:
+            raise ConnectionError("数据库连接失败：未安装 pymysql")
         try:
-            self.conn = pymysql.connect(
+            return pymysql.connect(
                 host=self.host,
                 port=self.port,
                 user=self.user,
                 password=self.password,
                 database=self.db_name,
                 charset="utf8mb4",
+                autocommit=self._autocommit,
                 cursorclass=DictCursor  # 游标返回字典格式（键为字段名）
             )
-            self.cursor = self.conn.cursor()
         except Exception as e:
             raise ConnectionError(f"数据库连接失败：{str(e)}")
 
-    def _close(self) -> None:
-        """关闭数据库连接（私有方法，内部调用）"""
-        if self.cursor:
-            self.cursor.close()
-        if self.conn:
-            self.conn.close()
-        self.cursor = None
-        self.conn = None
+    @staticmethod
+    def _ping(conn) -> None:
+        """健康检查，连接不可用时抛出异常"""
+        conn.ping(reconnect=False)
+
+    @staticmethod
+    def _unsent(error) -> bool:
+        """连接错误是否发生在 SQL 发到服务器之前（pymysql 写 socket 失败为 2006，连接已关闭为 InterfaceError）"""
+        return isinstance(error, pymysql.err.InterfaceError) or (bool(error.args) and error.args[0] == 2006)
+
+    def _acquire(self):
+        if self.pool is None:
+            return self._connect()
+        return self.pool.acquire()
+
+    def _release(self, conn, broken: bool = False) -> None:
+        if self.pool is None:
+            _close_quietly(conn)
+        else:
+            self.pool.release(conn, broken)
+
+    def _execute(self, sql: str, params=None, result: str = "none", write: bool = False, many: bool = False):
+        """
+        借一个连接执行一条 SQL（私有方法，内部调用）
+        :param result: 返回内容，"one"/"all" 返回查询结果，"lastrowid" 返回自增id，"rowcount" 返回受影响行数
+        :param write: 是否为写操作（失败回滚）
+        :param many: 是否使用 executemany 批量执行（写操作在一个事务里整体提交）
+        """
+        # 自动提交的连接上单条写入不需要 COMMIT；批量写入可能拆成多条语句，显式开事务保证整体成功或回滚
+        transaction = write and (many or not self._autocommit)
+        for attempt in range(2):
+            conn = self._acquire()
+            broken = False
+            sent = False  # SQL 是否已经发给服务器
+            try:
+                cursor = conn.cursor()
+                try:
+                    sent = True
+                    if transaction and self._autocommit:
+                        conn.begin()
+                    if many:
+                        cursor.executemany(sql, params)
+                    else:
+                        cursor.execute(sql, params)
+                    if transaction:
+                        conn.commit()  # 提交事务
+                    if result == "one":
+                        value = cursor.fetchone()
+                    elif result == "all":
+                        value = cursor.fetchall()
+                    elif result == "lastrowid":
+                        value = cursor.lastrowid
+                    elif result == "rowcount":
+                        value = cursor.rowcount
+                    else:
+                        value = None
+                finally:
+                    cursor.close()
+                return value
+            except self._connection_errors as e:
+                # 连接断开（如服务端超时断开），换一个新连接重试一次；
+                # 写操作已经发到服务器后断开时无法确定是否已提交，重试可能重复插入，直接抛出
+                broken = True
+                if attempt == 1 or (write and sent and not self._unsent(e)):
+                    raise
+            except Exception:
+                if transaction:
+                    try:
+                        conn.rollback()  # 出错回滚
+                    except Exception:
+                        broken = True
+                raise
+            finally:
+                self._release(conn, broken)
 
     def insert(self, title: str, year: Optional[int]) -> int:
         """
@@ -51,15 +247,9 @@ class DownloadFileDB:
 
         sql = "INSERT INTO download_file (title, year) VALUES (%s, %s)"
         try:
-            self._connect()
-            self.cursor.execute(sql, (title, year))
-            self.conn.commit()  # 提交事务
-            return self.cursor.lastrowid  # 返回自增id
+            return self._execute(sql, (title, year), result="lastrowid", write=True)  # 返回自增id
         except Exception as e:
-            self.conn.rollback()  # 出错回滚
             raise RuntimeError(f"新增记录失败：{str(e)}")
-        finally:
-            self._close()
 
     def get_by_id(self, id: int) -> Optional[Dict]:
         """
@@ -69,13 +259,9 @@ class DownloadFileDB:
         """
         sql = "SELECT id, title, year FROM download_file WHERE id = %s"
         try:
-            self._connect()
-            self.cursor.execute(sql, (id,))
-            return self.cursor.fetchone()  # 返回单条结果（字典）
+            return self._execute(sql, (id,), result="one")  # 返回单条结果（字典）
         except Exception as e:
             raise RuntimeError(f"查询记录失败：{str(e)}")
-        finally:
-            self._close()
 
     def get_all(self, limit: int = 100, offset: int = 0) -> List[Dict]:
         """
@@ -86,13 +272,9 @@ class DownloadFileDB:
         """
         sql = "SELECT id, title, year FROM download_file LIMIT %s OFFSET %s"
         try:
-            self._connect()
-            self.cursor.execute(sql, (limit, offset))
-            return self.cursor.fetchall()  # 返回所有结果（列表）
+            return self._execute(sql, (limit, offset), result="all")  # 返回所有结果（列表）
         except Exception as e:
             raise RuntimeError(f"查询所有记录失败：{str(e)}")
-        finally:
-            self._close()
 
     def update(self, id: int, title: Optional[str] = None, year: Optional[int] = None) -> bool:
         """
@@ -120,15 +302,10 @@ class DownloadFileDB:
 
         sql = f"UPDATE download_file SET {', '.join(update_fields)} WHERE id = %s"
         try:
-            self._connect()
-            affected_rows = self.cursor.execute(sql, params)
-            self.conn.commit()
+            affected_rows = self._execute(sql, params, result="rowcount", write=True)
             return affected_rows > 0  # 受影响行数>0表示更新成功
         except Exception as e:
-            self.conn.rollback()
             raise RuntimeError(f"更新记录失败：{str(e)}")
-        finally:
-            self._close()
 
     def delete(self, id: int) -> bool:
         """
@@ -138,15 +315,10 @@ class DownloadFileDB:
         """
         sql = "DELETE FROM download_file WHERE id = %s"
         try:
-            self._connect()
-            affected_rows = self.cursor.execute(sql, (id,))
-            self.conn.commit()
+            affected_rows = self._execute(sql, (id,), result="rowcount", write=True)
             return affected_rows > 0  # 受影响行数>0表示删除成功
         except Exception as e:
-            self.conn.rollback()
             raise RuntimeError(f"删除记录失败：{str(e)}")
-        finally:
-            self._close()
 
     def get_by_title_custom(
             self,
@@ -179,13 +351,9 @@ class DownloadFileDB:
         # 拼接 SQL 语句
         sql = f"SELECT id, title FROM {table_name} WHERE {' AND '.join(conditions)}"
         try:
-            self._connect()
-            self.cursor.execute(sql, params)
-            return self.cursor.fetchall()  # 返回所有匹配的记录
+            return self._execute(sql, params, result="all")  # 返回所有匹配的记录
         except Exception as e:
             raise RuntimeError(f"查询失败：{str(e)}")
-        finally:
-            self._close()
 
     def get_by_url_custom(
             self,
@@ -211,13 +379,9 @@ class DownloadFileDB:
         # 拼接 SQL 语句
         sql = f"SELECT id, title,url FROM {table_name} WHERE {' AND '.join(conditions)}"
         try:
-            self._connect()
-            self.cursor.execute(sql, params)
-            return self.cursor.fetchall()  # 返回所有匹配的记录
+            return self._execute(sql, params, result="all")  # 返回所有匹配的记录
         except Exception as e:
             raise RuntimeError(f"查询失败：{str(e)}")
-        finally:
-            self._close()        
 
     def insert_custom(self, title: str, table_name:str) -> int:
         """
@@ -231,15 +395,9 @@ class DownloadFileDB:
 
         sql = f"INSERT INTO {table_name} (title) VALUES (%s)"
         try:
-            self._connect()
-            self.cursor.execute(sql, (title,))
-            self.conn.commit()  # 提交事务
-            return self.cursor.lastrowid  # 返回自增id
+            return self._execute(sql, (title,), result="lastrowid", write=True)  # 返回自增id
         except Exception as e:
-            self.conn.rollback()  # 出错回滚
             raise RuntimeError(f"新增记录失败：{str(e)}")
-        finally:
-            self._close()
 
     def insert_url_custom(self, title: str, url: str, table_name:str) -> int:
         if not title or len(title) > 255:
@@ -247,12 +405,206 @@ class DownloadFileDB:
 
         sql = f"INSERT INTO {table_name} (title, url) VALUES (%s, %s)"
         try:
-            self._connect()
-            self.cursor.execute(sql, (title, url))
-            self.conn.commit()  # 提交事务
-            return self.cursor.lastrowid  # 返回自增id
+            return self._execute(sql, (title, url), result="lastrowid", write=True)  # 返回自增id
         except Exception as e:
-            self.conn.rollback()  # 出错回滚
             raise RuntimeError(f"新增记录失败：{str(e)}")
-        finally:
-            self._close()
+
+    def get_column_values(self, table_name: str, column: str) -> List[str]:
+        """
+        查询表中某一列的全部非空值（用于预热本地去重缓存）
+        :param table_name: 表名
+        :param column: 列名（title 或 url）
+        :return: 值列表
+        """
+        sql = f"SELECT {column} FROM {table_name} WHERE {column} IS NOT NULL"
+        try:
+            rows = self._execute(sql, result="all")
+        except Exception as e:
+            raise RuntimeError(f"查询失败：{str(e)}")
+        return [row[column] for row in rows]
+
+    def _get_existing_values(self, table_name: str, column: str, values: List[str]) -> set:
+        """
+        查询 values 中哪些在表的 column 列里已存在，按批拼接 IN (...)，每批一次查询；
+        返回 values 中的原值，而不是库里存的写法（两者可能只差大小写或末尾空格）
+        """
+        values = list(dict.fromkeys(v for v in values if v is not None))  # 去重并保持顺序
+        by_key = {}
+        for value in values:
+            by_key.setdefault(self.match_key(value), []).append(value)
+        existing = set()
+        for start in range(0, len(values), self.bulk_batch_size):
+            batch = values[start:start + self.bulk_batch_size]
+            placeholders = ", ".join(["%s"] * len(batch))
+            sql = f"SELECT {column} FROM {table_name} WHERE {column} IN ({placeholders})"
+            try:
+                rows = self._execute(sql, batch, result="all")
+            except Exception as e:
+                raise RuntimeError(f"批量查询失败：{str(e)}")
+            for row in rows:
+                existing.update(by_key.get(self.match_key(row[column]), ()))
+        return existing
+
+    def get_existing_titles(self, table_name: str, titles: List[str]) -> set:
+        """
+        批量查询已存在的标题
+        :param table_name: 表名
+        :param titles: 待检查的标题列表
+        :return: 其中已存在于表中的标题集合
+        """
+        return self._get_existing_values(table_name, "title", titles)
+
+    def get_existing_urls(self, table_name: str, urls: List[str]) -> set:
+        """
+        批量查询已存在的url
+        :param table_name: 表名
+        :param urls: 待检查的url列表
+        :return: 其中已存在于表中的url集合
+        """
+        return self._get_existing_values(table_name, "url", urls)
+
+    def insert_many_custom(self, titles: List[str], table_name: str) -> int:
+        """
+        批量新增记录（executemany，一次提交）
+        :param titles: 标题列表（每个非空，最长255字符）
+        :return: 新增的行数
+        """
+        if not titles:
+            return 0
+        for title in titles:
+            if not title or len(title) > 255:
+                raise ValueError("标题不能为空且长度不能超过255字符")
+
+        sql = f"INSERT INTO {table_name} (title) VALUES (%s)"
+        try:
+            return self._execute(sql, [(title,) for title in titles], result="rowcount", write=True, many=True)
+        except Exception as e:
+            raise RuntimeError(f"批量新增记录失败：{str(e)}")
+
+    def insert_many_url_custom(self, rows: List[tuple], table_name: str) -> int:
+        """
+        批量新增带url的记录（executemany，一次提交）
+        :param rows: (title, url) 元组列表
+        :return: 新增的行数
+        """
+        if not rows:
+            return 0
+        for title, _ in rows:
+            if not title or len(title) > 255:
+                raise ValueError("标题不能为空且长度不能超过255字符")
+
+        sql = f"INSERT INTO {table_name} (title, url) VALUES (%s, %s)"
+        try:
+            return self._execute(sql, [(title, url) for title, url in rows], result="rowcount", write=True, many=True)
+        except Exception as e:
+            raise RuntimeError(f"批量新增记录失败：{str(e)}")
+
+
+class SQLiteDownloadFileDB(DownloadFileDB):
+    """
+    嵌入式 SQLite 后端，方法与 DownloadFileDB 完全一致，不需要 MySQL 服务。
+    使用 WAL 模式，表在第一次用到时自动创建（title、url 建索引）。
+    """
+    _connection_errors = (sqlite3.InterfaceError,)
+    # sqlite3 的写语句隐式开启事务，由 _execute 提交；SELECT 不开事务，每次都读到最新数据
+    _autocommit = False
+
+    @staticmethod
+    def _unsent(error) -> bool:
+        return False
+
+    @staticmethod
+    def match_key(value: str) -> str:
+        """SQLite 的 = 和 IN 按字节比较"""
+        return value
+
+    def __init__(
+            self,
+            path: str = "./downloadFile/download.sqlite3",
+            pool_size: int = 4,
+            health_check_interval: float = 30,
+            bulk_batch_size: int = 500
+    ):
+        """
+        :param path: 数据库文件路径（":memory:" 仅适合单连接，pool_size 需为1）
+        :param pool_size: 连接池大小
+        :param health_check_interval: 池中连接空闲超过该秒数后，取出时先检查一次
+        :param bulk_batch_size: 批量查询时每条 IN (...) 语句最多包含的值个数（SQLite 默认上限 999 个参数）
+        """
+        self.path = path
+        self._created_tables = set()
+        self._create_lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        if path != ":memory:" and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        super().__init__(pool_size=pool_size, health_check_interval=health_check_interval,
+                         bulk_batch_size=bulk_batch_size)
+
+    def _connect(self):
+        try:
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.row_factory = _dict_row  # 与 DictCursor 一样返回字典
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            return conn
+        except Exception as e:
+            raise ConnectionError(f"数据库连接失败：{str(e)}")
+
+    @staticmethod
+    def _ping(conn) -> None:
+        conn.execute("SELECT 1")
+
+    def _create_table(self, table_name: str) -> None:
+        """建表及 title/url 索引，所有表共用一个结构（download_file 用 year，其它表用 url）"""
+        with self._create_lock:
+            if table_name in self._created_tables:
+                return
+            conn = self._connect()
+            try:
+                conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {table_name} ("
+                    "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                    "title VARCHAR(255) NOT NULL, "
+                    "url TEXT, "
+                    "year INTEGER, "
+                    "created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+                )
+                conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table_name}_title ON {table_name} (title)")
+                conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table_name}_url ON {table_name} (url)")
+                conn.commit()
+            finally:
+                conn.close()
+            self._created_tables.add(table_name)
+
+    def _execute(self, sql: str, params=None, result: str = "none", write: bool = False, many: bool = False):
+        sql = sql.replace("%s", "?")  # pymysql 占位符换成 sqlite3 占位符
+        if params is None:
+            params = ()
+        try:
+            return super()._execute(sql, params, result, write, many)
+        except sqlite3.OperationalError as e:
+            message = str(e)
+            if not message.startswith("no such table: "):
+                raise
+            self._create_table(message[len("no such table: "):].strip())
+            return super()._execute(sql, params, result, write, many)
+
+
+def _dict_row(cursor, row) -> Dict:
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+def create_db(backend: Optional[str] = None, **kwargs) -> DownloadFileDB:
+    """
+    按后端名称创建数据库对象
+    :param backend: "mysql" 或 "sqlite"，为 None 时读取环境变量 DOWNLOAD_DB_BACKEND（默认 mysql）
+    :param kwargs: 传给对应后端的构造参数；sqlite 后端未指定 path 时读取环境变量 DOWNLOAD_DB_PATH
+    """
+    backend = (backend or os.environ.get("DOWNLOAD_DB_BACKEND", "mysql")).lower()
+    if backend == "mysql":
+        return DownloadFileDB(**kwargs)
+    if backend == "sqlite":
+        if "path" not in kwargs and os.environ.get("DOWNLOAD_DB_PATH"):
+            kwargs["path"] = os.environ["DOWNLOAD_DB_PATH"]
+        return SQLiteDownloadFileDB(**kwargs)
+    raise ValueError(f"不支持的数据库后端：{backend}")
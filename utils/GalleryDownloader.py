@@ -0,0 +1,99 @@
+import os
+import threading
+from colorama import Fore, Style
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from ImageDownloader import format_size, get_shared_downloader, save_path_for
+
+DEFAULT_MAX_WORKERS = 8  # 整个图集的最大并发下载数
+DEFAULT_PER_HOST_LIMIT = 4  # 同一主机的最大并发下载数
+
+
+class HostLimiter:
+    """按主机限制并发数，每个主机一个信号量"""
+
+    def __init__(self, per_host_limit=DEFAULT_PER_HOST_LIMIT):
+        self.per_host_limit = per_host_limit
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    def semaphore(self, url) -> threading.BoundedSemaphore:
+        host = urlsplit(url).netloc
+        with self._lock:
+            sem = self._semaphores.get(host)
+            if sem is None:
+                sem = threading.BoundedSemaphore(self.per_host_limit)
+                self._semaphores[host] = sem
+            return sem
+
+
+def save_path_groups(url_list, save_dir):
+    """
+    按保存路径分组：重复的 url、不同路径下的同名文件会写同一个 .part，不能同时下载
+    :return: [[(序号, url), ...], ...]，组内和组间都保持 url_list 中的顺序
+    """
+    groups = {}
+    for index, url in enumerate(url_list):
+        groups.setdefault(save_path_for(url, save_dir), []).append((index, url))
+    return list(groups.values())
+
+
+def download_gallery(url_list, save_dir, headers=None, downloader=None,
+                     max_workers=DEFAULT_MAX_WORKERS, per_host_limit=DEFAULT_PER_HOST_LIMIT, on_result=None):
+    """
+    并发下载一个图集
+    :param url_list: 图片地址列表
+    :param save_dir: 保存目录
+    :param headers: 请求头
+    :param downloader: ImageDownloader 实例（为 None 则使用进程内共享的下载器）；
+                       带 fetch_gallery 方法的下载器（如 BlockingFetcher）整个图集交给它自己并发下载
+    :param max_workers: 最大并发数
+    :param per_host_limit: 同一主机的最大并发数
+    :param on_result: 每张图片下载完成后的回调，参数为结果字典（在工作线程中调用）
+    :return: 与 url_list 顺序一致的结果列表，每个元素为 ImageDownloader.fetch 的结果字典并附加 index；
+             保存路径相同的图片依次下载，重复的 url 只下载一次
+    """
+    if downloader is None:
+        downloader = get_shared_downloader()
+    if not url_list:
+        return []
+    if hasattr(downloader, "fetch_gallery"):
+        return downloader.fetch_gallery(url_list, save_dir, headers, on_result)
+    limiter = HostLimiter(per_host_limit)
+
+    def task(group):
+        results = []
+        fetched = {}
+        for index, url in group:
+            if url not in fetched:
+                with limiter.semaphore(url):
+                    fetched[url] = downloader.fetch(url, save_dir, headers)
+            result = dict(fetched[url], index=index)
+            if on_result is not None:
+                on_result(result)
+            results.append(result)
+        return results
+
+    groups = save_path_groups(url_list, save_dir)
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(groups))) as executor:
+        futures = [executor.submit(task, group) for group in groups]
+        results = [result for future in futures for result in future.result()]
+    return sorted(results, key=lambda result: result["index"])
+
+
+def failed_results(results):
+    """筛选出下载失败的结果"""
+    return [result for result in results if result["size"] is None]
+
+
+def print_result(result):
+    """打印单张图片的下载结果，可直接作为 download_gallery 的 on_result 回调"""
+    if result["size"] is None:
+        print(f"{Fore.RED}下载失败: {result['url']} {result['error']}{Style.RESET_ALL}")
+    elif result.get("linked"):
+        print(f"{Fore.GREEN}内容重复，已链接: {result['url']} -> {result['path']}{Style.RESET_ALL}")
+    elif result.get("skipped"):
+        print(f"{Fore.GREEN}已存在，跳过: {result['url']} {format_size(result['size'])}{Style.RESET_ALL}")
+    else:
+        print(result["url"], format_size(result["size"]), f"{result['elapsed']:.2f}s")
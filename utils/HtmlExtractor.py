@@ -0,0 +1,41 @@
+import threading
+from lxml import etree
+from typing import Optional
+
+DEFAULT_FEED_SIZE = 16 * 1024  # 部分解析时每次喂给解析器的字符数
+
+
+class HtmlExtractor:
+    """
+    网站页面提取器的基类：XPath 在子类的类属性里用 etree.XPath 预编译，
+    解析器按线程复用（lxml 的解析器不能跨线程共用，流水线的每个工作线程各用一个）
+    """
+
+    def __init__(self, encoding: Optional[str] = "utf-8"):
+        self.encoding = encoding
+        self._local = threading.local()
+
+    def _parser(self) -> etree.HTMLParser:
+        parser = getattr(self._local, "parser", None)
+        if parser is None:
+            parser = etree.HTMLParser(encoding=self.encoding)
+            self._local.parser = parser
+        return parser
+
+    def parse(self, text):
+        """完整解析页面，返回根节点"""
+        return etree.HTML(text, parser=self._parser())
+
+    def parse_partial(self, text, stop_tag: str, stop_class: Optional[str] = None, feed_size=DEFAULT_FEED_SIZE):
+        """
+        增量解析页面，stop_tag（且 class 为 stop_class）的元素闭合后就停止，
+        只需要页面前半部分的内容时省掉后面侧边栏、页脚、脚本的解析
+        :return: 已解析部分的根节点（未找到停止元素时为整页）
+        """
+        parser = etree.HTMLPullParser(events=("end",), tag=stop_tag)
+        for start in range(0, len(text), feed_size):
+            parser.feed(text[start:start + feed_size])
+            for _, element in parser.read_events():
+                if stop_class is None or element.get("class") == stop_class:
+                    return parser.close()
+        return parser.close()
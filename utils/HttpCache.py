@@ -0,0 +1,153 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+from typing import Dict, Optional
+
+DEFAULT_CACHE_DIR = "./downloadFile/.http_cache"
+DEFAULT_TTL = 24 * 3600  # 缓存多久内直接使用，不访问网络（秒）
+DEFAULT_MAX_AGE = 30 * 24 * 3600  # 超过这个时间的缓存在清理时删除（秒）
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024  # 缓存目录的最大体积（压缩后）
+CACHE_SUFFIX = ".cache"
+
+
+class HttpCache:
+    """
+    页面的磁盘缓存：以 url 的哈希为文件名，第一行是 JSON 元数据（url、ETag、Last-Modified），
+    后面是 zlib 压缩的正文，文件修改时间即缓存时间。
+    ttl 内直接返回缓存；过期后带 If-None-Match/If-Modified-Since 请求，304 时继续用缓存
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, ttl=DEFAULT_TTL, max_age=DEFAULT_MAX_AGE,
+                 max_bytes=DEFAULT_MAX_BYTES):
+        """
+        :param cache_dir: 缓存目录
+        :param ttl: 缓存多少秒内不访问网络
+        :param max_age: 超过多少秒的缓存在清理时删除
+        :param max_bytes: 缓存目录超过这个体积时从最旧的开始删除
+        """
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir, exist_ok=True)
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.hits = 0  # ttl 内直接使用缓存
+        self.revalidated = 0  # 条件请求返回 304
+        self.stores = 0  # 写入（新增或内容有变化）
+        self._lock = threading.Lock()
+        self._total_bytes = None
+
+    def _path(self, url) -> str:
+        return os.path.join(self.cache_dir, hashlib.sha1(url.encode("utf-8")).hexdigest() + CACHE_SUFFIX)
+
+    def lookup(self, url) -> Optional[Dict]:
+        """
+        读取缓存
+        :return: {"url", "text", "etag", "last_modified", "age"}，没有缓存或文件损坏时返回 None
+        """
+        path = self._path(url)
+        try:
+            with open(path, "rb") as f:
+                meta = json.loads(f.readline())
+                text = zlib.decompress(f.read()).decode("utf-8")
+            age = time.time() - os.path.getmtime(path)
+        except (OSError, ValueError, zlib.error):
+            return None
+        if meta.get("url") != url:
+            return None
+        return dict(meta, text=text, age=age)
+
+    def fresh_text(self, url, ttl=None) -> Optional[str]:
+        """缓存在 ttl（默认 self.ttl）内时返回正文，否则返回 None"""
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return None
+        entry = self.lookup(url)
+        if entry is None or entry["age"] > ttl:
+            return None
+        with self._lock:
+            self.hits += 1
+        return entry["text"]
+
+    @staticmethod
+    def validators(entry) -> Dict[str, str]:
+        """条件请求头"""
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def store(self, url, text, response_headers=None) -> None:
+        """写入缓存（先写临时文件再替换，并发写同一 url 时以后写的为准）"""
+        response_headers = response_headers or {}
+        meta = {"url": url, "etag": response_headers.get("ETag"),
+                "last_modified": response_headers.get("Last-Modified")}
+        data = json.dumps(meta, ensure_ascii=False).encode("utf-8") + b"\n" + zlib.compress(text.encode("utf-8"))
+        path = self._path(url)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            old_size = os.path.getsize(path)
+        except OSError:
+            old_size = 0
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.stores += 1
+            if self._total_bytes is not None:
+                self._total_bytes += len(data) - old_size
+            over = self._total_bytes is None or self._total_bytes > self.max_bytes
+        if over:
+            self.evict()
+
+    def refresh(self, url) -> None:
+        """服务器返回 304，缓存仍然有效，重新计时"""
+        try:
+            os.utime(self._path(url))
+        except OSError:
+            pass
+        with self._lock:
+            self.revalidated += 1
+
+    def evict(self) -> int:
+        """
+        删除超过 max_age 的缓存，体积仍超过 max_bytes 时从最旧的开始删到 max_bytes 的 90%
+        :return: 删除的文件数
+        """
+        now = time.time()
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(CACHE_SUFFIX):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for mtime, size, path in entries:
+            if now - mtime <= self.max_age and total <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        with self._lock:
+            self._total_bytes = total
+        return removed
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"hits": self.hits, "revalidated": self.revalidated, "stores": self.stores}
+
+    def format_stats(self) -> str:
+        s = self.stats()
+        return f"缓存命中{s['hits']} 304复用{s['revalidated']} 写入{s['stores']}"
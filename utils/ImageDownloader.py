@@ -1,68 +1,432 @@
+import hashlib
+import json
 import os
+import threading
+import time
 import requests
 import urllib3
 from colorama import Fore, Style
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
+from RateLimiter import THROTTLE_STATUS
+
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-def create_session():
+DEFAULT_POOL_CONNECTIONS = 10  # 缓存的主机连接池个数（每个host一个池）
+DEFAULT_POOL_MAXSIZE = 16  # 单个主机连接池内保持的最大连接数
+DEFAULT_TIMEOUT = (30, 60)
+RETRY_STATUS = (500, 502, 503, 504)  # 连接池内部自动重试的状态码
+DEFAULT_CHUNK_SIZE = 64 * 1024  # 流式下载每次写入磁盘的块大小
+PART_SUFFIX = '.part'  # 下载中的临时文件后缀
+
+
+def create_session(pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=DEFAULT_POOL_MAXSIZE, keep_alive=True,
+                   retry_status=RETRY_STATUS):
+    """:param retry_status: 连接池内部自动重试的状态码"""
     session = requests.Session()
-    retry = Retry(total=3, backoff_factor=1, status_forcelist=[500, 502, 503, 504])
-    adapter = HTTPAdapter(max_retries=retry)
+    retry = Retry(total=3, backoff_factor=1, status_forcelist=list(retry_status))
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=pool_connections, pool_maxsize=pool_maxsize)
     session.mount('http://', adapter)
     session.mount('https://', adapter)
+    session.headers['Connection'] = 'keep-alive' if keep_alive else 'close'
     return session
 
-def download_image(img_url, save_dir,HEADERS):
-    if not os.path.exists(save_dir):
-        os.makedirs(save_dir)
 
-    session = create_session()
+class ImageDownloader:
+    """
+    长生命周期的图片下载器：持有一个 Session，按主机复用连接池，
+    可以跨图片、跨图集共享，用完后调用 close() 释放连接
+    """
 
-    try:
-        response = session.get(
-            url=img_url,
-            headers=HEADERS,
-            timeout=(30, 60),
-            verify=False
-        )
-
-        if response.status_code != 200:
-            print(f"请求失败，状态码: {response.status_code}")
-            return "失败"
-        img_name = os.path.basename(img_url)
-        save_path = os.path.join(save_dir, img_name)
-
-        with open(save_path, 'wb') as f:
-            f.write(response.content)
-        fileSize = f"{len(response.content) / 1024:.2f}KB"
-        return fileSize
-
-    except requests.exceptions.SSLError as e:
-        print(f"{Fore.YELLOW}SSL错误，重试中: {str(e)[:50]}{Style.RESET_ALL}")
-        import time
-        time.sleep(2)
+    def __init__(self, headers=None, pool_connections=DEFAULT_POOL_CONNECTIONS,
+                 pool_maxsize=DEFAULT_POOL_MAXSIZE, keep_alive=True, timeout=DEFAULT_TIMEOUT,
+                 stream=True, chunk_size=DEFAULT_CHUNK_SIZE, hash_algo=None,
+                 skip_existing=True, verify_existing_size=True, resume=True, rate_limiter=None, http_cache=None,
+                 content_store=None, page_rate_limiter=None):
+        """
+        :param headers: 默认请求头（单次请求传入的 headers 会覆盖它）
+        :param pool_connections: 缓存多少个主机的连接池
+        :param pool_maxsize: 每个主机连接池保持的最大连接数（并发下载时应不小于并发数）
+        :param keep_alive: 是否保持长连接
+        :param timeout: (连接超时, 读取超时)
+        :param stream: 是否流式下载（按块写入临时文件后原子改名，内存占用不超过一个块）
+        :param chunk_size: 流式下载的块大小（字节）
+        :param hash_algo: 边下载边计算的哈希算法名（如 "sha256"），为 None 则不计算
+        :param skip_existing: 本地已有同名文件时跳过下载
+        :param verify_existing_size: 跳过前先用 HEAD 校验本地文件大小与远端一致，不一致则重新下载
+        :param resume: 流式下载失败时保留 .part 文件，下次通过 Range/If-Range 只下载缺失的部分
+        :param rate_limiter: HostRateLimiter 实例，所有请求发出前按主机限速并反馈结果，为 None 则不限速
+        :param http_cache: HttpCache 实例，get_text 的页面经过磁盘缓存和条件请求，为 None 则不缓存
+        :param content_store: ContentStore 实例，按内容哈希去重（重复的图片改为硬链接，同名不同内容的改名保存），
+                              为 None 则直接按文件名保存
+        :param page_rate_limiter: get_text 使用的限速器（页面和图片分开限速），为 None 则与图片共用 rate_limiter
+        """
+        self.headers = dict(headers or {})
+        self.timeout = timeout
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.hash_algo = hash_algo
+        self.skip_existing = skip_existing
+        self.verify_existing_size = verify_existing_size
+        self.resume = resume
+        self.rate_limiter = rate_limiter
+        self.page_rate_limiter = page_rate_limiter if page_rate_limiter is not None else rate_limiter
+        self.http_cache = http_cache
+        self.content_store = content_store
+        # 有限速器时 429/503 交给限速器处理：在连接池内部重试的话既不经过令牌桶，限速器也只能看到最后一次结果
+        retry_status = RETRY_STATUS
+        if rate_limiter is not None or page_rate_limiter is not None:
+            retry_status = tuple(status for status in RETRY_STATUS if status not in THROTTLE_STATUS)
+        self.session = create_session(pool_connections, pool_maxsize, keep_alive, retry_status)
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self) -> None:
+        """关闭所有连接池"""
+        if not self._closed:
+            self.session.close()
+            self._closed = True
+
+    def connection_count(self) -> int:
+        """统计到目前为止各主机连接池一共新建过多少条连接"""
+        total = 0
+        # http:// 和 https:// 挂载的是同一个 adapter，去重后再统计
+        adapters = {id(a): a for a in self.session.adapters.values()}
+        for adapter in adapters.values():
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                total += pools[key].num_connections
+        return total
+
+    def _merge_headers(self, headers):
+        if not headers:
+            return self.headers
+        merged = dict(self.headers)
+        merged.update(headers)
+        return merged
+
+    def _send(self, method, url, headers=None, rate_limiter=None, **kwargs):
+        """
+        发送请求，经过限速器时先等令牌，再把状态码/超时反馈给限速器
+        :param rate_limiter: 使用的限速器，为 None 则用图片的 rate_limiter
+        """
+        rate_limiter = rate_limiter or self.rate_limiter
+        if rate_limiter is None:
+            return self.session.request(method, url, headers=self._merge_headers(headers),
+                                        timeout=self.timeout, verify=False, **kwargs)
+        rate_limiter.acquire(url)
         try:
-            response = session.get(
-                url=img_url,
-                headers=HEADERS,
-                timeout=(30, 60),
-                verify=False
-            )
+            response = self.session.request(method, url, headers=self._merge_headers(headers),
+                                            timeout=self.timeout, verify=False, **kwargs)
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError):
+            rate_limiter.report(url, error=True)
+            raise
+        rate_limiter.report_response(url, response)
+        return response
+
+    def _get(self, url, headers=None, stream=False, rate_limiter=None):
+        return self._send('GET', url, headers, rate_limiter, stream=stream)
+
+    def _head(self, url, headers=None):
+        return self._send('HEAD', url, headers, allow_redirects=True)
+
+    def _get_page(self, url, headers=None):
+        return self._get(url, headers, rate_limiter=self.page_rate_limiter)
+
+    def get_text(self, url, headers=None, cache_ttl=None) -> str:
+        """
+        获取页面文本，与图片下载共用连接池和限速器
+        :param cache_ttl: 配置了 http_cache 时，缓存多少秒内不访问网络（默认用缓存的 ttl，0 表示每次都发条件请求）
+        """
+        if self.http_cache is None:
+            with self._get_page(url, headers) as response:
+                return response.text
+        text = self.http_cache.fresh_text(url, cache_ttl)
+        if text is not None:
+            return text
+        entry = self.http_cache.lookup(url)
+        if entry is not None:
+            headers = dict(headers or {}, **self.http_cache.validators(entry))
+        with self._get_page(url, headers) as response:
+            if response.status_code == 304 and entry is not None:
+                self.http_cache.refresh(url)
+                return entry["text"]
+            text = response.text
             if response.status_code == 200:
-                img_name = os.path.basename(img_url)
-                save_path = os.path.join(save_dir, img_name)
-                with open(save_path, 'wb') as f:
-                    f.write(response.content)
-                fileSize = f"{len(response.content) / 1024:.2f}KB"
-                return fileSize
-        except:
-            pass
-        print(f"{Fore.RED}下载失败: SSL错误{Style.RESET_ALL}")
-        return "失败"
-    except Exception as e:
-        print(f"{Fore.RED}下载失败: {str(e)[:80]}{Style.RESET_ALL}")
-        return "失败"
+                self.http_cache.store(url, text, response.headers)
+            return text
+
+    def _existing_is_complete(self, img_url, save_path, headers) -> bool:
+        """本地已有同名文件时，用 HEAD 的 Content-Length 校验大小；拿不到远端大小时认为已完整"""
+        if not self.verify_existing_size:
+            return True
+        try:
+            with self._head(img_url, headers) as response:
+                return _size_matches(response.status_code, response.headers, save_path)
+        except requests.exceptions.RequestException:
+            return True
+
+    def _write_stream(self, response, save_path, result, offset=0) -> None:
+        """
+        按块写入 .part 临时文件，fsync 后原子替换为目标文件，同时统计大小和哈希
+        :param offset: 续传时已有的字节数（response 为 206 且从 offset 开始）
+        """
+        part_path = save_path + PART_SUFFIX
+        hasher = _start_hasher(self.content_store, self.hash_algo, part_path, offset, self.chunk_size)
+        if self.resume:
+            _write_part_meta(part_path, response.headers)
+        size = offset
+        try:
+            with open(part_path, 'ab' if offset else 'wb') as f:
+                for chunk in response.iter_content(chunk_size=self.chunk_size):
+                    if not chunk:
+                        continue
+                    f.write(chunk)
+                    size += len(chunk)
+                    if hasher is not None:
+                        hasher.update(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+            _commit_part(self.content_store, part_path, save_path, result, hasher, size, offset)
+        except BaseException:
+            # 开启续传时保留已下载的部分，下次从断点继续
+            if not self.resume and os.path.exists(part_path):
+                os.remove(part_path)
+            raise
+
+    def _request(self, img_url, headers):
+        try:
+            return self._get(img_url, headers, self.stream)
+        except requests.exceptions.SSLError as e:
+            print(f"{Fore.YELLOW}SSL错误，重试中: {str(e)[:50]}{Style.RESET_ALL}")
+            time.sleep(2)
+            return self._get(img_url, headers, self.stream)
+
+    def fetch(self, img_url, save_dir, headers=None):
+        """
+        下载单张图片
+        :return: 结果字典 {url, path, status, size, elapsed, error}，status 为 HTTP 状态码（请求异常时为 None），
+                 下载失败时 size 为 None；设置了 hash_algo 时附带 hash（十六进制摘要）；
+                 本地已有完整文件时附带 skipped=True，断点续传时附带 resumed_from（续传起点字节数）
+        """
+        if not os.path.exists(save_dir):
+            os.makedirs(save_dir, exist_ok=True)
+        save_path = save_path_for(img_url, save_dir)
+        part_path = save_path + PART_SUFFIX
+        result = {"url": img_url, "path": save_path, "status": None, "size": None, "elapsed": 0.0, "error": None}
+        start = time.perf_counter()
+        try:
+            existing_path = _existing_path(self.content_store, img_url, save_path)
+            if self.skip_existing and os.path.exists(existing_path) \
+                    and self._existing_is_complete(img_url, existing_path, headers):
+                _mark_skipped(result, existing_path)
+                return result
+
+            request_headers, offset = _resume_headers(part_path, headers, self.stream and self.resume)
+            response = self._request(img_url, request_headers)
+            if response.status_code == 416 and offset:
+                # 断点已超出远端文件范围，丢弃 .part 重新下载
+                response.close()
+                _discard_part(part_path)
+                offset = 0
+                response = self._request(img_url, headers)
+
+            with response:
+                result["status"] = response.status_code
+                offset, result["error"] = _check_response(response.status_code,
+                                                          response.headers.get('Content-Range'), offset)
+                if result["error"]:
+                    return result
+
+                if self.stream:
+                    self._write_stream(response, save_path, result, offset)
+                    return result
+
+                content = response.content
+                hasher = _start_hasher(self.content_store, self.hash_algo)
+                if hasher is not None:
+                    hasher.update(content)
+                with open(part_path, 'wb') as f:
+                    f.write(content)
+                _commit_part(self.content_store, part_path, save_path, result, hasher, len(content))
+                return result
+        except requests.exceptions.SSLError:
+            result["error"] = "SSL错误"
+            return result
+        except Exception as e:
+            result["error"] = str(e)[:80]
+            return result
+        finally:
+            result["elapsed"] = time.perf_counter() - start
+
+    def download_image(self, img_url, save_dir, headers=None):
+        """下载单张图片，返回 "xx.xxKB" 格式的文件大小，失败返回 "失败"（与模块级 download_image 一致）"""
+        result = self.fetch(img_url, save_dir, headers)
+        if result["size"] is None:
+            print(f"{Fore.RED}下载失败: {result['error']}{Style.RESET_ALL}")
+            return "失败"
+        return format_size(result["size"])
+
+
+def save_path_for(img_url, save_dir):
+    """图片的保存路径：保存目录 + url 的文件名"""
+    return os.path.join(save_dir, os.path.basename(img_url))
+
+
+# 以下是 ImageDownloader 和 AsyncFetcher 共用的、与传输方式无关的判断：
+# 跳过已有文件、续传起点、响应是否可用、写完后的提交，两个下载器只负责收发数据
+
+
+def _existing_path(content_store, img_url, save_path):
+    """跳过判断要检查的本地文件：开启内容去重时，这个 url 上次可能因同名冲突改名保存"""
+    if content_store is not None:
+        return content_store.path_for(img_url, os.path.dirname(save_path)) or save_path
+    return save_path
+
+
+def _mark_skipped(result, path) -> None:
+    result["path"] = path
+    result["size"] = os.path.getsize(path)
+    result["skipped"] = True
+
+
+def _size_matches(status_code, response_headers, path) -> bool:
+    """HEAD 响应是否说明本地文件完整：拿不到远端大小（非 200、没有 Content-Length、压缩传输）时认为完整"""
+    expected = response_headers.get('Content-Length')
+    if status_code != 200 or expected is None or 'Content-Encoding' in response_headers:
+        return True
+    return int(expected) == os.path.getsize(path)
+
+
+def _resume_headers(part_path, headers, enabled=True):
+    """根据残留的 .part 文件和其中记录的 ETag/Last-Modified 构造 Range 请求头，无可续传内容时返回 (headers, 0)"""
+    if not enabled or not os.path.exists(part_path):
+        return headers, 0
+    offset = os.path.getsize(part_path)
+    if offset == 0:
+        return headers, 0
+    range_headers = dict(headers or {})
+    range_headers['Range'] = f'bytes={offset}-'
+    validator = _read_part_meta(part_path)
+    if validator:
+        range_headers['If-Range'] = validator
+    return range_headers, offset
+
+
+def _discard_part(part_path) -> None:
+    """丢弃无法续传的 .part 和它的校验值"""
+    if os.path.exists(part_path):
+        os.remove(part_path)
+    _remove_part_meta(part_path)
+
+
+def _check_response(status_code, content_range, offset):
+    """
+    判断图片请求的响应能否写入
+    :return: (写入起点, 错误信息)；200 表示服务器不支持 Range 或文件已变化（If-Range 不匹配），从头写
+    """
+    if status_code not in (200, 206):
+        return 0, f"请求失败，状态码: {status_code}"
+    if status_code == 200:
+        return 0, None
+    if not offset or not (content_range or '').startswith(f'bytes {offset}-'):
+        return 0, f"续传范围不匹配: {content_range}"
+    return offset, None
+
+
+def _start_hasher(content_store, hash_algo, part_path=None, offset=0, chunk_size=DEFAULT_CHUNK_SIZE):
+    """新建哈希对象（开启内容去重时用它的算法），续传时先读入 .part 中已有的部分"""
+    if content_store is not None:
+        hasher = content_store.new_hasher()
+    else:
+        hasher = hashlib.new(hash_algo) if hash_algo else None
+    if offset and hasher is not None:
+        _hash_file(hasher, part_path, chunk_size)
+    return hasher
+
+
+def _commit_part(content_store, part_path, save_path, result, hasher, size, offset=0) -> None:
+    """把写完的临时文件放到最终位置（配置了 content_store 时由它按内容去重），并填好结果字典"""
+    if hasher is not None:
+        result["hash"] = hasher.hexdigest()
+    if content_store is None:
+        os.replace(part_path, save_path)
+    else:
+        stored = content_store.commit(part_path, save_path, result["hash"], size, result["url"])
+        result["path"] = stored["path"]
+        if stored["linked"]:
+            result["linked"] = True
+        if stored["renamed"]:
+            result["renamed"] = True
+    _remove_part_meta(part_path)
+    result["size"] = size
+    if offset:
+        result["resumed_from"] = offset
+
+
+def _part_meta_path(part_path):
+    return part_path + '.meta'
+
+
+def _read_part_meta(part_path):
+    """读取 .part 文件对应的校验值（ETag 优先，其次 Last-Modified），没有则返回 None"""
+    try:
+        with open(_part_meta_path(part_path), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    etag = meta.get('etag')
+    # 弱 ETag 不能用于 If-Range
+    if etag and not etag.startswith('W/'):
+        return etag
+    return meta.get('last_modified')
+
+
+def _write_part_meta(part_path, response_headers):
+    meta = {"etag": response_headers.get('ETag'), "last_modified": response_headers.get('Last-Modified')}
+    if not meta["etag"] and not meta["last_modified"]:
+        _remove_part_meta(part_path)
+        return
+    with open(_part_meta_path(part_path), 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+
+
+def _remove_part_meta(part_path):
+    meta_path = _part_meta_path(part_path)
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+
+
+def _hash_file(hasher, path, chunk_size):
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            hasher.update(chunk)
+
+
+def format_size(size):
+    return f"{size / 1024:.2f}KB"
+
+
+_shared_downloader = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_downloader() -> ImageDownloader:
+    """进程内共享的默认下载器，模块级 download_image 通过它复用连接"""
+    global _shared_downloader
+    with _shared_lock:
+        if _shared_downloader is None or _shared_downloader._closed:
+            _shared_downloader = ImageDownloader()
+        return _shared_downloader
+
 
+def download_image(img_url, save_dir, HEADERS, downloader=None):
+    if downloader is None:
+        downloader = get_shared_downloader()
+    return downloader.download_image(img_url, save_dir, HEADERS)
@@ -0,0 +1,179 @@
+import asyncio
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+# 这些状态码说明服务器在限流或过载，需要降速
+THROTTLE_STATUS = (429, 503)
+
+
+class ThrottledError(Exception):
+    """服务器返回了限流/过载状态码（用于无法直接拿到 requests 响应的场景，如 Playwright 渲染）"""
+
+    def __init__(self, url: str, status_code: int, retry_after: Optional[float] = None):
+        super().__init__(f"请求被限流，状态码: {status_code} ({url})")
+        self.url = url
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析 Retry-After 头（秒数或 HTTP 日期），返回需要等待的秒数"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def host_of(url: str) -> str:
+    return urlsplit(url).netloc or url
+
+
+class _HostState:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.requests = 0
+        self.throttled = 0
+        self.errors = 0
+
+
+class HostRateLimiter:
+    """
+    按主机限速：令牌桶控制请求间隔，速率按 AIMD 调整——
+    响应正常时每次加 increase，遇到 429/503/超时乘以 decrease_factor，
+    带 Retry-After 时在指定时间内暂停该主机的所有请求
+    """
+
+    def __init__(
+            self,
+            initial_rate: float = 2.0,
+            min_rate: float = 0.05,
+            max_rate: float = 10.0,
+            burst: float = 4,
+            increase: float = 0.1,
+            decrease_factor: float = 0.5
+    ):
+        """
+        :param initial_rate: 每个主机的初始速率（请求/秒）
+        :param min_rate: 最低速率
+        :param max_rate: 最高速率
+        :param burst: 令牌桶容量（允许的突发请求数）
+        :param increase: 每次正常响应后速率增加的量
+        :param decrease_factor: 被限流后速率乘以的系数
+        """
+        self.initial_rate = initial_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        self._hosts: Dict[str, _HostState] = {}
+        self._lock = threading.Lock()
+
+    def _state(self, host: str) -> _HostState:
+        state = self._hosts.get(host)
+        if state is None:
+            state = _HostState(self.initial_rate, self.burst)
+            self._hosts[host] = state
+        return state
+
+    def reserve(self, url: str) -> float:
+        """预约一个令牌，返回调用方需要等待的秒数（预约后必须等够再发请求）"""
+        with self._lock:
+            state = self._state(host_of(url))
+            now = time.monotonic()
+            state.tokens = min(self.burst, state.tokens + (now - state.updated) * state.rate)
+            state.updated = now
+            state.tokens -= 1
+            state.requests += 1
+            wait = -state.tokens / state.rate if state.tokens < 0 else 0.0
+            return max(wait, state.blocked_until - now)
+
+    def acquire(self, url: str) -> None:
+        """阻塞直到可以向该 url 的主机发请求"""
+        wait = self.reserve(url)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, url: str) -> None:
+        """acquire 的 asyncio 版本"""
+        wait = self.reserve(url)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def report(
+            self,
+            url: str,
+            status_code: Optional[int] = None,
+            error: bool = False,
+            retry_after: Optional[float] = None
+    ) -> None:
+        """
+        反馈一次请求的结果，用于调整速率
+        :param status_code: HTTP 状态码
+        :param error: 是否超时/连接失败
+        :param retry_after: 服务器要求的等待秒数（Retry-After）
+        """
+        with self._lock:
+            state = self._state(host_of(url))
+            now = time.monotonic()
+            if error or status_code in THROTTLE_STATUS:
+                state.rate = max(self.min_rate, state.rate * self.decrease_factor)
+                if error:
+                    state.errors += 1
+                else:
+                    state.throttled += 1
+                # 已经攒下的令牌作废，避免降速后马上又突发一批请求
+                state.tokens = min(state.tokens, 0)
+            elif status_code is not None and status_code < 500:
+                state.rate = min(self.max_rate, state.rate + self.increase)
+            if retry_after:
+                state.blocked_until = max(state.blocked_until, now + retry_after)
+
+    def report_response(self, url: str, response) -> None:
+        """用 requests/httpx 的响应对象反馈结果（自动读取 Retry-After）"""
+        self.report(url, response.status_code, retry_after=parse_retry_after(response.headers.get('Retry-After')))
+
+    def rate(self, url: str) -> float:
+        """该 url 所在主机的当前速率（请求/秒）"""
+        with self._lock:
+            return self._state(host_of(url)).rate
+
+    def stats(self) -> Dict[str, Dict]:
+        """每个主机的当前速率和计数"""
+        with self._lock:
+            now = time.monotonic()
+            return {
+                host: {
+                    "rate": round(state.rate, 3),
+                    "requests": state.requests,
+                    "throttled": state.throttled,
+                    "errors": state.errors,
+                    "paused": round(max(0.0, state.blocked_until - now), 1),
+                }
+                for host, state in self._hosts.items()
+            }
+
+    def format_stats(self) -> str:
+        return ", ".join(
+            f"{host} {s['rate']}/s (请求{s['requests']} 限流{s['throttled']} 错误{s['errors']})"
+            for host, s in self.stats().items()
+        )
+
+
+def image_rate_limiter() -> HostRateLimiter:
+    """
+    图片 CDN 用的限速器：默认参数是按页面请求定的（2 请求/秒起步），并发下载图片时会成为瓶颈；
+    这里起步速率和上限都更高，每次正常响应加得更快，遇到 429/503 同样减半
+    """
+    return HostRateLimiter(initial_rate=20.0, max_rate=200.0, burst=16, increase=1.0)
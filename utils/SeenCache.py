@@ -0,0 +1,177 @@
+import hashlib
+import math
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from DownloadFileDB import DownloadFileDB
+
+
+class BloomFilter:
+    """布隆过滤器：不存在的判断是确定的，存在的判断有 error_rate 的误判率"""
+
+    def __init__(self, capacity: int = 1_000_000, error_rate: float = 0.001):
+        """
+        :param capacity: 预计元素个数
+        :param error_rate: 期望的误判率
+        """
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value: str):
+        digest = hashlib.blake2b(value.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, value: str) -> None:
+        for pos in self._positions(value):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, value: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(value))
+
+
+class SeenCache:
+    """
+    DownloadFileDB 前面的进程内去重缓存：按 (表名, 列) 从数据库预热已下载的标题/url，
+    在本地判断是否已存在，insert_custom/insert_url_custom 时同步更新。
+    本地按 db.match_key 比较（与数据库的排序规则一致，MySQL 下不区分大小写和末尾空格），返回调用方传入的原值。
+    集合模式下本地结果即为最终结果；布隆过滤器模式下只有"可能存在"才回数据库确认。
+    其它方法原样转发给 DownloadFileDB。
+    """
+
+    def __init__(
+            self,
+            db: Optional[DownloadFileDB] = None,
+            bloom: bool = False,
+            capacity: int = 1_000_000,
+            error_rate: float = 0.001,
+            warm_tables: Optional[List[Tuple[str, str]]] = None
+    ):
+        """
+        :param db: 被包装的 DownloadFileDB（为 None 则新建一个）
+        :param bloom: 是否使用布隆过滤器代替集合（适合特别大的表，内存固定）
+        :param capacity: 布隆过滤器的预计元素个数
+        :param error_rate: 布隆过滤器的误判率
+        :param warm_tables: 启动时立即预热的 (表名, 列名) 列表，其余表在首次使用时预热
+        """
+        self.db = db if db is not None else DownloadFileDB()
+        self.bloom = bloom
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._indexes: Dict[Tuple[str, str], object] = {}
+        self._lock = threading.Lock()
+        for table_name, column in warm_tables or []:
+            self.warm(table_name, column)
+
+    def __getattr__(self, name):
+        return getattr(self.db, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.db.close()
+
+    def _new_index(self):
+        if self.bloom:
+            return BloomFilter(self.capacity, self.error_rate)
+        return set()
+
+    def warm(self, table_name: str, column: str) -> int:
+        """
+        从数据库加载一列的全部值到本地
+        :return: 加载的个数
+        """
+        with self._lock:
+            return self._warm(table_name, column)
+
+    def _warm(self, table_name: str, column: str) -> int:
+        """
+        调用方持有 self._lock：加载期间其它线程的 _add 等加载完再加到新索引里，
+        不会在新索引发布时被覆盖掉
+        """
+        values = self.db.get_column_values(table_name, column)
+        index = self._new_index()
+        for value in values:
+            index.add(self.db.match_key(value))
+        self._indexes[(table_name, column)] = index
+        return len(values)
+
+    def _index(self, table_name: str, column: str):
+        key = (table_name, column)
+        index = self._indexes.get(key)
+        if index is None:
+            with self._lock:
+                # 等锁期间可能已经有其它线程预热完
+                index = self._indexes.get(key)
+                if index is None:
+                    self._warm(table_name, column)
+                    index = self._indexes[key]
+        return index
+
+    def _add(self, table_name: str, column: str, value: Optional[str]) -> None:
+        if value is None:
+            return
+        key = (table_name, column)
+        self._index(table_name, column)
+        with self._lock:
+            # 重新取一次：拿到索引之后可能又被 warm() 换成了新的
+            self._indexes[key].add(self.db.match_key(value))
+
+    def _contains(self, table_name: str, column: str, value: str) -> bool:
+        if self.db.match_key(value) not in self._index(table_name, column):
+            return False
+        if not self.bloom:
+            return True
+        # 布隆过滤器可能误判，回数据库确认
+        return bool(self.db._get_existing_values(table_name, column, [value]))
+
+    def has_title(self, table_name: str, title: str) -> bool:
+        """标题是否已存在于表中"""
+        return self._contains(table_name, "title", title)
+
+    def has_url(self, table_name: str, url: str) -> bool:
+        """url 是否已存在于表中"""
+        return self._contains(table_name, "url", url)
+
+    def _get_existing_values(self, table_name: str, column: str, values: List[str]) -> set:
+        index = self._index(table_name, column)
+        candidates = [value for value in values if value is not None and self.db.match_key(value) in index]
+        if not self.bloom or not candidates:
+            return set(candidates)
+        return self.db._get_existing_values(table_name, column, candidates)
+
+    def get_existing_titles(self, table_name: str, titles: List[str]) -> set:
+        """同 DownloadFileDB.get_existing_titles，本地判断，布隆模式下只把可能存在的交给数据库确认"""
+        return self._get_existing_values(table_name, "title", titles)
+
+    def get_existing_urls(self, table_name: str, urls: List[str]) -> set:
+        """同 DownloadFileDB.get_existing_urls，本地判断，布隆模式下只把可能存在的交给数据库确认"""
+        return self._get_existing_values(table_name, "url", urls)
+
+    def insert_custom(self, title: str, table_name: str) -> int:
+        new_id = self.db.insert_custom(title=title, table_name=table_name)
+        self._add(table_name, "title", title)
+        return new_id
+
+    def insert_url_custom(self, title: str, url: str, table_name: str) -> int:
+        new_id = self.db.insert_url_custom(title=title, url=url, table_name=table_name)
+        self._add(table_name, "title", title)
+        self._add(table_name, "url", url)
+        return new_id
+
+    def insert_many_custom(self, titles: List[str], table_name: str) -> int:
+        count = self.db.insert_many_custom(titles, table_name)
+        for title in titles:
+            self._add(table_name, "title", title)
+        return count
+
+    def insert_many_url_custom(self, rows: List[tuple], table_name: str) -> int:
+        count = self.db.insert_many_url_custom(rows, table_name)
+        for title, url in rows:
+            self._add(table_name, "title", title)
+            self._add(table_name, "url", url)
+        return count